@@ -1,5 +1,5 @@
 from typing import Union, Callable, List, Tuple
-from functools import reduce
+from itertools import chain
 
 import instructions
 import nodes
@@ -19,58 +19,38 @@ def addNodeToProgramContext(context: ProgramContext, node: nodes.Node, section:
     return context
 
 
-# getStringTokens:: [Token] -> (Either [StringLiteral] ErrorNode, [Token])
+# getStringTokens:: TokenStream -> (Either [StringLiteral] ErrorNode, TokenStream)
 # gets the StringLiteral tokens for the decodeStringLiteral function
-def getStringTokens(tokenList: List[tokens.Token]) -> Tuple[Union[List[tokens.StringLiteral], nodes.ErrorNode], List[tokens.Token]]:
-    if len(tokenList) == 0:
-        return [], []
-    string, *tokenList = tokenList
-    if isinstance(string, tokens.StringLiteral):
-        if len(tokenList) > 0:
-            sep, *tokenList = tokenList
-            if isinstance(sep, tokens.NewLine):
-                return [string], tokenList
-            elif isinstance(sep, tokens.Separator) and sep.contents == ',':
-                res, tokenList = getStringTokens(tokenList)
-                if isinstance(res, nodes.ErrorNode):
-                    return res, tokenList
-                return [string] + res, tokenList
-            else:
-                return instructions.generateUnexpectedTokenError(sep.line, sep.contents, "','"), instructions.advanceToNewline(tokenList)
-        else:
-            return [string], tokenList
-    else:
-        if isinstance(string, tokens.NewLine):
-            return instructions.generateUnexpectedTokenError(string.line, "newline", "a string literal"), instructions.advanceToNewline(tokenList)
-        return instructions.generateUnexpectedTokenError(string.line, string.contents, "a string literal"), instructions.advanceToNewline(tokenList)
+def getStringTokens(tokenList: tokens.TokenStream) -> Tuple[Union[List[tokens.StringLiteral], nodes.ErrorNode], tokens.TokenStream]:
+    res: List[tokens.StringLiteral] = []
+    while len(tokenList) > 0:
+        string = tokenList.next()
+        if not isinstance(string, tokens.StringLiteral):
+            if isinstance(string, tokens.NewLine):
+                return instructions.generateUnexpectedTokenError(string.line, "newline", "a string literal"), instructions.advanceToNewline(tokenList)
+            return instructions.generateUnexpectedTokenError(string.line, string.contents, "a string literal"), instructions.advanceToNewline(tokenList)
+        res.append(string)
+        if len(tokenList) == 0:
+            break
+        sep = tokenList.next()
+        if isinstance(sep, tokens.NewLine):
+            break
+        elif not (isinstance(sep, tokens.Separator) and sep.contents == ','):
+            return instructions.generateUnexpectedTokenError(sep.line, sep.contents, "','"), instructions.advanceToNewline(tokenList)
+    return res, tokenList
 
 
 # bytesToInt:: [int] -> [int]
 # Convert a list of bytes into a list of ints with four bytes per int
 def bytesToInt(values: List[int]) -> List[int]:
-    if len(values) > 3:
-        first, second, third, fourth, *values = values
-    elif len(values) == 3:
-        first, second, third, *values = values
-        fourth = 0
-    elif len(values) == 2:
-        first, second, *values = values
-        third, fourth = [0, 0]
-    elif len(values) == 1:
-        first, *values = values
-        second, third, fourth = [0, 0, 0]
-    else:  # len(bytes) == 0
-        return []
-
-    res = ((first & 0xFF) << 24) | ((second & 0xFF) << 16) | ((third & 0xFF) << 8) | (fourth & 0xFF)
-    if len(values) > 0:
-        return [res] + bytesToInt(values)
-    else:
-        return [res]
+    # Add zeroes to fill the last int
+    values = values + [0] * (-len(values) % 4)
+    return [((values[idx] & 0xFF) << 24) | ((values[idx+1] & 0xFF) << 16) | ((values[idx+2] & 0xFF) << 8) | (values[idx+3] & 0xFF)
+            for idx in range(0, len(values), 4)]
 
 
-# decodeStringLiteral:: Token -> [Token] -> Node.Section -> (Node, [Token])
-def decodeStringLiteral(directive: tokens.Token, tokenList: List[tokens.Token], section: nodes.Node.Section) -> Tuple[List[nodes.Node], List[tokens.Token]]:
+# decodeStringLiteral:: Token -> TokenStream -> Node.Section -> ([Node], TokenStream)
+def decodeStringLiteral(directive: tokens.Token, tokenList: tokens.TokenStream, section: nodes.Node.Section) -> Tuple[List[nodes.Node], tokens.TokenStream]:
     text = directive.contents.lower()
     addTermination = text in [".asciz", ".string"]
 
@@ -94,54 +74,51 @@ def decodeStringLiteral(directive: tokens.Token, tokenList: List[tokens.Token],
     else:
         lists = list(map(lambda s: list(map(lambda c: ord(c), replaceEscapedChars(s.contents[1:-1]))), strings))
 
-    lst = reduce(lambda a, b: a + b, lists)
+    lst = list(chain.from_iterable(lists))
     lst = bytesToInt(lst)
     dataNodes = list(map(lambda x: nodes.DataNode(x, "CODE", section, directive.line), lst))
 
     return dataNodes, tokenList
 
 
-# decodeGlobal:: [Token] -> ([String], [Token])
-def decodeGlobal(tokenList: List[tokens.Token]) -> Tuple[Union[List[str], nodes.ErrorNode], List[tokens.Token]]:
-    if len(tokenList) == 0:
-        return [], []
-    label, *tokenList = tokenList
-    if isinstance(label, tokens.Instruction) or isinstance(label, tokens.Register) or isinstance(label, tokens.Label):
-        if len(tokenList) > 0:
-            sep, *tokenList = tokenList
-            if isinstance(sep, tokens.NewLine):
-                return [label.contents], tokenList
-            elif isinstance(sep, tokens.Separator) and sep.contents == ',':
-                res, tokenList = decodeGlobal(tokenList)
-                if isinstance(res, nodes.ErrorNode):
-                    return res, tokenList
-                return [label.contents] + res, tokenList
-            else:
-                return instructions.generateUnexpectedTokenError(sep.line, sep.contents, "','"), instructions.advanceToNewline(tokenList)
-        else:
-            return [label.contents], tokenList
-    else:
-        if isinstance(label, tokens.NewLine):
-            return instructions.generateUnexpectedTokenError(label.line, "newline", "a label"), instructions.advanceToNewline(tokenList)
-        return instructions.generateUnexpectedTokenError(label.line, label.contents, "a label"), instructions.advanceToNewline(tokenList)
+# decodeGlobal:: TokenStream -> (Either [String] ErrorNode, TokenStream)
+def decodeGlobal(tokenList: tokens.TokenStream) -> Tuple[Union[List[str], nodes.ErrorNode], tokens.TokenStream]:
+    res: List[str] = []
+    while len(tokenList) > 0:
+        label = tokenList.next()
+        if not (isinstance(label, tokens.Instruction) or isinstance(label, tokens.Register) or isinstance(label, tokens.Label)):
+            if isinstance(label, tokens.NewLine):
+                return instructions.generateUnexpectedTokenError(label.line, "newline", "a label"), instructions.advanceToNewline(tokenList)
+            return instructions.generateUnexpectedTokenError(label.line, label.contents, "a label"), instructions.advanceToNewline(tokenList)
+        res.append(label.contents)
+        if len(tokenList) == 0:
+            break
+        sep = tokenList.next()
+        if isinstance(sep, tokens.NewLine):
+            break
+        elif not (isinstance(sep, tokens.Separator) and sep.contents == ','):
+            return instructions.generateUnexpectedTokenError(sep.line, sep.contents, "','"), instructions.advanceToNewline(tokenList)
+    return res, tokenList
 
 
-# parse:: [Token] -> ProgramContext -> Node.Section -> ProgramContext
+# parse:: [Token] -> ProgramContext
 def parse(tokenList: List[tokens.Token]) -> ProgramContext:
     context = ProgramContext([], [], [], [], [])
     section: nodes.Node.Section = nodes.Node.Section.TEXT
+    tokenList: tokens.TokenStream = tokens.TokenStream(tokenList)
 
     while len(tokenList) > 0:
-        head, *tokenList = tokenList
+        head = tokenList.next()
 
         if isinstance(head, tokens.Instruction):
             # It is a label
             if len(tokenList) == 0:
                 err = instructions.generateToFewTokensError(head.line, head.contents)
                 context = addNodeToProgramContext(context, err, section)
-            sep: tokens.Token = tokenList[0]
+                continue
+            sep: tokens.Token = tokenList.peek()
             if isinstance(sep, tokens.Separator) and sep.contents == ":":
-                tokenList = tokenList[1:]
+                tokenList.next()
                 # Get the address where the label should point to
                 if section == nodes.Node.Section.TEXT:
                     nextAddress = len(context.text)
@@ -172,9 +149,11 @@ def parse(tokenList: List[tokens.Token]) -> ProgramContext:
                 # It is an actual instruction
                 opCode: str = head.contents.upper().strip()
                 if opCode in instructions.tokenFunctions.keys():
-                    func: Callable[[List[tokens.Token], nodes.Node.Section], Tuple[nodes.Node, List[tokens.Token]]] = instructions.tokenFunctions[opCode]
+                    func: Callable[[tokens.TokenStream, nodes.Node.Section], Tuple[nodes.Node, tokens.TokenStream]] = instructions.tokenFunctions[opCode]
                     if func is not None:
                         node, tokenList = func(tokenList, section)
+                        if isinstance(node, nodes.InstructionNode):
+                            node.opcode = opCode
                         context = addNodeToProgramContext(context, node, section)
                         continue
                         # return parse(tokenList, addNodeToProgramContext(context, node, section), section)
@@ -191,7 +170,7 @@ def parse(tokenList: List[tokens.Token]) -> ProgramContext:
                 err = instructions.generateUnexpectedTokenError(head.line, "End of File", "':'")
                 context = addNodeToProgramContext(context, err, section)
                 continue
-            sep, *tokenList = tokenList
+            sep = tokenList.next()
             if isinstance(sep, tokens.Separator) and sep.contents == ":":
                 # Get the address where the label should point to
                 if section == nodes.Node.Section.TEXT:
@@ -259,7 +238,8 @@ def parse(tokenList: List[tokens.Token]) -> ProgramContext:
             number = head.contents[6:]
             n_skip = int(number) >> 2
             if n_skip > 0:
-                dataNodes = [nodes.DataNode(0, "CODE", section, head.line) for _ in range(n_skip)]
+                # The nodes are never changed, so all words can share the same node
+                dataNodes = [nodes.DataNode(0, "CODE", section, head.line)] * n_skip
                 if section == nodes.Node.Section.TEXT:
                     context.text += dataNodes
                 elif section == nodes.Node.Section.BSS:
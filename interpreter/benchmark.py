@@ -0,0 +1,224 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import asmParser
+import executionBudget
+import interpreter
+import programContext
+
+# Runs the assembly programs in the benchmarks directory and reports the time of every stage of the interpreter separately:
+#   lexing, parsing, linking (which includes fusing), the speed of running the program, and the peak memory of assembling and running it
+# The times are the best of a number of repetitions. The peak memory is measured in a separate run with tracemalloc, which slows the program down
+# The results can be saved as JSON and compared with a baseline, a metric that is more than the threshold worse than the baseline is a regression
+# usage: python benchmark.py [BENCHMARK ...] [-r REPEAT] [-e {closures,table}] [-o OUTPUT] [-b BASELINE] [--save-baseline] [-t THRESHOLD]
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_REPEAT = 5
+# Assembling a benchmark takes about a millisecond, so it is repeated more often than running it to get stable times
+ASSEMBLE_REPEAT = 20
+# The threshold for regressions in percent, the run times of the same benchmark easily differ 10% between runs
+DEFAULT_THRESHOLD = 15.0
+
+STACK_SIZE = 1024
+START_LABEL = "_start"
+# A benchmark that doesn't stop within this number of instructions fails
+MAX_STEPS = 10_000_000
+
+# The metrics that are compared with the baseline, and whether a higher value is better
+METRICS: Dict[str, bool] = {
+    "lexTime": False,
+    "parseTime": False,
+    "linkTime": False,
+    "instructionsPerSecond": True,
+    "peakMemory": False
+}
+
+
+# benchmarkNames:: [String]
+# The names of the benchmarks in the benchmarks directory, the file names without .asm
+def benchmarkNames() -> List[str]:
+    return sorted(fileName[:-4] for fileName in os.listdir(BENCHMARK_DIR) if fileName.endswith(".asm"))
+
+
+# runBenchmark:: String -> String -> int -> String -> Either {String: float} None
+# Assembles a benchmark repeat * ASSEMBLE_REPEAT times and runs it repeat times, returns its metrics
+# Prints the errors and returns None when the program doesn't assemble or doesn't stop
+# The output of the program is discarded
+def runBenchmark(name: str, file_contents: str, repeat: int, engine: str) -> Optional[Dict[str, float]]:
+    fileName = name + ".asm"
+    lines = file_contents.split('\n')
+    lexTimes: List[float] = []
+    parseTimes: List[float] = []
+    linkTimes: List[float] = []
+    runTimes: List[float] = []
+    steps = 0
+    image: Optional[programContext.ProgramImage] = None
+    for _ in range(repeat * ASSEMBLE_REPEAT):
+        startTime = time.perf_counter()
+        loadedTokens = interpreter.lex(fileName, file_contents)
+        lexTimes.append(time.perf_counter() - startTime)
+        if loadedTokens is None:
+            return None
+
+        startTime = time.perf_counter()
+        context = asmParser.parse(loadedTokens)
+        parseTimes.append(time.perf_counter() - startTime)
+        if asmParser.printErrors(context, fileName) > 0:
+            return None
+
+        # The link stage changes the context, so every repetition lexes and parses the program again
+        startTime = time.perf_counter()
+        image = interpreter.link(context, fileName, STACK_SIZE, START_LABEL, True, engine)
+        linkTimes.append(time.perf_counter() - startTime)
+        if image is None:
+            return None
+
+    # The garbage of assembling the program makes the first garbage collections while running slower
+    gc.collect()
+    for _ in range(repeat):
+        state = image.newState()
+        budget = executionBudget.Budget(MAX_STEPS)
+        startTime = time.perf_counter()
+        state = interpreter.runProgram(state, fileName, lines, budget=budget)
+        runTimes.append(time.perf_counter() - startTime)
+        if budget.exceeded is not None:
+            return None
+        steps = state.steps
+
+    tracemalloc.start()
+    state = interpreter.parse(fileName, file_contents, STACK_SIZE, START_LABEL, True, engine)
+    interpreter.runProgram(state, fileName, lines, MAX_STEPS)
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runTime = min(runTimes)
+    return {
+        "lexTime": min(lexTimes),
+        "parseTime": min(parseTimes),
+        "linkTime": min(linkTimes),
+        "runTime": runTime,
+        "instructions": steps,
+        "instructionsPerSecond": steps / runTime if runTime > 0 else 0,
+        "peakMemory": peakMemory
+    }
+
+
+# compareResults:: {String: {String: float}} -> {String: {String: float}} -> float -> [String]
+# The regressions of the results compared with the baseline, benchmarks that are not in the baseline are skipped
+# A benchmark that executes a different number of instructions than in the baseline is a regression as well, the program or the interpreter has changed
+def compareResults(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    regressions: List[str] = []
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        if old.get("instructions") != metrics["instructions"]:
+            regressions.append(f"{name}: executed {metrics['instructions']} instructions instead of {old.get('instructions')}")
+        for metric, higherIsBetter in METRICS.items():
+            if not old.get(metric):
+                continue
+            change = (metrics[metric] - old[metric]) * 100 / old[metric]
+            if (change < -threshold) if higherIsBetter else (change > threshold):
+                regressions.append(f"{name}: {metric} {old[metric]:.6g} -> {metrics[metric]:.6g} ({change:+.1f}%)")
+    return regressions
+
+
+# formatResults:: {String: {String: float}} -> String
+def formatResults(results: Dict[str, Dict[str, float]]) -> str:
+    res = f"{'Benchmark':<14}{'Lex ms':>9}{'Parse ms':>10}{'Link ms':>9}{'Run ms':>9}{'Instructions':>14}{'Instr/s':>11}{'Peak KiB':>10}\n"
+    for name, metrics in results.items():
+        res += f"{name:<14}{metrics['lexTime'] * 1000:>9.2f}{metrics['parseTime'] * 1000:>10.2f}{metrics['linkTime'] * 1000:>9.2f}" \
+               f"{metrics['runTime'] * 1000:>9.1f}{metrics['instructions']:>14}{metrics['instructionsPerSecond']:>11.0f}" \
+               f"{metrics['peakMemory'] / 1024:>10.0f}\n"
+    return res
+
+
+# main:: [String] -> int
+# Returns 1 when a benchmark failed or has regressed, 2 when a file could not be read or written
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmarks of the interpreter and compare them with a baseline")
+    parser.add_argument("benchmarks", nargs="*", help="the benchmarks to run, the names of files in the benchmarks directory without .asm (default: all)")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"run every benchmark this number of times, the best times are reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("-e", "--engine", choices=list(interpreter.ENGINES), default="closures",
+                        help="the backend that runs the instructions, see cli.py (default: closures)")
+    parser.add_argument("-o", "--output", default=None, help="write the results to this file as JSON")
+    parser.add_argument("-b", "--baseline", default=DEFAULT_BASELINE,
+                        help="compare the results with this file of saved results when it exists (default: benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the baseline instead of comparing them")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"the percentage a metric can be worse than the baseline before it is a regression (default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    names = args.benchmarks if len(args.benchmarks) > 0 else benchmarkNames()
+    output = programContext.output
+    programContext.output = open(os.devnull, "w")
+    results: Dict[str, Dict[str, float]] = {}
+    failed = False
+    try:
+        for name in names:
+            try:
+                with open(os.path.join(BENCHMARK_DIR, name + ".asm"), "r") as file:
+                    file_contents = file.read()
+            except OSError as e:
+                print(f"Could not read benchmark {name}: {e.strerror}", file=sys.stderr)
+                return 2
+            metrics = runBenchmark(name, file_contents, args.repeat, args.engine)
+            if metrics is None:
+                print(f"Benchmark {name} failed", file=sys.stderr)
+                failed = True
+            else:
+                results[name] = metrics
+    finally:
+        programContext.output.close()
+        programContext.output = output
+
+    print(formatResults(results), end="")
+    report = {
+        "python": sys.version,
+        "platform": platform.platform(),
+        "engine": args.engine,
+        "benchmarks": results
+    }
+    try:
+        if args.output is not None:
+            with open(args.output, "w") as file:
+                json.dump(report, file, indent=4)
+        if args.save_baseline:
+            with open(args.baseline, "w") as file:
+                json.dump(report, file, indent=4)
+            return 1 if failed else 0
+    except OSError as e:
+        print(f"Could not write {e.filename}: {e.strerror}", file=sys.stderr)
+        return 2
+
+    if os.path.exists(args.baseline):
+        try:
+            with open(args.baseline, "r") as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the baseline {args.baseline}: {e}", file=sys.stderr)
+            return 2
+        if baseline.get("engine") != args.engine:
+            print(f"The baseline has been measured with the {baseline.get('engine')} engine", file=sys.stderr)
+        regressions = compareResults(results, baseline.get("benchmarks", {}), args.threshold)
+        if len(regressions) > 0:
+            print(f"\nRegressions compared with {args.baseline} (threshold {args.threshold}%):")
+            print("\n".join(regressions))
+            return 1
+        print(f"\nNo regressions compared with {args.baseline} (threshold {args.threshold}%)")
+    else:
+        print(f"\nThere is no baseline at {args.baseline}, save one with --save-baseline")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+// String decompression: decodes a run-length encoded string 150 times, a run is a digit with the number of times the character after it is repeated
+.text
+.global _start
+// decompress:: int -> int -> int
+// r0: the destination, r1: the encoded string, returns the length of the decoded string
+decompress:
+    push {r4, lr}
+    mov r4, r0
+nextRun:
+    ldrb r2, [r1]
+    cmp r2, #0
+    beq done
+    sub r2, r2, #48
+    ldrb r3, [r1, #1]
+    add r1, r1, #2
+repeat:
+    strb r3, [r0]
+    add r0, r0, #1
+    sub r2, r2, #1
+    bne repeat
+    b nextRun
+done:
+    strb r2, [r0]
+    sub r0, r0, r4
+    pop {r4, pc}
+
+_start:
+    push {r4, r5, lr}
+    mov r5, #150
+loop:
+    ldr r0, =decoded
+    ldr r1, =encoded
+    bl decompress
+    sub r5, r5, #1
+    bne loop
+    mov r4, r0
+    // Print the decoded string and its length
+    ldr r5, =decoded
+print:
+    ldrb r0, [r5]
+    cmp r0, #0
+    beq printed
+    bl print_char
+    add r5, r5, #1
+    b print
+printed:
+    mov r0, #10
+    bl print_char
+    mov r0, r4
+    bl print_int
+    pop {r4, r5, pc}
+
+.data
+encoded:
+    .asciz "1T1h1e2 1q1u1i1c1k4 1b1r1o1w1n3 1f1o1x9.1j1u1m1p1s1 1o1v1e1r2 1t1h1e3 1l1a1z1y9-1d1o1g1!5 9*9*9*1T1h1e1 1e1n1d"
+.bss
+decoded:
+    .skip 256
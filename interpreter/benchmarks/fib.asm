@@ -0,0 +1,24 @@
+// Recursion: computes fib(20) with the naive recursive definition, which makes 21891 calls
+.text
+.global _start
+// fib:: int -> int
+fib:
+    push {r4, r5, lr}
+    cmp r0, #2
+    blt fibDone
+    mov r4, r0
+    sub r0, r4, #1
+    bl fib
+    mov r5, r0
+    sub r0, r4, #2
+    bl fib
+    add r0, r0, r5
+fibDone:
+    pop {r4, r5, pc}
+
+_start:
+    push {lr}
+    mov r0, #20
+    bl fib
+    bl print_int
+    pop {pc}
@@ -0,0 +1,66 @@
+// Memory copies: copies a 512 byte buffer 100 times with a word loop and 20 times with a byte loop
+.text
+.global _start
+// memcpyWords:: int -> int -> int -> None
+// r0: destination, r1: source, r2: number of bytes, a multiple of 4
+memcpyWords:
+    sub r2, r2, #4
+    ldr r3, [r1, r2]
+    str r3, [r0, r2]
+    bne memcpyWords
+    mov pc, lr
+
+// memcpyBytes:: int -> int -> int -> None
+memcpyBytes:
+    sub r2, r2, #1
+    ldrb r3, [r1, r2]
+    strb r3, [r0, r2]
+    bne memcpyBytes
+    mov pc, lr
+
+_start:
+    push {r4, r5, lr}
+    // Fill the source with 0, 1, 2, ...
+    ldr r4, =source
+    ldr r5, =512
+fill:
+    sub r5, r5, #1
+    strb r5, [r4, r5]
+    bne fill
+
+    mov r4, #100
+words:
+    ldr r0, =destination
+    ldr r1, =source
+    ldr r2, =512
+    bl memcpyWords
+    sub r4, r4, #1
+    bne words
+
+    mov r4, #20
+bytes:
+    ldr r0, =destination
+    ldr r1, =source
+    ldr r2, =512
+    bl memcpyBytes
+    sub r4, r4, #1
+    bne bytes
+
+    // Print the sum of the destination
+    ldr r1, =destination
+    ldr r2, =512
+    mov r0, #0
+sum:
+    sub r2, r2, #1
+    ldrb r3, [r1, r2]
+    add r0, r0, r3
+    cmp r2, #0
+    bne sum
+    bl print_int
+    pop {r4, r5, pc}
+
+.bss
+source:
+    .skip 512
+destination:
+    .skip 512
@@ -0,0 +1,14 @@
+// Output: prints the numbers from 0 to 9999 with print_int
+.text
+.global _start
+_start:
+    push {r4, r5, lr}
+    mov r4, #0
+    ldr r5, =10000
+loop:
+    mov r0, r4
+    bl print_int
+    add r4, r4, #1
+    cmp r4, r5
+    bne loop
+    pop {r4, r5, pc}
@@ -0,0 +1,63 @@
+// Sorting: fills an array with 300 pseudo random words and sorts it with insertion sort
+.text
+.global _start
+_start:
+    push {r4, r5, r6, r7, lr}
+    // Fill the array with a linear congruential generator
+    ldr r4, =array
+    ldr r5, =300
+    ldr r6, =12345
+    ldr r7, =1103515245
+fill:
+    mul r6, r7, r6
+    ldr r0, =12345
+    add r6, r6, r0
+    str r6, [r4]
+    add r4, r4, #4
+    sub r5, r5, #1
+    bne fill
+
+    // Insertion sort, unsigned
+    ldr r4, =array
+    mov r5, #4
+    ldr r7, =1200
+outer:
+    ldr r6, [r4, r5]
+    mov r3, r5
+inner:
+    sub r2, r3, #4
+    ldr r1, [r4, r2]
+    cmp r1, r6
+    bls insert
+    str r1, [r4, r3]
+    mov r3, r2
+    cmp r3, #0
+    bne inner
+insert:
+    str r6, [r4, r3]
+    add r5, r5, #4
+    cmp r5, r7
+    bne outer
+
+    // Count the pairs that are out of order, prints 0 when the array is sorted
+    mov r0, #0
+    mov r5, #4
+check:
+    sub r2, r5, #4
+    ldr r1, [r4, r2]
+    ldr r2, [r4, r5]
+    cmp r1, r2
+    bls ordered
+    add r0, r0, #1
+ordered:
+    add r5, r5, #4
+    cmp r5, r7
+    bne check
+    bl print_int
+    ldr r0, [r4]
+    bl print_int
+    pop {r4, r5, r6, r7, pc}
+
+.bss
+array:
+    .skip 1200
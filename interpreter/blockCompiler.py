@@ -0,0 +1,711 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import struct
+
+import executionTrace
+import instructions
+import instructionsMemory
+import nodes
+import programState
+
+# Compiles the hot basic blocks of a program into Python functions, see interpreter.runProgram
+# The source of a block is generated from the operations of its instructions (nodes.Operation): the registers are held in locals,
+#   the flags are kept in locals until the block is left and the conditions of the branches are evaluated inline.
+#   A block that ends with a branch back to its start loops inside its function
+# A compiled block only runs the cases it can run exactly like the functions of the instructions. For everything else, like an
+#   address that would raise an error or a register that is undefined, it leaves the block before the instruction with the state
+#   written back, so the run loop runs that instruction with its own function and the errors and warnings are unchanged
+# A block that is compiled for a trace appends the record of every instruction it runs to the buffer of the trace itself,
+#   see executionTrace.py and interpreter.runTracedProgram
+
+# The number of times execution has to enter a block before it is compiled
+HOT_THRESHOLD = 16
+# The maximum number of instructions in a compiled block
+MAX_BLOCK_LENGTH = 64
+
+# The conditions of the branches on the flag bits, which are 0 or 1, see instructions.BRANCH_CONDITIONS
+BRANCH_EXPRESSIONS: Dict[str, str] = {
+    "B": "True",
+    "BCC": "not {C}",
+    "BLO": "not {C}",
+    "BCS": "{C}",
+    "BHS": "{C}",
+    "BEQ": "{Z}",
+    "BGE": "{N} == {V}",
+    "BGT": "not {Z} and {N} == {V}",
+    "BHI": "not {Z} and {C}",
+    "BLE": "{Z} or {N} != {V}",
+    "BLS": "not {C} or {Z}",
+    "BLT": "{N} != {V}",
+    "BMI": "{N}",
+    "BNE": "not {Z}",
+    "BPL": "not {N}",
+    "BVC": "not {V}",
+    "BVS": "{V}"
+}
+
+# The flag bits of each way the flags can be kept in the locals of a block
+# add: the locals fa, fb and fr of an addition, like FLAGS_ADD. logic: fr is the result and fb the carry, like FLAGS_LOGIC.
+#   packed: the local fl contains the packed flags
+FLAG_EXPRESSIONS: Dict[str, Dict[str, str]] = {
+    "add": {"N": "((fr >> 31) & 1)", "Z": "((fr & 0xFFFFFFFF) == 0)", "C": "((fr >> 32) & 1)", "V": "((((fa ^ fr) & (fb ^ fr)) >> 31) & 1)"},
+    "logic": {"N": "(fr >> 31)", "Z": "(fr == 0)", "C": "(1 if fb else 0)", "V": "0"},
+    "packed": {"N": "((fl >> 3) & 1)", "Z": "((fl >> 2) & 1)", "C": "((fl >> 1) & 1)", "V": "(fl & 1)"}
+}
+
+# The packed flags of each way the flags can be kept in the locals of a block, like ProgramState.getFlags
+PACKED_FLAGS: Dict[str, str] = {
+    "add": "((fr >> 28) & 8) | (0 if fr & 0xFFFFFFFF else 4) | ((fr >> 31) & 2) | ((((fa ^ fr) & (fb ^ fr)) >> 31) & 1)",
+    "logic": "((fr >> 28) & 8) | (0 if fr else 4) | (2 if fb else 0)",
+    "packed": "fl"
+}
+
+# The number of bytes of the loads and stores
+LOAD_SIZES: Dict[str, int] = {opcode: bitSize >> 3 for opcode, (bitSize, _) in instructionsMemory.LOAD_OPERATIONS.items()}
+STORE_SIZES: Dict[str, int] = {opcode: bitSize >> 3 for opcode, bitSize in instructionsMemory.STORE_OPERATIONS.items()}
+
+# The opcodes of the shifts
+SHIFT_OPCODES = ["LSL", "LSR", "ASR", "ROR"]
+
+# The carry of a shift by a nonzero amount over the value a, a format string over {shift}
+LAST_BIT: Dict[str, str] = {
+    "LSL": "(a << {shift}) >> 32 & 1",
+    "LSR": "a >> ({shift} - 1) & 1",
+    "ASR": "a >> ({shift} - 1) & 1",
+    "ROR": "a >> (({shift} & 31) - 1) & 1"
+}
+
+
+# A basic block that has been compiled into a single Python function
+# function:: ProgramState -> int -> (int, int)
+# function(state, remaining): remaining is the number of instructions the block may execute before the limits are checked
+#   Returns the address of the next instruction and the number of instructions that were executed, which is 0 when the block
+#   can't run at all. The state is always up to date when the function returns
+# count: the number of instructions the block executes when it runs to its end once
+class CompiledBlock:
+    def __init__(self, index: int, address: int, count: int, source: str, function: Callable[[programState.ProgramState, int], Tuple[int, int]]):
+        self.index: int = index
+        self.address: int = address
+        self.count: int = count
+        self.source: str = source
+        self.function = function
+
+    def __str__(self) -> str:
+        return "{}({}, {} instructions)".\
+            format(type(self).__name__, self.address, self.count)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# isControlFlow:: Operation -> bool
+# Whether an operation can change the flow of the program, a block ends after it
+def isControlFlow(operation: nodes.Operation) -> bool:
+    if operation.opcode in instructions.BRANCH_CONDITIONS or operation.opcode in ("BL", "BX", "BLX"):
+        return True
+    if operation.opcode == "POP":
+        return programState.PC_ID in operation.registers
+    return operation.rd == programState.PC_ID and operation.opcode not in STORE_SIZES
+
+
+# findLeaders:: ProgramState -> {int}
+# The entries of the instruction table that start a basic block: the labels, the targets of the branches and the instructions after them
+def findLeaders(state: programState.ProgramState) -> Set[int]:
+    base = state.instructionBase
+    leaders: Set[int] = {(label.address >> 2) - base for label in state.labels.values() if label.section == nodes.Node.Section.TEXT}
+    for idx, node in enumerate(state.instructions):
+        for operation in nodeOperations(node):
+            if isControlFlow(operation):
+                leaders.add(idx + 1)
+                if operation.opcode in instructions.BRANCH_CONDITIONS or operation.opcode == "BL":
+                    leaders.add((operation.immediate >> 2) - base)
+            idx += 1
+    return leaders
+
+
+# nodeOperations:: Node -> [Operation]
+# The operations that a node of the instruction table executes, a node that is not an operation of the program has none
+def nodeOperations(node: Optional[nodes.Node]) -> List[nodes.Operation]:
+    if isinstance(node, nodes.FusedInstructionNode):
+        return nodeOperations(node.first) + nodeOperations(node.second)
+    if not isinstance(node, nodes.InstructionNode) or isinstance(node, nodes.SystemCall) or node.operation is None:
+        return []
+    return [node.operation]
+
+
+# findBlock:: ProgramState -> int -> {int} -> [Operation]
+# The operations of the basic block starting at an entry of the instruction table
+# A block ends after an operation that changes the flow of the program, before the next leader, and before anything that is not an operation
+def findBlock(state: programState.ProgramState, index: int, leaders: Set[int]) -> List[nodes.Operation]:
+    operations: List[nodes.Operation] = []
+    size = len(state.instructions)
+    while index < size and len(operations) < MAX_BLOCK_LENGTH:
+        node = state.instructions[index]
+        if isinstance(node, nodes.FusedInstructionNode):
+            # The second instruction is in the table after the fused instruction
+            node = node.first
+        found = nodeOperations(node)
+        if len(found) == 0:
+            break
+        operations.append(found[0])
+        index += 1
+        if isControlFlow(found[0]) or index in leaders:
+            break
+    return operations
+
+
+# Generates the source of the function of a block, see compileBlock
+# The state of the locals is tracked while the operations are added in the order they run:
+#   loaded: the registers that are read from the state when the function starts, written: the registers that have to be written back,
+#   flags: how the flags are kept in the locals, None when the state contains them, flagsWritten: whether the locals have to be written back
+# traced: whether the block appends runs to the trace in the global T, see executionTrace.BLOCK_RUN and record:
+#   layout: the registers, flags and writes of every instruction of a round, see executionTrace.TraceWriter.addLayout,
+#   values: the values of the instructions of the current round, each is a list of a format string and the local it formats,
+#   pending: the values that use the local of a register, they are copied when the register is written again,
+#   stepRegisters and stepStores: the registers and writes to memory of the current instruction, expected: the expression of the
+#   address after the last instruction that ran, E when it is unknown, flagsLocal: the local of the last flags that were set
+class BlockSource:
+    def __init__(self, state: programState.ProgramState, address: int, traced: bool = False):
+        self.address: int = address
+        self.textStart: int = state.textStart
+        self.textEnd: int = state.textEnd
+        self.memorySize: int = len(state.memory)
+        self.lines: List[str] = []
+        self.indent: str = "    "
+        self.loaded: List[int] = []
+        self.written: Set[int] = set()
+        self.flags: Optional[str] = None
+        self.flagsWritten: bool = False
+        # The expression of the number of instructions that were executed in the earlier rounds of a loop
+        self.executedBefore: str = "0"
+        # Whether the last line leaves the block, so the operations after it can't be reached
+        self.closed: bool = False
+        self.traced: bool = traced
+        self.layout: List[Tuple[Tuple[int, ...], bool, Tuple[int, ...]]] = []
+        self.values: List[List[List[str]]] = []
+        self.pending: Dict[int, List[List[str]]] = {}
+        self.stepRegisters: List[int] = []
+        self.stepStores: List[Tuple[List[str], List[str], int]] = []
+        self.flagsChanged: bool = False
+        self.expected: str = "E"
+        self.flagsLocal: Optional[str] = None
+        # The address of the last instruction that was recorded
+        self.recorded: int = -1
+
+    # emit:: BlockSource -> String -> None
+    def emit(self, line: str):
+        self.lines.append(self.indent + line)
+        self.closed = False
+
+    # read:: BlockSource -> int -> int -> String
+    # The expression of a register that is read by the instruction at pc, the PC reads as the address of the instruction
+    def read(self, register: int, pc: int) -> str:
+        if register == programState.PC_ID:
+            return str(pc)
+        if register not in self.written and register not in self.loaded:
+            self.loaded.append(register)
+        return f"r{register}"
+
+    # write:: BlockSource -> int -> String
+    # The local of a register that is written
+    def write(self, register: int) -> str:
+        if self.traced:
+            if register in self.pending:
+                # A value of an earlier instruction keeps the old value
+                self.emit(f"c{len(self.lines)} = r{register}")
+                for value in self.pending.pop(register):
+                    value[1] = f"c{len(self.lines) - 1}"
+            if register not in self.stepRegisters:
+                self.stepRegisters.append(register)
+        self.written.add(register)
+        return f"r{register}"
+
+    # capture:: BlockSource -> String -> String -> [String]
+    # A value of the current round, the format string formats the local, which is copied first when it's a register that is written
+    def capture(self, format: str, local: str) -> List[str]:
+        value = [format, local]
+        if local[0] == "r":
+            self.pending.setdefault(int(local[1:]), []).append(value)
+        return value
+
+    # store:: BlockSource -> String -> String -> int -> None
+    # Adds a write of size bytes of the value of a local to the address of the expression to the values of the current instruction
+    def store(self, address: str, value: str, size: int):
+        if not self.traced:
+            return
+        local = f"a{len(self.lines)}"
+        self.emit(f"{local} = {address}")
+        mask = {4: "{}", 2: "{} & 0xFFFF", 1: "{} & 0xFF"}[size]
+        self.stepStores.append((["{}", local], self.capture(mask, value), size))
+
+    # flag:: BlockSource -> String -> String
+    # The expression of a flag, N, Z, C or V, which is 0 or 1
+    def flag(self, name: str) -> str:
+        if self.flags is None:
+            # The flags are read from the state once, it keeps them packed after that
+            self.emit("fl = state.getFlags()")
+            self.flags = "packed"
+        return FLAG_EXPRESSIONS[self.flags][name]
+
+    # setFlags:: BlockSource -> String -> None
+    def setFlags(self, kind: str):
+        self.flags = kind
+        self.flagsWritten = True
+        self.flagsChanged = True
+
+    # record:: BlockSource -> int -> None
+    # Adds the instruction at pc to the values of the current round, after the instruction and before it leaves the block
+    # The run of the round is appended to the trace when the block is left or the round ends, see runValues
+    def record(self, pc: int):
+        if not self.traced:
+            return
+        values = [self.capture("{}", f"r{register}") for register in self.stepRegisters]
+        if self.flagsChanged:
+            # The flags are packed like ProgramState.getFlags, the local is the same in every round
+            self.flagsLocal = f"f{(pc - self.address) >> 2}"
+            self.emit(f"{self.flagsLocal} = {PACKED_FLAGS[self.flags]}")
+            values.append(["{}", self.flagsLocal])
+        for address, value, _ in self.stepStores:
+            values += [address, value]
+        if len(self.values) == len(self.layout):
+            self.layout.append((tuple(self.stepRegisters), self.flagsChanged, tuple(size for _, _, size in self.stepStores)))
+        self.values.append(values)
+        self.stepRegisters = []
+        self.stepStores = []
+        self.flagsChanged = False
+        self.expected = str(pc + 4)
+        self.recorded = pc
+
+    # runValues:: BlockSource -> int -> String
+    # The expression of the run of the first count instructions of the current round, see executionTrace.BLOCK_RUN
+    def runValues(self, count: int) -> str:
+        values = ", ".join(format.format(local) for values in self.values[:count] for format, local in values)
+        return f"run{count}({values})"
+
+    # endRound:: BlockSource -> None
+    # Appends the run of the round that ended to the trace, the next round starts
+    def endRound(self):
+        if self.traced:
+            self.emit(f"buf += {self.runValues(len(self.values))}")
+            self.values = []
+            self.pending = {}
+
+    # exit:: BlockSource -> String -> int -> None
+    # Leaves the block at the address of the expression next after executed instructions of the current round
+    def exit(self, next: str, executed: int):
+        for register in sorted(self.written):
+            self.emit(f"R[{register}] = P[{register}] = r{register}" if self.traced else f"R[{register}] = r{register}")
+        lowRegisters = sum(1 << register for register in self.written if register < 4)
+        if lowRegisters != 0:
+            self.emit(f"if dirty: state.lowRegDirty = dirty & {~lowRegisters & programState.LOW_REGISTERS_DIRTY}")
+        if self.flagsWritten:
+            if self.flags == "add":
+                self.emit(f"state.flagKind = {programState.FLAGS_ADD}; state.flagA = fa; state.flagB = fb; state.flagResult = fr")
+            elif self.flags == "logic":
+                self.emit(f"state.flagKind = {programState.FLAGS_LOGIC}; state.flagB = fb; state.flagResult = fr")
+            else:
+                self.emit(f"state.flagKind = {programState.FLAGS_PACKED}; state.flags = fl")
+        if self.traced:
+            if executed != 0:
+                self.emit(f"buf += {self.runValues(executed)}")
+            if self.flagsLocal is not None:
+                self.emit(f"T.flags = {self.flagsLocal}")
+            if self.expected != "E":
+                self.emit(f"T.nextAddress = {self.expected}")
+            self.emit("if len(buf) >= T.bufferSize: T.nextBuffer()")
+        if self.executedBefore == "0":
+            count = str(executed)
+        else:
+            count = self.executedBefore if executed == 0 else f"{self.executedBefore} + {executed}"
+        self.emit(f"return {next}, {count}")
+        self.closed = True
+
+    # sideExit:: BlockSource -> String -> int -> int -> None
+    # Leaves the block before the instruction at pc when the condition holds, the run loop runs that instruction
+    def sideExit(self, condition: str, pc: int, executed: int):
+        self.emit(f"if {condition}:")
+        self.indent += "    "
+        self.exit(str(pc), executed)
+        self.indent = self.indent[:-4]
+        self.closed = False
+
+    # loopEnd:: BlockSource -> String -> int -> int -> None
+    # Adds the branch back to the start of a loop, which leaves the block at the address next when it isn't taken
+    def loopEnd(self, opcode: str, next: int, executed: int):
+        self.record(next - 4)
+        self.sideExit(f"not {self.condition(opcode)}", next, executed)
+
+    # inRange:: BlockSource -> int -> String
+    # The condition that an access of size bytes at the address in the local adr can be done without the checks of the state:
+    #   aligned, and outside of the text section, which contains the instructions, and within the memory
+    def inRange(self, size: int) -> str:
+        aligned = f"adr & {size - 1} == 0 and " if size > 1 else ""
+        return f"{aligned}(0 <= adr <= {self.textStart - size} or {self.textEnd} <= adr <= {self.memorySize - size})"
+
+    # addressOf:: BlockSource -> Operation -> int -> String
+    # The expression of the address of a load or a store
+    def addressOf(self, operation: nodes.Operation, pc: int) -> str:
+        if operation.rm is not None:
+            return f"{self.read(operation.rn, pc)} + {self.read(operation.rm, pc)}"
+        if operation.immediate is not None:
+            return f"{self.read(operation.rn, pc)} + {operation.immediate}"
+        return self.read(operation.rn, pc)
+
+    # operand:: BlockSource -> Operation -> int -> bool -> String
+    # The expression of the second operand of an ALU operation, the register rm or the immediate value
+    def operand(self, operation: nodes.Operation, pc: int, mask: bool = True) -> str:
+        if operation.rm is not None:
+            return self.read(operation.rm, pc)
+        return str(operation.immediate & 0xFFFFFFFF if mask else operation.immediate)
+
+    # addOperation:: BlockSource -> Operation -> int -> int -> bool
+    # Adds an operation that is not the last operation of a loop, returns False when it can't be compiled
+    # executed: the number of instructions of the current round before the operation
+    def addOperation(self, operation: nodes.Operation, pc: int, executed: int) -> bool:
+        opcode, rd, rn = operation.opcode, operation.rd, operation.rn
+        if opcode in ("MOV", "MOVN"):
+            value = self.operand(operation, pc, False)
+            if opcode == "MOVN" and operation.rm is not None:
+                value = f"{value} ^ 0xFFFFFFFF"
+            if rd == programState.PC_ID:
+                self.emit(f"t = {value}")
+                self.record(pc)
+                self.exit("state.returnTo(t + 4)", executed + 1)
+            else:
+                self.emit(f"{self.write(rd)} = {value}")
+        elif opcode in ("SXTH", "SXTB", "UXTH", "UXTB"):
+            if rd == programState.PC_ID:
+                return False
+            value = self.read(operation.rm, pc)
+            mask, sign = (0xFFFF, 0xFFFF_0000) if opcode[3] == "H" else (0xFF, 0xFFFF_FF00)
+            if opcode[0] == "S":
+                self.emit(f"{self.write(rd)} = {value} | {sign} if {value} & {(mask + 1) >> 1} else {value} & {mask}")
+            else:
+                self.emit(f"{self.write(rd)} = {value} & {mask}")
+        elif opcode in ("ADD", "ADC", "SUB", "SBC", "CMP", "CMN"):
+            if rd == programState.PC_ID:
+                return False
+            self.emit(f"fa = {self.read(rn, pc)}")
+            b = self.operand(operation, pc, opcode != "SBC")
+            if opcode in ("ADC", "SBC"):
+                b = f"{b} + {self.flag('C')}"
+            if opcode in ("SUB", "SBC", "CMP"):
+                b = f"-({b}) & 0xFFFFFFFF"
+            self.emit(f"fb = {b}")
+            self.emit("fr = fa + fb")
+            if rd is not None:
+                self.emit(f"{self.write(rd)} = fr & 0xFFFFFFFF")
+            self.setFlags("add")
+        elif opcode == "MUL":
+            if rd == programState.PC_ID:
+                return False
+            self.emit(f"t = ({self.read(rn, pc)} * {self.read(operation.rm, pc)}) & 0xFFFFFFFF")
+            # The carry and overflow flags are unaffected
+            self.emit(f"fl = ({self.flag('C')} << 1) | {self.flag('V')} | (8 if t >> 31 else 0) | (4 if t == 0 else 0)")
+            self.emit(f"{self.write(rd)} = t")
+            self.setFlags("packed")
+        elif opcode in ("AND", "EOR", "ORR", "BIC", "TST"):
+            if rd == programState.PC_ID:
+                return False
+            a, b = self.read(rn, pc), self.operand(operation, pc)
+            if opcode in ("AND", "TST"):
+                self.emit(f"fr = {a} & {b}")
+            elif opcode == "EOR":
+                self.emit(f"fr = {a} ^ {b}")
+            elif opcode == "ORR":
+                self.emit(f"fr = {a} | {b}")
+            else:
+                self.emit(f"fr = {a} & ({b} ^ 0xFFFFFFFF)")
+            self.emit("fb = 0")
+            if rd is not None:
+                self.emit(f"{self.write(rd)} = fr")
+            self.setFlags("logic")
+        elif opcode in SHIFT_OPCODES:
+            return self.addShift(operation, pc, executed)
+        elif opcode in LOAD_SIZES:
+            if rd == programState.PC_ID:
+                return False
+            if rn is None:
+                self.emit(f"{self.write(rd)} = {operation.immediate}")
+                return True
+            size = LOAD_SIZES[opcode]
+            self.emit(f"adr = {self.addressOf(operation, pc)}")
+            self.sideExit(f"not ({self.inRange(size)})", pc, executed)
+            if size == 4:
+                value = "unpackWord(memory, adr)[0]"
+            elif size == 2:
+                value = "unpackHalfWord(memory, adr)[0]"
+            else:
+                value = "memory[adr]"
+            if opcode == "LDRSH":
+                self.emit(f"t = {value}")
+                value = "t | 0xFFFF0000 if t & 0x8000 else t"
+            elif opcode == "LDRSB":
+                self.emit(f"t = {value}")
+                value = "t | 0xFFFFFF00 if t & 0x80 else t"
+            self.emit(f"{self.write(rd)} = {value}")
+        elif opcode in STORE_SIZES:
+            size = STORE_SIZES[opcode]
+            self.emit(f"adr = {self.addressOf(operation, pc)}")
+            self.sideExit(f"not ({self.inRange(size)})", pc, executed)
+            value = self.read(rd, pc)
+            if size == 4:
+                self.emit(f"packWord(memory, adr, {value})")
+            elif size == 2:
+                self.emit(f"packHalfWord(memory, adr, {value} & 0xFFFF)")
+            else:
+                self.emit(f"memory[adr] = {value} & 0xFF")
+            self.store("adr", value, size)
+        elif opcode in ("PUSH", "POP"):
+            return self.addStackOperation(operation, pc, executed)
+        elif opcode == "BL":
+            self.emit(f"{self.write(programState.LR_ID)} = {pc}")
+            self.emit(f"state.callStack.append({pc})")
+            self.record(pc)
+            self.exit(str(operation.immediate), executed + 1)
+        elif opcode == "BLX":
+            # The address is read before LR is changed
+            self.emit(f"t = {self.read(operation.rm, pc)}")
+            self.emit(f"{self.write(programState.LR_ID)} = {pc}")
+            self.emit(f"state.callStack.append({pc})")
+            self.record(pc)
+            self.exit("t", executed + 1)
+        elif opcode == "BX":
+            self.record(pc)
+            self.exit(f"state.returnTo({self.read(operation.rm, pc)})", executed + 1)
+        elif opcode in BRANCH_EXPRESSIONS:
+            self.record(pc)
+            if opcode == "B":
+                self.exit(str(operation.immediate), executed + 1)
+                return True
+            self.sideExit(self.condition(opcode), operation.immediate, executed + 1)
+        else:
+            return False
+        return True
+
+    # condition:: BlockSource -> String -> String
+    # The condition of a conditional branch
+    def condition(self, opcode: str) -> str:
+        expression = BRANCH_EXPRESSIONS[opcode]
+        return expression.format(**{name: self.flag(name) for name in "NZCV" if "{" + name + "}" in expression})
+
+    # addShift:: BlockSource -> Operation -> int -> int -> bool
+    # Adds an LSL, LSR, ASR or ROR operation, a shift by a register that is out of range leaves the block
+    def addShift(self, operation: nodes.Operation, pc: int, executed: int) -> bool:
+        opcode, rd = operation.opcode, operation.rd
+        if rd == programState.PC_ID:
+            return False
+        if opcode == "ROR" and operation.rm is None and operation.immediate & 31 == 0 and operation.immediate & 0xFFFFFFFF != 0:
+            # A rotation by a multiple of 32 that isn't 0 is left to the function of the instruction
+            return False
+        self.emit(f"a = {self.read(operation.rn, pc)}")
+        if operation.rm is not None:
+            self.emit(f"t = {self.read(operation.rm, pc)}")
+            shift = "t"
+            if opcode == "LSL":
+                self.sideExit("t > 31", pc, executed)
+            elif opcode == "ROR":
+                # A rotation by a multiple of 32 that isn't 0 is left to the function of the instruction
+                self.sideExit("t != 0 and t & 31 == 0", pc, executed)
+            else:
+                self.sideExit("t > 32", pc, executed)
+        else:
+            shift = str(operation.immediate if opcode != "ROR" else operation.immediate & 0xFFFFFFFF)
+        # The carry is unaffected by a shift of 0, it is set before fr is overwritten
+        if shift == "0":
+            self.emit(f"fb = {self.flag('C')}")
+        elif shift == "t":
+            self.emit(f"fb = {self.flag('C')} if t == 0 else {LAST_BIT[opcode].format(shift=shift)}")
+        else:
+            self.emit(f"fb = {LAST_BIT[opcode].format(shift=shift)}")
+        if opcode == "LSL":
+            self.emit(f"fr = (a << {shift}) & 0xFFFFFFFF")
+        elif opcode == "LSR":
+            self.emit(f"fr = a >> {shift}")
+        elif opcode == "ASR":
+            self.emit(f"fr = a >> {shift}")
+            self.emit(f"if a >> 31: fr |= (0xFFFFFFFF << (32 - {shift})) & 0xFFFFFFFF")
+        else:
+            self.emit(f"fr = ((a >> ({shift} & 31)) | (a << (32 - ({shift} & 31)))) & 0xFFFFFFFF")
+        self.emit(f"{self.write(rd)} = fr")
+        self.setFlags("logic")
+        return True
+
+    # addStackOperation:: BlockSource -> Operation -> int -> int -> bool
+    # Adds a PUSH or a POP, all registers are transferred with one call when the stack pointer is in the stack
+    def addStackOperation(self, operation: nodes.Operation, pc: int, executed: int) -> bool:
+        registers = operation.registers
+        if len(registers) == 0:
+            return True
+        if operation.opcode == "POP" and (programState.PC_ID in registers[:-1] or programState.SP_ID in registers):
+            return False
+        length = 4 * len(registers)
+        self.emit(f"adr = {self.read(programState.SP_ID, pc)}")
+        if operation.opcode == "PUSH":
+            self.sideExit(f"not (adr & 3 == 0 and {length} <= adr <= {min(operation.immediate, self.textStart)})", pc, executed)
+            # The first register is stored at the highest address
+            values = ", ".join(self.read(register, pc) for register in reversed(registers))
+            self.emit(f"packWords{len(registers)}(memory, adr - {length}, {values})")
+            # PUSH stores the registers one by one from the highest address
+            for idx, register in enumerate(registers):
+                self.store(f"adr - {4 * (idx + 1)}", self.read(register, pc), 4)
+            self.emit(f"{self.write(programState.SP_ID)} = adr - {length}")
+            return True
+        self.sideExit(f"not (adr & 3 == 0 and 0 <= adr <= {min(operation.immediate, self.textStart - length)})", pc, executed)
+        targets = ["t" if register == programState.PC_ID else self.write(register) for register in registers]
+        self.emit(f"{', '.join(targets)}, = unpackWords{len(registers)}(memory, adr)")
+        self.emit(f"{self.write(programState.SP_ID)} = adr + {length}")
+        if registers[-1] == programState.PC_ID:
+            # Popping PC returns from a subroutine
+            self.record(pc)
+            self.exit("state.returnTo(t + 4)", executed + 1)
+        return True
+
+
+    # addInstruction:: BlockSource -> Operation -> int -> int -> bool
+    # Adds an operation with its record, see addOperation
+    def addInstruction(self, operation: nodes.Operation, pc: int, executed: int) -> bool:
+        if not self.addOperation(operation, pc, executed):
+            return False
+        # The operations that leave the block add their record before they leave
+        if self.recorded != pc:
+            self.record(pc)
+        return True
+
+
+# generateSource:: ProgramState -> int -> [Operation] -> bool -> (String, int, [((int), bool, (int))])
+# Generates the source of the function of the block of operations that starts at address, returns it with the number of operations it compiled
+#   and the layout of its runs in a trace
+# The operations from the first one that can't be compiled are left out, the block then continues at that instruction
+# traced: the block appends its runs to a trace, see BlockSource.record
+def generateSource(state: programState.ProgramState, address: int, operations: List[nodes.Operation],
+                   traced: bool = False) -> Tuple[str, int, List[Tuple[Tuple[int, ...], bool, Tuple[int, ...]]]]:
+    last = operations[-1]
+    length = len(operations)
+    # A block that ends with a branch back to its start loops inside its function
+    loops = last.opcode in BRANCH_EXPRESSIONS and last.immediate == address
+    source = BlockSource(state, address, traced)
+    count = 0
+    for operation in operations[:-1] if loops else operations:
+        compiledLines = len(source.lines)
+        if not source.addInstruction(operation, address + 4 * count, count):
+            del source.lines[compiledLines:]
+            loops = False
+            break
+        count += 1
+    if count == 0:
+        return "", 0, []
+    if loops:
+        # The first round runs with the locals of the start of the block, the other rounds with the locals of the end of a round
+        source.loopEnd(last.opcode, address + 4 * length, length)
+        source.endRound()
+        source.emit(f"n = {length}")
+        source.emit(f"while n + {length} <= remaining:")
+        source.indent = "        "
+        source.executedBefore = "n"
+        for idx, operation in enumerate(operations[:-1]):
+            source.addInstruction(operation, address + 4 * idx, idx)
+        source.loopEnd(last.opcode, address + 4 * length, length)
+        source.endRound()
+        source.emit(f"n += {length}")
+        if traced:
+            source.emit("if len(buf) >= T.bufferSize: T.nextBuffer(); buf = T.buffer")
+        # The limits have to be checked before the next round
+        source.indent = "    "
+        source.exit(str(address), 0)
+        count = length
+    elif not source.closed:
+        source.exit(str(address + 4 * count), count)
+    header = ["def block(state, remaining):",
+              f"    if remaining < {count}: return {address}, 0"]
+    readLowRegisters = sum(1 << register for register in source.loaded if register < 4)
+    if any(register < 4 for register in source.written):
+        header.append("    dirty = state.lowRegDirty")
+        if readLowRegisters != 0:
+            header.append(f"    if dirty & {readLowRegisters}: return {address}, 0")
+    elif readLowRegisters != 0:
+        header.append(f"    if state.lowRegDirty & {readLowRegisters}: return {address}, 0")
+    header.append("    R = state.registers")
+    header.append("    memory = state.memory")
+    for register in source.loaded:
+        header.append(f"    r{register} = R[{register}]")
+    if traced:
+        header += ["    buf = T.buffer", "    P = T.registers"]
+    return "\n".join(header + source.lines) + "\n", count, source.layout
+
+
+# The globals of the generated functions, the structs of PUSH and POP are added when a block needs them
+GLOBALS: Dict[str, object] = {
+    "unpackWord": programState.WORD.unpack_from,
+    "unpackHalfWord": programState.HALF_WORD.unpack_from,
+    "packWord": programState.WORD.pack_into,
+    "packHalfWord": programState.HALF_WORD.pack_into
+}
+for _length in range(1, 17):
+    GLOBALS[f"packWords{_length}"] = struct.Struct("<" + "I" * _length).pack_into
+    GLOBALS[f"unpackWords{_length}"] = struct.Struct("<" + "I" * _length).unpack_from
+
+
+# compileBlock:: ProgramState -> int -> {int} -> Either TraceWriter None -> Either CompiledBlock None
+# Compiles the basic block that starts at an entry of the instruction table, None when its first instruction can't be compiled
+# trace: the block appends its runs to this trace, its layout is added to the trace here
+def compileBlock(state: programState.ProgramState, index: int, leaders: Set[int],
+                 trace: Optional[executionTrace.TraceWriter] = None) -> Optional[CompiledBlock]:
+    operations = findBlock(state, index, leaders)
+    if len(operations) == 0:
+        return None
+    address = (state.instructionBase + index) << 2
+    source, count, layout = generateSource(state, address, operations, trace is not None)
+    if count == 0:
+        return None
+    namespace: Dict[str, object] = {}
+    blockGlobals = GLOBALS
+    if trace is not None:
+        # run1-runN pack the runs of the first instructions of a round
+        blockGlobals = dict(GLOBALS, T=trace)
+        layoutId = trace.addLayout(address, layout)
+        for length in range(1, len(layout) + 1):
+            blockGlobals[f"run{length}"] = executionTrace.runPacker(layoutId, layout[:length])
+    exec(compile(source, f"<block {address}>", "exec"), blockGlobals, namespace)
+    return CompiledBlock(index, address, count, source, namespace["block"])
+
+
+# The compiled blocks of a program, see interpreter.runProgram
+# functions: the function of the compiled block that starts at each entry of the instruction table, None when there is none,
+#   with an extra entry for the addresses outside of the table like the dispatch table
+# heat: the number of times execution entered each entry, a block is compiled when it reaches HOT_THRESHOLD
+# trace: the blocks append the records of the instructions they run to this trace, see interpreter.runTracedProgram
+class BlockCache:
+    def __init__(self, state: programState.ProgramState, trace: Optional[executionTrace.TraceWriter] = None):
+        self.state: programState.ProgramState = state
+        self.trace: Optional[executionTrace.TraceWriter] = trace
+        size = len(state.instructions)
+        self.functions: List[Optional[Callable[[programState.ProgramState, int], Tuple[int, int]]]] = [None] * (size + 1)
+        self.heat: List[int] = [0] * (size + 1)
+        self.blocks: Dict[int, CompiledBlock] = {}
+        self.leaders: Set[int] = findLeaders(state)
+
+    def __str__(self) -> str:
+        return "{}({} blocks)".\
+            format(type(self).__name__, len(self.blocks))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # compile:: BlockCache -> int -> None
+    # Compiles the block at an entry of the instruction table that has become hot
+    def compile(self, index: int):
+        if index >= len(self.state.instructions):
+            return
+        block = compileBlock(self.state, index, self.leaders, self.trace)
+        if block is not None:
+            self.blocks[index] = block
+            self.functions[index] = block.function
+
+    # invalidate:: BlockCache -> int -> None
+    # Removes the compiled blocks that contain the word at an address, called by ProgramState.storeRegister for a write to the text section
+    def invalidate(self, address: int):
+        for index, block in list(self.blocks.items()):
+            if block.address <= address < block.address + 4 * block.count:
+                del self.blocks[index]
+                self.functions[index] = None
+                self.heat[index] = 0
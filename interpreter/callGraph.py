@@ -0,0 +1,138 @@
+from typing import Dict, List, Optional, Tuple
+
+import nodes
+import programState
+
+# A call-graph profile: the instructions and cycles of a program per call stack, filled by interpreter.runCallGraphProgram
+# The run loop only tells the profile when an instruction that can call or return changed the depth of the shadow call stack,
+#   see callsOrReturns, the instructions and cycles since the previous call or return are added to the call stack as it was before it.
+# The call of the start label by the interpreter is the root of every call stack,
+#   only the few instructions the interpreter runs before and after the start label are not counted
+#
+# The call stacks can be written as collapsed stacks, the input format of flamegraph tools (flamegraph.pl, speedscope, inferno):
+#   a line per call stack with the labels separated by semicolons, followed by a space and the count
+
+
+class CallGraph:
+    # CallGraph:: ProgramState -> CallGraph
+    def __init__(self, state: programState.ProgramState):
+        # The name of the label at each address, for the names of the called subroutines
+        self.names: Dict[int, str] = {}
+        for name, label in sorted(state.labels.items(), key=lambda item: item[0]):
+            if not name.startswith("__"):
+                self.names.setdefault(label.address, name)
+        # The names of the subroutines on the call stack, starting with the start label
+        self.stack: List[str] = []
+        # The depth of the shadow call stack when the profile was last updated
+        self.depth: int = len(state.callStack)
+        # The instructions and cycles of each call stack, not including the calls it makes
+        self.samples: Dict[Tuple[str, ...], List[int]] = {}
+        # The number of times each subroutine has been called
+        self.calls: Dict[str, int] = {}
+        self.lastSteps: int = 0
+        self.lastCycles: int = 0
+
+    def __str__(self) -> str:
+        return "{}({} call stacks)". \
+            format(type(self).__name__, len(self.samples))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # addSample:: CallGraph -> int -> int -> None
+    # Adds the instructions and cycles since the last update to the current call stack
+    def addSample(self, steps: int, cycles: int):
+        if len(self.stack) > 0 and (steps != self.lastSteps or cycles != self.lastCycles):
+            sample = self.samples.setdefault(tuple(self.stack), [0, 0])
+            sample[0] += steps - self.lastSteps
+            sample[1] += cycles - self.lastCycles
+        self.lastSteps = steps
+        self.lastCycles = cycles
+
+    # update:: CallGraph -> ProgramState -> int -> int -> int -> None
+    # Called by the run loop after a call or a return, address is the address the program continues at
+    # steps and cycles are the totals so far, including the instruction that made the call or returned
+    def update(self, state: programState.ProgramState, address: int, steps: int, cycles: int):
+        self.addSample(steps, cycles)
+        depth = len(state.callStack)
+        while self.depth < depth:
+            self.depth += 1
+            name = self.names.get(address, hex(address))
+            self.stack.append(name)
+            self.calls[name] = self.calls.get(name, 0) + 1
+        while self.depth > depth:
+            self.depth -= 1
+            if len(self.stack) > 0:
+                self.stack.pop()
+
+    # exclusive:: CallGraph -> {String: [int]}
+    # The instructions and cycles of each subroutine itself, without the subroutines it calls
+    def exclusive(self) -> Dict[str, List[int]]:
+        res: Dict[str, List[int]] = {}
+        for stack, (steps, cycles) in self.samples.items():
+            total = res.setdefault(stack[-1], [0, 0])
+            total[0] += steps
+            total[1] += cycles
+        return res
+
+    # inclusive:: CallGraph -> {String: [int]}
+    # The instructions and cycles of each subroutine including the subroutines it calls,
+    #   a recursive subroutine is only counted once for each call stack
+    def inclusive(self) -> Dict[str, List[int]]:
+        res: Dict[str, List[int]] = {}
+        for stack, (steps, cycles) in self.samples.items():
+            for name in set(stack):
+                total = res.setdefault(name, [0, 0])
+                total[0] += steps
+                total[1] += cycles
+        return res
+
+
+# callsOrReturns:: Node -> bool
+# Whether an instruction can change the shadow call stack: BL, BLX, BX, POP {PC}, an instruction that writes the PC like MOV PC, LR,
+#   and the subroutines of the interpreter
+def callsOrReturns(node: Optional[nodes.Node]) -> bool:
+    if isinstance(node, nodes.FusedInstructionNode):
+        return callsOrReturns(node.first) or callsOrReturns(node.second)
+    if not isinstance(node, nodes.InstructionNode):
+        return False
+    operation = node.operation
+    if isinstance(node, nodes.SystemCall) or operation is None:
+        return True
+    if operation.opcode in ("BL", "BLX", "BX"):
+        return True
+    if operation.opcode == "POP":
+        return programState.PC_ID in operation.registers
+    return operation.rd == programState.PC_ID
+
+
+# callsAndReturns:: ProgramState -> [bool]
+# callsOrReturns of every entry of the instruction table, the run loop only updates the profile after these instructions
+def callsAndReturns(state: programState.ProgramState) -> List[bool]:
+    return list(map(callsOrReturns, state.instructions))
+
+
+# formatCallGraph:: CallGraph -> String
+# Generates a report with the calls, instructions and cycles of every subroutine, the subroutine that includes the most instructions first
+def formatCallGraph(graph: CallGraph) -> str:
+    inclusive = graph.inclusive()
+    if len(inclusive) == 0:
+        return "No subroutines were called\n"
+    exclusive = graph.exclusive()
+    res = f"{'Subroutine':<24}{'Calls':>10}{'Instructions':>14}{'(self)':>12}{'Cycles':>14}{'(self)':>12}\n"
+    for name, (steps, cycles) in sorted(inclusive.items(), key=lambda item: item[1][0], reverse=True):
+        selfSteps, selfCycles = exclusive.get(name, [0, 0])
+        res += f"{name:<24}{graph.calls.get(name, 0):>10}{steps:>14}{selfSteps:>12}{cycles:>14}{selfCycles:>12}\n"
+    return res
+
+
+# formatCollapsedStacks:: CallGraph -> bool -> String
+# Generates the collapsed stacks of the profile, weighted by instructions or by cycles
+def formatCollapsedStacks(graph: CallGraph, cycles: bool = False) -> str:
+    res = ""
+    for stack, sample in sorted(graph.samples.items()):
+        count = sample[1] if cycles else sample[0]
+        if count > 0:
+            res += ";".join(stack) + f" {count}\n"
+    return res
+
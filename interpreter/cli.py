@@ -0,0 +1,222 @@
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+import callGraph
+import codeCoverage
+import executionBudget
+import executionTrace
+import interpreter
+import profiler
+import programContext
+import programState
+import superinstructions
+
+# Headless command line runner, this module must never import wx or the visualizer
+# usage: python cli.py program.asm [-s STACK_SIZE] [-l START_LABEL] [-n MAX_STEPS] [--max-time MAX_TIME] [--max-output MAX_OUTPUT] [-o {normal,quiet,registers}] [-e {closures,table}]
+#                      [--cache-dir CACHE_DIR] [-t] [-p | -c | -g | --coverage COVERAGE | --trace TRACE | --pair-histogram]
+#                      [--flamegraph FLAMEGRAPH] [--flamegraph-cycles] [--lcov LCOV]
+# Only one mode can be used at a time, --flamegraph can be combined with -g and --lcov with --coverage
+
+DEFAULT_STACK_SIZE = 1024
+DEFAULT_START_LABEL = "_start"
+# The environment variable with the default directory of the cache of assembled programs
+CACHE_DIR_VARIABLE = "ASM_CACHE_DIR"
+
+OUTPUT_MODES = ["normal", "quiet", "registers"]
+
+
+# buildArgumentParser:: ArgumentParser
+def buildArgumentParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run an ARM Cortex M0 assembly program without the visualizer")
+    parser.add_argument("file", help="the assembly file to run")
+    parser.add_argument("-s", "--stack-size", type=lambda text: int(text, 0), default=DEFAULT_STACK_SIZE,
+                        help=f"the size of the stack in bytes, hexadecimal values like 0x400 are allowed (default: {DEFAULT_STACK_SIZE})")
+    parser.add_argument("-l", "--start-label", default=DEFAULT_START_LABEL,
+                        help=f"the subroutine that is called to start the program (default: {DEFAULT_START_LABEL})")
+    parser.add_argument("-n", "--max-steps", type=int, default=None,
+                        help="stop the program after this number of instructions")
+    parser.add_argument("--max-time", type=float, default=None,
+                        help="stop the program after it has run for this number of seconds")
+    parser.add_argument("--max-output", type=int, default=None,
+                        help="stop the program after it has printed more than this number of characters")
+    parser.add_argument("-o", "--output", choices=OUTPUT_MODES, default="normal",
+                        help="normal: show the output of the program, quiet: hide the output of the program, "
+                             "registers: show the output of the program and the registers after it has stopped")
+    parser.add_argument("-e", "--engine", choices=list(interpreter.ENGINES), default="closures",
+                        help="closures: run a generated function per instruction, table: run the operations with a handler per opcode "
+                             "(default: closures)")
+    parser.add_argument("--cache-dir", default=os.environ.get(CACHE_DIR_VARIABLE),
+                        help=f"cache assembled programs in this directory, so an unchanged file is not assembled again "
+                             f"(default: the {CACHE_DIR_VARIABLE} environment variable, no cache when it isn't set)")
+    parser.add_argument("-t", "--timing", action="store_true",
+                        help="report the parse time, run time and number of executed instructions")
+    # The modes that run the program in a different way, only one of them can be used. --flamegraph and --lcov belong to -g and --coverage
+    modes = parser.add_mutually_exclusive_group()
+    modes.add_argument("-p", "--profile", action="store_true",
+                       help="report the instructions that were executed most often")
+    modes.add_argument("-c", "--cycles", action="store_true",
+                       help="report the number of clock cycles the program would take on a Cortex M0, in total and per subroutine")
+    modes.add_argument("-g", "--call-graph", action="store_true",
+                       help="report the calls, instructions and cycles of every subroutine, with and without the subroutines it calls")
+    modes.add_argument("--coverage", default=None,
+                       help="add the executed lines and branch directions to this coverage file, it is created when it doesn't exist")
+    modes.add_argument("--trace", default=None,
+                       help="write a binary trace of every executed instruction to this file, traceReader.py converts it to text or CSV")
+    modes.add_argument("--pair-histogram", action="store_true",
+                       help="report how often each pair of instructions is executed right after each other")
+    parser.add_argument("--flamegraph", default=None,
+                        help="write the instructions per call stack to this file as collapsed stacks, which flamegraph tools can render")
+    parser.add_argument("--flamegraph-cycles", action="store_true",
+                        help="weigh the collapsed stacks of --flamegraph by cycles instead of instructions")
+    parser.add_argument("--lcov", default=None,
+                        help="write the line and branch coverage to this file in the lcov format, including the coverage of --coverage")
+    return parser
+
+
+# checkModes:: ArgumentParser -> Namespace -> None
+# Stops with a usage error when more than one mode is used, including --flamegraph and --lcov which are not in the group of the modes
+def checkModes(parser: argparse.ArgumentParser, args: argparse.Namespace):
+    modes = [("-p/--profile", args.profile), ("-c/--cycles", args.cycles),
+             ("-g/--call-graph/--flamegraph", args.call_graph or args.flamegraph is not None),
+             ("--coverage/--lcov", args.coverage is not None or args.lcov is not None),
+             ("--trace", args.trace is not None), ("--pair-histogram", args.pair_histogram)]
+    used = [name for name, isUsed in modes if isUsed]
+    if len(used) > 1:
+        parser.error("only one mode can be used at a time, got " + " and ".join(used))
+
+
+# formatRegisters:: ProgramState -> String
+def formatRegisters(state: programState.ProgramState) -> str:
+    res = ""
+    for name, value in zip(programState.REGISTER_NAMES, state.registers):
+        res += f"{name:>3}: 0x{value:08X} {value}\n"
+    status = state.getALUState()
+    res += f"N={int(status.N)} Z={int(status.Z)} C={int(status.C)} V={int(status.V)}\n"
+    return res
+
+
+# main:: [String] -> int
+# Runs the program given by the arguments and returns the exit code:
+#   1 when the program could not be parsed, 2 when a file could not be read or written, or a coverage file is not of this program,
+#   3 when a limit has been exceeded and 4 when the program stopped with a runtime error
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = buildArgumentParser()
+    args = parser.parse_args(argv)
+    checkModes(parser, args)
+
+    try:
+        with open(args.file, "r") as file:
+            file_contents: str = file.read()
+    except OSError as e:
+        print(f"Could not read {args.file}: {e.strerror}", file=sys.stderr)
+        return 2
+    lines = file_contents.split('\n')
+
+    startTime = time.perf_counter()
+    state = interpreter.parse(args.file, file_contents, args.stack_size, args.start_label, not args.pair_histogram, args.engine, args.cache_dir)
+    parseTime = time.perf_counter() - startTime
+    if state is None:
+        return 1
+
+    output = programContext.output
+    if args.output == "quiet":
+        programContext.output = open(os.devnull, "w")
+    try:
+        return runMode(args, state, lines, parseTime)
+    finally:
+        if args.output == "quiet":
+            programContext.output.close()
+            programContext.output = output
+
+
+# runMode:: Namespace -> ProgramState -> [String] -> float -> int
+# Runs a parsed program in the mode of the arguments, prints the reports and returns the exit code, see main
+def runMode(args: argparse.Namespace, state: programState.ProgramState, lines: List[str], parseTime: float) -> int:
+    # The limits are checked every executionBudget.CHECK_INTERVAL instructions, the program stops with a stacktrace when one is exceeded
+    budget = executionBudget.Budget(args.max_steps, args.max_time, args.max_output)
+    startTime = time.perf_counter()
+    if args.pair_histogram:
+        pairCounts = interpreter.runPairHistogram(state, args.file, lines, budget)
+        print(superinstructions.formatPairHistogram(pairCounts), file=sys.stderr)
+    elif args.call_graph or args.flamegraph is not None:
+        graph = callGraph.CallGraph(state)
+        state = interpreter.runProgram(state, args.file, lines, costs=profiler.cycleTables(state), graph=graph, budget=budget)
+        if args.call_graph:
+            print(callGraph.formatCallGraph(graph), file=sys.stderr)
+        if args.flamegraph is not None:
+            try:
+                with open(args.flamegraph, "w") as file:
+                    file.write(callGraph.formatCollapsedStacks(graph, args.flamegraph_cycles))
+            except OSError as e:
+                print(f"Could not write {args.flamegraph}: {e.strerror}", file=sys.stderr)
+                return 2
+    elif args.coverage is not None or args.lcov is not None:
+        coverage = codeCoverage.newCoverage(state, args.file)
+        state = interpreter.runProgram(state, args.file, lines, coverage=coverage, budget=budget)
+        if args.coverage is not None:
+            try:
+                if os.path.exists(args.coverage):
+                    with open(args.coverage, "rb") as file:
+                        coverage.merge(codeCoverage.readCoverage(file.read()))
+                with open(args.coverage, "wb") as file:
+                    file.write(coverage.toBytes())
+            except OSError as e:
+                print(f"Could not update {args.coverage}: {e.strerror}", file=sys.stderr)
+                return 2
+            except ValueError as e:
+                print(f"Could not update {args.coverage}: {e}", file=sys.stderr)
+                return 2
+        if args.lcov is not None:
+            try:
+                with open(args.lcov, "w") as file:
+                    file.write(codeCoverage.formatLcov(coverage))
+            except OSError as e:
+                print(f"Could not write {args.lcov}: {e.strerror}", file=sys.stderr)
+                return 2
+        print(codeCoverage.formatSummary(coverage), file=sys.stderr)
+    elif args.trace is not None:
+        try:
+            traceFile = open(args.trace, "wb")
+        except OSError as e:
+            print(f"Could not write {args.trace}: {e.strerror}", file=sys.stderr)
+            return 2
+        with traceFile:
+            trace = executionTrace.TraceWriter(traceFile, state)
+            state = interpreter.runTracedProgram(state, args.file, lines, trace, budget)
+            try:
+                trace.close()
+            except OSError as e:
+                print(f"Could not write {args.trace}: {e.strerror}", file=sys.stderr)
+                return 2
+    elif args.cycles:
+        cycles = profiler.newProfile(state)
+        state = interpreter.runProgram(state, args.file, lines, None, cycles, profiler.cycleTables(state), budget=budget)
+        print(profiler.formatCycleReport(state, cycles), file=sys.stderr)
+    elif args.profile:
+        profile = profiler.newProfile(state)
+        state = interpreter.runProgram(state, args.file, lines, None, profile, budget=budget)
+        print(profiler.formatHotSpots(state, profile, lines), file=sys.stderr)
+    else:
+        state = interpreter.runProgram(state, args.file, lines, budget=budget)
+    runTime = time.perf_counter() - startTime
+
+    if args.output == "registers":
+        print(formatRegisters(state), end='')
+    if args.timing:
+        print(f"Parse time: {parseTime:.3f} s", file=sys.stderr)
+        print(f"Run time: {runTime:.3f} s", file=sys.stderr)
+        speed = state.steps / runTime if runTime > 0 else 0
+        print(f"Instructions: {state.steps} ({speed:.0f} instructions/s)", file=sys.stderr)
+
+    if budget.exceeded is not None:
+        return 3
+    if state.error is not None:
+        return 4
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
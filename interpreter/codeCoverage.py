@@ -0,0 +1,197 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import struct
+
+import instructions
+import nodes
+import programState
+
+# Line and branch coverage of a program, filled by interpreter.runCoverageProgram with generateCoverageHook
+# While running, the coverage is kept in two maps with a byte for every entry of the instruction table:
+#   fallThrough: the instruction has been executed and the program continued with the next instruction
+#   jumped: the instruction has been executed and it changed the flow of the program
+# Setting a byte of one of the maps is all the hook does per instruction.
+# An instruction has been executed when it is set in either map, a conditional branch has been taken when it is set in jumped
+#   and not taken when it is set in fallThrough
+#
+# A coverage file stores the map of the instruction table and both maps as bitmaps, so it doesn't need the source to write a report:
+#   MAGIC, the version, the number of entries and the length of the file name, the file name,
+#   the line of every entry as a 32 bit word (0 when the entry is not an instruction),
+#   the bitmap of the conditional branches, the bitmap of fallThrough and the bitmap of jumped
+# Coverage of runs of the same program can be merged, see Coverage.merge
+
+MAGIC = b"ASMCOVER"
+VERSION = 1
+
+HEADER = struct.Struct("<8sBII")
+
+
+# packBits:: bytearray -> bytes
+# A bitmap with a bit for every byte of the map, the lowest bit of the first byte is the first entry
+def packBits(values: bytearray) -> bytes:
+    res = bytearray((len(values) + 7) >> 3)
+    for idx, value in enumerate(values):
+        if value:
+            res[idx >> 3] |= 1 << (idx & 7)
+    return bytes(res)
+
+
+# unpackBits:: bytes -> int -> bytearray
+def unpackBits(data: bytes, count: int) -> bytearray:
+    return bytearray((data[idx >> 3] >> (idx & 7)) & 1 for idx in range(count))
+
+
+# isConditionalBranch:: Node -> bool
+def isConditionalBranch(node: nodes.Node) -> bool:
+    return isinstance(node, nodes.InstructionNode) and node.operation is not None and \
+        node.operation.opcode != "B" and node.operation.opcode in instructions.BRANCH_CONDITIONS
+
+
+class Coverage:
+    # Coverage:: String -> [int] -> bytearray -> Coverage
+    # lines: the line of every entry of the instruction table, 0 when it's not an instruction of the program
+    # branches: 1 for the entries that are a conditional branch
+    def __init__(self, fileName: str, lines: List[int], branches: bytearray):
+        self.fileName: str = fileName
+        self.lines: List[int] = lines
+        self.branches: bytearray = branches
+        self.fallThrough: bytearray = bytearray(len(lines))
+        self.jumped: bytearray = bytearray(len(lines))
+
+    def __str__(self) -> str:
+        return "{}({}, {} instructions)". \
+            format(type(self).__name__, self.fileName, sum(1 for line in self.lines if line > 0))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # merge:: Coverage -> Coverage -> None
+    # Adds the coverage of another run of the same program
+    # Raises ValueError when the other coverage is of a different program
+    def merge(self, other: "Coverage"):
+        if other.lines != self.lines or other.branches != self.branches:
+            raise ValueError(f"The coverage of {other.fileName} is not of the same program as the coverage of {self.fileName}")
+        for idx in range(len(self.lines)):
+            if other.fallThrough[idx]:
+                self.fallThrough[idx] = 1
+            if other.jumped[idx]:
+                self.jumped[idx] = 1
+
+    # lineCoverage:: Coverage -> {int: bool}
+    # Whether each line with an instruction has been executed
+    def lineCoverage(self) -> Dict[int, bool]:
+        res: Dict[int, bool] = {}
+        for idx, line in enumerate(self.lines):
+            if line > 0:
+                res[line] = res.get(line, False) or bool(self.fallThrough[idx] or self.jumped[idx])
+        return res
+
+    # branchCoverage:: Coverage -> [(int, Either bool None, Either bool None)]
+    # The line of every conditional branch, whether it has been taken and whether it has not been taken
+    # Both are None when the branch has never been executed
+    def branchCoverage(self) -> List[Tuple[int, Optional[bool], Optional[bool]]]:
+        res: List[Tuple[int, Optional[bool], Optional[bool]]] = []
+        for idx, line in enumerate(self.lines):
+            if self.branches[idx]:
+                if self.fallThrough[idx] or self.jumped[idx]:
+                    res.append((line, bool(self.jumped[idx]), bool(self.fallThrough[idx])))
+                else:
+                    res.append((line, None, None))
+        return res
+
+    # toBytes:: Coverage -> bytes
+    def toBytes(self) -> bytes:
+        name = self.fileName.encode()
+        count = len(self.lines)
+        return HEADER.pack(MAGIC, VERSION, count, len(name)) + name + struct.pack(f"<{count}I", *self.lines) + \
+            packBits(self.branches) + packBits(self.fallThrough) + packBits(self.jumped)
+
+
+# generateCoverageHook:: Coverage -> ((int, int, Either int None) -> None)
+# The hook for interpreter.runInstrumentedProgram that marks every executed instruction
+# Branches don't raise errors, so an instruction that raised an error doesn't mark a direction
+def generateCoverageHook(coverage: Coverage) -> Callable[[int, int, Optional[int]], None]:
+    fallThrough = coverage.fallThrough
+    jumped = coverage.jumped
+
+    def hook(index: int, pc: int, nextAddress: Optional[int]):
+        if nextAddress is None:
+            fallThrough[index] = 1
+        else:
+            jumped[index] = 1
+    return hook
+
+
+# newCoverage:: ProgramState -> String -> Coverage
+# An empty coverage of the program of a state
+# A fused instruction in the table is counted as its first instruction, the second one has its own entry
+def newCoverage(state: programState.ProgramState, fileName: str) -> Coverage:
+    lines: List[int] = []
+    branches = bytearray(len(state.instructions))
+    for idx, node in enumerate(state.instructions):
+        if isinstance(node, nodes.FusedInstructionNode):
+            node = node.first
+        if isinstance(node, nodes.InstructionNode) and not isinstance(node, nodes.SystemCall):
+            lines.append(node.line)
+            branches[idx] = isConditionalBranch(node)
+        else:
+            lines.append(0)
+    return Coverage(fileName, lines, branches)
+
+
+# readCoverage:: bytes -> Coverage
+# Raises ValueError when the data is not a coverage file
+def readCoverage(data: bytes) -> Coverage:
+    if len(data) < HEADER.size:
+        raise ValueError("The file is too short to be a coverage file")
+    magic, version, count, nameLength = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("The file is not a coverage file of this version of the interpreter")
+    bitmapSize = (count + 7) >> 3
+    position = HEADER.size
+    if len(data) != position + nameLength + 4 * count + 3 * bitmapSize:
+        raise ValueError("The coverage file is damaged")
+    fileName = data[position:position + nameLength].decode()
+    position += nameLength
+    lines = list(struct.unpack_from(f"<{count}I", data, position))
+    position += 4 * count
+    coverage = Coverage(fileName, lines, unpackBits(data[position:position + bitmapSize], count))
+    position += bitmapSize
+    coverage.fallThrough = unpackBits(data[position:position + bitmapSize], count)
+    position += bitmapSize
+    coverage.jumped = unpackBits(data[position:position + bitmapSize], count)
+    return coverage
+
+
+# formatSummary:: Coverage -> String
+# The share of the lines and branch directions that have been executed, and the lines that have not been executed
+def formatSummary(coverage: Coverage) -> str:
+    lines = coverage.lineCoverage()
+    hit = sum(lines.values())
+    branches = coverage.branchCoverage()
+    directions = 2 * len(branches)
+    taken = sum(int(bool(isTaken)) + int(bool(notTaken)) for _, isTaken, notTaken in branches)
+    res = f"Lines: {hit}/{len(lines)} ({hit * 100 / max(len(lines), 1):.1f}%)\n"
+    res += f"Branches: {taken}/{directions} ({taken * 100 / max(directions, 1):.1f}%)\n"
+    missed = sorted(line for line, executed in lines.items() if not executed)
+    if len(missed) > 0:
+        res += "Not executed: " + ", ".join(map(str, missed)) + "\n"
+    return res
+
+
+# formatLcov:: Coverage -> String
+# Generates a report in the tracefile format of lcov, which genhtml and most CI services can show
+# Every conditional branch is a block with two branches: 0 is taken and 1 is not taken
+def formatLcov(coverage: Coverage) -> str:
+    res = f"TN:\nSF:{coverage.fileName}\n"
+    lines = coverage.lineCoverage()
+    for line, executed in sorted(lines.items()):
+        res += f"DA:{line},{int(executed)}\n"
+    res += f"LF:{len(lines)}\nLH:{sum(lines.values())}\n"
+    branches = coverage.branchCoverage()
+    hit = 0
+    for block, (line, taken, notTaken) in enumerate(branches):
+        for branch, executed in enumerate((taken, notTaken)):
+            res += f"BRDA:{line},{block},{branch},{'-' if executed is None else int(executed)}\n"
+            hit += int(bool(executed))
+    res += f"BRF:{2 * len(branches)}\nBRH:{hit}\n"
+    return res + "end_of_record\n"
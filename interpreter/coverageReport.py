@@ -0,0 +1,56 @@
+import argparse
+import sys
+from typing import List, Optional
+
+import codeCoverage
+
+# Merges coverage files written by cli.py --coverage and converts them to an lcov report or a summary
+# usage: python coverageReport.py coverage.bin [coverage.bin ...] [-f {lcov,summary}] [-o OUTPUT] [-m MERGED]
+
+FORMATS = ["lcov", "summary"]
+
+
+# main:: [String] -> int
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Merge coverage files and convert them to an lcov report or a summary")
+    parser.add_argument("coverage", nargs="+", help="the coverage files written by cli.py --coverage, all of the same program")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="lcov",
+                        help="lcov: the tracefile format of lcov, summary: the share of the lines and branches that were executed (default: lcov)")
+    parser.add_argument("-o", "--output", default=None, help="the file to write the report to (default: the console)")
+    parser.add_argument("-m", "--merged", default=None, help="also write the merged coverage to this coverage file")
+    args = parser.parse_args(argv)
+
+    coverage: Optional[codeCoverage.Coverage] = None
+    for fileName in args.coverage:
+        try:
+            with open(fileName, "rb") as file:
+                data = file.read()
+            if coverage is None:
+                coverage = codeCoverage.readCoverage(data)
+            else:
+                coverage.merge(codeCoverage.readCoverage(data))
+        except OSError as e:
+            print(f"Could not read {fileName}: {e.strerror}", file=sys.stderr)
+            return 2
+        except ValueError as e:
+            print(f"Could not read {fileName}: {e}", file=sys.stderr)
+            return 1
+
+    report = codeCoverage.formatLcov(coverage) if args.format == "lcov" else codeCoverage.formatSummary(coverage)
+    try:
+        if args.merged is not None:
+            with open(args.merged, "wb") as file:
+                file.write(coverage.toBytes())
+        if args.output is None:
+            print(report, end="")
+        else:
+            with open(args.output, "w") as file:
+                file.write(report)
+    except OSError as e:
+        print(f"Could not write {e.filename}: {e.strerror}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
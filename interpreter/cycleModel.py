@@ -0,0 +1,46 @@
+from typing import Dict, Optional, Tuple
+
+# A model of the number of clock cycles the instructions take on a Cortex-M0, based on the instruction timings in the Cortex-M0 technical reference manual
+# Every InstructionNode gets the cost of its operation when it is created, so counting the cycles of an instruction is a single addition
+# The reports of the cycles are in profiler.py
+# Every instruction has two costs: the cycles when the program continues with the next instruction,
+#   and the cycles when it changes the flow of the program (a taken branch, or an instruction that writes the PC), which refills the pipeline
+# Memory is assumed to have no wait states, the internal subroutines of the interpreter (print_char and print_int) cost nothing
+
+# The cycles of MUL, a Cortex-M0 can be built with a fast (1 cycle) or a small (32 cycles) multiplier
+MUL_CYCLES = 1
+# The extra cycles to refill the pipeline when an instruction changes the flow of the program
+PIPELINE_REFILL = 2
+
+# The (not taken, taken) cycles of the instructions with a fixed cost
+FIXED_CYCLES: Dict[str, Tuple[int, int]] = {
+    "MUL": (MUL_CYCLES, MUL_CYCLES + PIPELINE_REFILL),
+    "LDR": (2, 2 + PIPELINE_REFILL),
+    "LDRH": (2, 2 + PIPELINE_REFILL),
+    "LDRB": (2, 2 + PIPELINE_REFILL),
+    "LDRSH": (2, 2 + PIPELINE_REFILL),
+    "LDRSB": (2, 2 + PIPELINE_REFILL),
+    "STR": (2, 2),
+    "STRH": (2, 2),
+    "STRB": (2, 2),
+    # Unconditional branches are always taken
+    "B": (3, 3),
+    "BL": (4, 4),
+    "BX": (3, 3),
+    "BLX": (3, 3),
+    **{branch: (1, 3) for branch in ["BCC", "BLO", "BCS", "BHS", "BEQ", "BGE", "BGT", "BHI", "BLE", "BLS", "BLT", "BMI", "BNE", "BPL", "BVC", "BVS"]}
+}
+
+# The cycles of the other data processing instructions (ADD, MOV, CMP, LSL, SXTH, ...)
+ALU_CYCLES: Tuple[int, int] = (1, 1 + PIPELINE_REFILL)
+
+
+# operationCycles:: String -> Either (int) None -> (int, int)
+# The (not taken, taken) cycles of an operation, PUSH and POP cost a cycle per register
+# registers: the register list of the operation, see nodes.Operation
+def operationCycles(opcode: str, registers: Optional[Tuple[int, ...]] = None) -> Tuple[int, int]:
+    if opcode in ("PUSH", "POP"):
+        count = len(registers)
+        # A POP that loads the PC returns from a subroutine
+        return 1 + count, 3 + count
+    return FIXED_CYCLES.get(opcode, ALU_CYCLES)
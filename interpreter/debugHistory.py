@@ -0,0 +1,259 @@
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+from bisect import bisect_right
+from collections import deque
+from contextlib import contextmanager
+import io
+
+import nodes
+import programContext
+import programState
+import interpreter
+
+# The history of a program in the debugger, so it can step back as well as forward
+# The last instructions can be undone with a journal of what they changed, older states are restored from a checkpoint
+#   and the instructions after the checkpoint are executed again. Programs don't read any input, so this gives the same states
+# Both the journal and the number of checkpoints are bounded, so long runs don't use more and more memory
+
+# The number of bytes in a page of memory, checkpoints only copy the pages that changed since the previous checkpoint
+PAGE_SIZE = 256
+# The number of instructions between checkpoints, doubled every time old checkpoints are evicted
+CHECKPOINT_INTERVAL = 1024
+# The maximum number of checkpoints
+MAX_CHECKPOINTS = 64
+# The number of instructions that can be undone with the journal
+JOURNAL_LENGTH = 4096
+
+
+# A copy of the state after a number of instructions
+# pages: the contents of the memory split in pages, a page that didn't change is shared with the previous checkpoint
+class Checkpoint:
+    def __init__(self, step: int, registers: Tuple[int, ...], flags: int, lowRegDirty: int, callStack: Tuple[int, ...], pages: List[bytes]):
+        self.step: int = step
+        self.registers: Tuple[int, ...] = registers
+        self.flags: int = flags
+        self.lowRegDirty: int = lowRegDirty
+        self.callStack: Tuple[int, ...] = callStack
+        self.pages: List[bytes] = pages
+
+    def __str__(self) -> str:
+        return "{}({}, {})". \
+            format(type(self).__name__, self.step, self.registers)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# What an instruction changed, so it can be undone
+# The registers, flags and call stack are the values before the instruction
+# writes: the address and old contents of every write to memory, see ProgramState.memoryJournal
+class JournalEntry:
+    def __init__(self, registers: Tuple[int, ...], flags: int, lowRegDirty: int, callStack: Tuple[int, ...]):
+        self.registers: Tuple[int, ...] = registers
+        self.flags: int = flags
+        self.lowRegDirty: int = lowRegDirty
+        self.callStack: Tuple[int, ...] = callStack
+        self.writes: List[Tuple[int, bytes]] = []
+
+    def __str__(self) -> str:
+        return "{}({}, {} writes)". \
+            format(type(self).__name__, self.registers, len(self.writes))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# ignoreWarning:: ProgramState -> String -> None
+# The warnings of instructions that are executed again have already been shown
+def ignoreWarning(state: programState.ProgramState, message: str):
+    pass
+
+
+# The output while instructions are executed again, it discards everything that is written to it
+class NullOutput(io.TextIOBase):
+    def write(self, text: str) -> int:
+        return len(text)
+
+
+NULL_OUTPUT = NullOutput()
+
+
+class ExecutionHistory:
+    # ExecutionHistory:: ProgramState -> String -> [String] -> ExecutionHistory
+    # The state must be at the start of the program, the history changes it in place
+    def __init__(self, state: programState.ProgramState, fileName: str, lines: List[str],
+                 checkpointInterval: int = CHECKPOINT_INTERVAL, maxCheckpoints: int = MAX_CHECKPOINTS, journalLength: int = JOURNAL_LENGTH):
+        self.state: programState.ProgramState = state
+        self.fileName: str = fileName
+        self.lines: List[str] = lines
+        # The number of instructions that have been executed to get to the current state
+        self.step: int = 0
+        # The highest step that has been reached, the output of instructions before it is not shown again
+        self.lastStep: int = 0
+        self.checkpointInterval: int = checkpointInterval
+        self.maxCheckpoints: int = maxCheckpoints
+        self.checkpoints: List[Checkpoint] = []
+        self.checkpoints.append(self.createCheckpoint())
+        self.journal: Deque[JournalEntry] = deque(maxlen=journalLength)
+
+    def __str__(self) -> str:
+        return "{}(step {}, {} checkpoints, {} journal entries)". \
+            format(type(self).__name__, self.step, len(self.checkpoints), len(self.journal))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # createCheckpoint:: ExecutionHistory -> Checkpoint
+    # Copies the current state, the pages of memory that are the same as in the last checkpoint before it are shared
+    def createCheckpoint(self) -> Checkpoint:
+        state = self.state
+        previous = self.checkpointBefore(self.step)
+        view = memoryview(state.memory)
+        pages: List[bytes] = []
+        for idx, start in enumerate(range(0, len(view), PAGE_SIZE)):
+            page = view[start:start + PAGE_SIZE]
+            if previous is not None and page == previous.pages[idx]:
+                pages.append(previous.pages[idx])
+            else:
+                pages.append(bytes(page))
+        return Checkpoint(self.step, tuple(state.registers), state.getFlags(), state.lowRegDirty, tuple(state.callStack), pages)
+
+    # checkpointBefore:: ExecutionHistory -> int -> Either Checkpoint None
+    # The last checkpoint at or before a step
+    def checkpointBefore(self, step: int) -> Optional[Checkpoint]:
+        idx = bisect_right([checkpoint.step for checkpoint in self.checkpoints], step)
+        return self.checkpoints[idx - 1] if idx > 0 else None
+
+    # addCheckpoint:: ExecutionHistory -> None
+    # Adds a checkpoint for the current step, when there are too many checkpoints every other checkpoint is evicted
+    # This keeps the checkpoints spread over the whole run, the distance between them doubles every time
+    def addCheckpoint(self):
+        steps = [checkpoint.step for checkpoint in self.checkpoints]
+        idx = bisect_right(steps, self.step)
+        if idx > 0 and steps[idx - 1] == self.step:
+            return
+        self.checkpoints.insert(idx, self.createCheckpoint())
+        if len(self.checkpoints) > self.maxCheckpoints:
+            # The first checkpoint is always kept, it is the start of the program
+            self.checkpoints = self.checkpoints[::2]
+            self.checkpointInterval *= 2
+
+    # restoreCheckpoint:: ExecutionHistory -> Checkpoint -> None
+    # The journal is cleared because its entries belong to later steps
+    def restoreCheckpoint(self, checkpoint: Checkpoint):
+        state = self.state
+        state.registers[:] = checkpoint.registers
+        state.setFlags(checkpoint.flags)
+        state.lowRegDirty = checkpoint.lowRegDirty
+        state.callStack = list(checkpoint.callStack)
+        state.memory[:] = b"".join(checkpoint.pages)
+        self.step = checkpoint.step
+        self.journal.clear()
+
+    # replaying:: ExecutionHistory -> ContextManager
+    # The output and warnings of instructions that are executed again are not shown again
+    # They are switched off once around a whole replay, not for every instruction
+    @contextmanager
+    def replaying(self) -> Iterator[None]:
+        state = self.state
+        output, warningHandler = programContext.output, state.warningHandler
+        programContext.output, state.warningHandler = NULL_OUTPUT, ignoreWarning
+        try:
+            yield
+        finally:
+            programContext.output, state.warningHandler = output, warningHandler
+
+    # stepForward:: ExecutionHistory -> bool
+    # Executes the next instruction, returns False when the program has stopped
+    def stepForward(self) -> bool:
+        if self.step < self.lastStep:
+            with self.replaying():
+                return self.executeNext()
+        return self.executeNext()
+
+    # executeNext:: ExecutionHistory -> bool
+    # stepForward without switching the output, for loops that are already inside replaying
+    def executeNext(self) -> bool:
+        state = self.state
+        node: nodes.InstructionNode = state.getInstructionFromMem(state.registers[programState.PC_ID])
+        entry = JournalEntry(tuple(state.registers), state.getFlags(), state.lowRegDirty, tuple(state.callStack))
+        state.memoryJournal = entry.writes
+        try:
+            _, success = interpreter.executeInstruction(node, state, self.fileName, self.lines)
+        finally:
+            state.memoryJournal = None
+        if not success:
+            return False
+        self.journal.append(entry)
+        self.step += 1
+        self.lastStep = max(self.lastStep, self.step)
+        if self.step % self.checkpointInterval == 0:
+            self.addCheckpoint()
+        return True
+
+    # undo:: ExecutionHistory -> JournalEntry -> None
+    def undo(self, entry: JournalEntry):
+        state = self.state
+        for address, contents in reversed(entry.writes):
+            state.memory[address:address + len(contents)] = contents
+        state.registers[:] = entry.registers
+        state.setFlags(entry.flags)
+        state.lowRegDirty = entry.lowRegDirty
+        state.callStack = list(entry.callStack)
+        self.step -= 1
+
+    # stepBack:: ExecutionHistory -> bool
+    # Goes back to the state before the last instruction, returns False at the start of the program
+    def stepBack(self) -> bool:
+        if self.step == 0:
+            return False
+        if len(self.journal) > 0:
+            self.undo(self.journal.pop())
+            return True
+        return self.goTo(self.step - 1)
+
+    # goTo:: ExecutionHistory -> int -> bool
+    # Goes to the state after a number of instructions, returns False when the program stopped before it
+    def goTo(self, target: int) -> bool:
+        target = max(target, 0)
+        if target < self.step:
+            if self.step - target <= len(self.journal):
+                while self.step > target:
+                    self.undo(self.journal.pop())
+                return True
+            self.restoreCheckpoint(self.checkpointBefore(target))
+        if self.step < min(target, self.lastStep):
+            with self.replaying():
+                while self.step < min(target, self.lastStep):
+                    if not self.executeNext():
+                        return False
+        while self.step < target:
+            if not self.stepForward():
+                return False
+        return True
+
+    # reverseContinue:: ExecutionHistory -> (ProgramState -> bool) -> bool
+    # Goes back to the last state before the current one for which isBreakpoint is True, or to the start of the program
+    # Returns False when no breakpoint was found
+    def reverseContinue(self, isBreakpoint: Callable[[programState.ProgramState], bool]) -> bool:
+        # First undo the instructions in the journal one by one
+        while len(self.journal) > 0:
+            self.undo(self.journal.pop())
+            if isBreakpoint(self.state):
+                return True
+        # Then search the parts between the checkpoints from back to front, by executing them again
+        end = self.step
+        while end > 0:
+            checkpoint = self.checkpointBefore(end - 1)
+            self.restoreCheckpoint(checkpoint)
+            hits: List[int] = []
+            with self.replaying():
+                while self.step < end:
+                    if isBreakpoint(self.state):
+                        hits.append(self.step)
+                    self.executeNext()
+            if len(hits) > 0:
+                self.goTo(hits[-1])
+                return True
+            end = checkpoint.step
+        self.goTo(0)
+        return False
@@ -0,0 +1,76 @@
+from typing import Optional
+import time
+
+import programState
+
+# Limits for a run of a program, so a program with an infinite loop, or one that keeps printing, can't keep a worker busy forever
+# The run loops of interpreter.py only compare the number of executed instructions with the next check,
+#   the limits are checked when it has been reached, which is every CHECK_INTERVAL instructions
+# The limit on the number of instructions is exact, apart from the second instruction of a fused pair that runs past it.
+# The time and output limits are only checked every CHECK_INTERVAL instructions, so a program can run a bit past them
+
+# The number of instructions between checks of the time and output limits
+CHECK_INTERVAL = 10000
+
+
+class Budget:
+    # Budget:: Either int None -> Either float None -> Either int None -> int -> Budget
+    # maxSteps: the number of instructions, maxTime: the run time in seconds, maxOutput: the number of characters the program can print
+    # No limit is set when a value is None
+    def __init__(self, maxSteps: Optional[int] = None, maxTime: Optional[float] = None, maxOutput: Optional[int] = None,
+                 interval: int = CHECK_INTERVAL):
+        self.maxSteps: Optional[int] = maxSteps
+        self.maxTime: Optional[float] = maxTime
+        self.maxOutput: Optional[int] = maxOutput
+        self.interval: int = interval
+        # The time at which the time limit is exceeded, set by start
+        self.deadline: Optional[float] = None
+        # Set by stop from another thread, like the stop tool of the visualizer
+        self.stopped: bool = False
+        # The description of the limit that stopped the program, None when it hasn't been stopped by a limit
+        self.exceeded: Optional[str] = None
+
+    def __str__(self) -> str:
+        return "{}({}, {}, {})". \
+            format(type(self).__name__, self.maxSteps, self.maxTime, self.maxOutput)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # start:: Budget -> ProgramState -> int
+    # Called by a run loop before the program runs, starts the time limit
+    # Returns the number of instructions at which the limits are checked first
+    def start(self, state: programState.ProgramState) -> int:
+        if self.maxTime is not None:
+            self.deadline = time.perf_counter() + self.maxTime
+        self.exceeded = None
+        return self.nextCheck(state.steps)
+
+    # nextCheck:: Budget -> int -> int
+    # The number of instructions at which the limits are checked next, never past the limit on the number of instructions
+    def nextCheck(self, steps: int) -> int:
+        res = steps + self.interval
+        if self.maxSteps is not None and res > self.maxSteps:
+            return self.maxSteps
+        return res
+
+    # stop:: Budget -> None
+    # Stops the program at the next check, without an error
+    def stop(self):
+        self.stopped = True
+
+    # check:: Budget -> ProgramState -> int -> Either RunError None
+    # Returns the error to stop the program with when it has been stopped or a limit has been exceeded
+    # A program that has been stopped gets an error without a stacktrace, a limit that has been exceeded gets an error with a stacktrace
+    def check(self, state: programState.ProgramState, steps: int) -> Optional[programState.RunError]:
+        if self.stopped:
+            return programState.RunError("The program has been stopped", programState.RunError.ErrorType.NoError)
+        if self.maxSteps is not None and steps >= self.maxSteps:
+            self.exceeded = f"the program has been stopped after {steps} instructions, the limit is {self.maxSteps} instructions"
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.exceeded = f"the program has been stopped after {steps} instructions, the limit is {self.maxTime} seconds"
+        elif self.maxOutput is not None and state.outputSize > self.maxOutput:
+            self.exceeded = f"the program has been stopped after printing {state.outputSize} characters, the limit is {self.maxOutput} characters"
+        else:
+            return None
+        return programState.RunError("Budget exceeded, " + self.exceeded, programState.RunError.ErrorType.Error)
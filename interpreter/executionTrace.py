@@ -0,0 +1,406 @@
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import functools
+import queue
+import struct
+import threading
+
+import nodes
+import programState
+
+# A compact binary trace of every instruction a program executes, see interpreter.runTracedProgram and generateTraceHook
+#
+# A trace file starts with MAGIC, the version, the 16 registers as 32 bit words and the flags before the first instruction.
+# After that there is a record for every executed instruction:
+#   header: a byte, PC_JUMP | FLAGS_CHANGED | MEMORY_WRITTEN | the number of registers that changed (the PC is not counted)
+#   PC_JUMP: the difference between the address of the instruction and the address after the previous instruction, as a signed varint
+#   a register that changed: the register id as a byte and the difference with its previous value, as a signed varint
+#   FLAGS_CHANGED: the packed flags as a byte
+#   MEMORY_WRITTEN: the number of writes as a varint, for every write the address as a varint, the number of bytes and the new contents
+# Varints store 7 bits per byte starting with the lowest bits, the highest bit is set when another byte follows.
+# Signed varints are zigzag encoded first, so small negative numbers stay small.
+#
+# The compiled blocks of blockCompiler.py don't encode a record per instruction, that would cost more than running the instruction.
+# A block adds its layout once, and after that a run with the values its instructions wrote every time it runs:
+#   BLOCK_LAYOUT: the id of the layout, the address of its first instruction and the number of instructions as varints,
+#     then for every instruction: the number of registers it writes and their ids, 1 when it sets the flags and 0 otherwise,
+#     and the number of writes to memory and their sizes, all as bytes
+#   BLOCK_RUN: the id of a layout and the number of its instructions that ran as varints, then for every instruction that ran:
+#     the new values of its registers as 32 bit words, the packed flags as a byte, and the address of every write as a 32 bit word
+#     followed by the new contents, see layoutFormat
+# These headers can't be the header of an instruction, which changes 15 registers at most. readTrace turns the instructions of
+#   a run into records like the ones of the other instructions, with only the registers and flags that changed
+#
+# The records are written into a ring of buffers, a background thread writes the full buffers to the file.
+
+MAGIC = b"ASMTRACE"
+VERSION = 2
+
+PC_JUMP = 0x80
+FLAGS_CHANGED = 0x40
+MEMORY_WRITTEN = 0x20
+REGISTER_COUNT_MASK = 0x1F
+BLOCK_LAYOUT = 0x1F
+BLOCK_RUN = 0x1E
+
+# The size and the number of the buffers of a TraceWriter
+BUFFER_SIZE = 1 << 16
+BUFFER_COUNT = 8
+
+HEADER = struct.Struct("<8sB16IB")
+
+# The varints of the values below 128, which are a single byte
+SMALL_VARINTS: List[bytes] = [bytes([value]) for value in range(0x80)]
+
+# All registers except the PC, for instructions where it's not known which registers they change
+ALL_REGISTERS: Tuple[int, ...] = tuple(range(programState.PC_ID))
+
+# The struct formats of the contents of a write to memory by its size
+CONTENTS_FORMATS: Dict[int, str] = {1: "B", 2: "H", 4: "I"}
+
+# The layout of a block: for every instruction the registers it writes, whether it sets the flags and the sizes of its writes to memory
+Layout = List[Tuple[Tuple[int, ...], bool, Tuple[int, ...]]]
+
+
+# encodeVarint:: int -> bytes
+def encodeVarint(value: int) -> bytes:
+    if value < 0x80:
+        return SMALL_VARINTS[value]
+    res = bytearray()
+    while value >= 0x80:
+        res.append((value & 0x7F) | 0x80)
+        value >>= 7
+    res.append(value)
+    return bytes(res)
+
+
+# decodeVarint:: bytes -> int -> (int, int)
+# Returns the value and the position after it
+def decodeVarint(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+# decodeSignedVarint:: bytes -> int -> (int, int)
+def decodeSignedVarint(data: bytes, position: int) -> Tuple[int, int]:
+    value, position = decodeVarint(data, position)
+    return (value >> 1) if (value & 1) == 0 else -((value + 1) >> 1), position
+
+
+# layoutFormat:: Layout -> String
+# The struct format of the values of a run of the instructions of a layout, without the byte order
+def layoutFormat(layout: Layout) -> str:
+    return "".join("I" * len(registers) + ("B" if flags else "") + "".join("I" + CONTENTS_FORMATS[size] for size in sizes)
+                   for registers, flags, sizes in layout)
+
+
+# runPacker:: int -> Layout -> (int... -> bytes)
+# The function that encodes a run of the instructions of a layout from their values, the header and the id come first
+def runPacker(layoutId: int, layout: Layout) -> Callable[..., bytes]:
+    prefix = bytes([BLOCK_RUN]) + encodeVarint(layoutId) + encodeVarint(len(layout))
+    return functools.partial(struct.Struct(f"<{len(prefix)}s{layoutFormat(layout)}").pack, prefix)
+
+
+# writtenRegisters:: InstructionNode -> (int)
+# The registers an instruction can change, except the PC
+# Only these registers are compared after the instruction, so the trace doesn't have to compare all registers after every instruction
+def writtenRegisters(node: Optional[nodes.InstructionNode]) -> Tuple[int, ...]:
+    if not isinstance(node, nodes.InstructionNode):
+        return ()
+    if isinstance(node, nodes.FusedInstructionNode):
+        node = node.first
+    operation = node.operation
+    if operation is None or isinstance(node, nodes.SystemCall):
+        return ALL_REGISTERS
+    opcode = operation.opcode
+    if opcode == "PUSH":
+        return programState.SP_ID,
+    if opcode == "POP":
+        return tuple(register for register in operation.registers if register != programState.PC_ID) + (programState.SP_ID,)
+    if opcode == "BL":
+        return programState.LR_ID,
+    # Stores use rd for the register that is stored
+    if opcode.startswith("STR") or operation.rd is None or operation.rd == programState.PC_ID:
+        return ()
+    return operation.rd,
+
+
+# Writes the trace of a program to a file
+# The records are appended to a buffer, a full buffer is handed to the writer thread and the next free buffer is used.
+# The writer thread empties the buffers it has written and hands them back, so the same buffers are used over and over.
+# A buffer is full when it holds at least bufferSize bytes, a record is never split, so a buffer can be larger than bufferSize
+#   when it ends with a large record, like an instruction that writes a lot of memory.
+# When the writer thread can't keep up, the program waits until a buffer is free, so no records are lost
+class TraceWriter:
+    # TraceWriter:: BinaryIO -> ProgramState -> int -> int -> TraceWriter
+    # The header is written with the current registers and flags of the state
+    def __init__(self, file: BinaryIO, state: programState.ProgramState, bufferSize: int = BUFFER_SIZE, bufferCount: int = BUFFER_COUNT):
+        self.file: BinaryIO = file
+        self.bufferSize: int = bufferSize
+        # The buffers that can be filled, and the full buffers that must be written to the file
+        self.free: queue.Queue = queue.Queue()
+        self.full: queue.Queue = queue.Queue()
+        for _ in range(bufferCount - 1):
+            self.free.put(bytearray())
+        self.buffer: bytearray = bytearray()
+        # The values of the registers and flags after the last record, see generateTraceHook and blockCompiler.BlockSource.record
+        self.registers: List[int] = list(state.registers)
+        self.flags: int = state.getFlags()
+        # The address after the last recorded instruction, an instruction at this address doesn't need PC_JUMP
+        self.nextAddress: int = state.registers[programState.PC_ID]
+        # The number of layouts of blocks that have been added, see addLayout
+        self.layouts: int = 0
+        self.error: Optional[OSError] = None
+        self.write(HEADER.pack(MAGIC, VERSION, *self.registers, self.flags))
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def __str__(self) -> str:
+        return "{}({} byte buffers)". \
+            format(type(self).__name__, self.bufferSize)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # drain:: TraceWriter -> None
+    # The writer thread, writes full buffers until close sends None
+    def drain(self):
+        while True:
+            buffer = self.full.get()
+            if buffer is None:
+                return
+            if self.error is None:
+                try:
+                    self.file.write(buffer)
+                except OSError as err:
+                    # The error is raised by close, the program keeps running
+                    self.error = err
+            buffer.clear()
+            self.free.put(buffer)
+
+    # write:: TraceWriter -> bytes -> None
+    def write(self, data: bytes):
+        self.buffer += data
+        if len(self.buffer) >= self.bufferSize:
+            self.nextBuffer()
+
+    # addLayout:: TraceWriter -> int -> Layout -> int
+    # Adds the layout of a block that starts at address, returns its id for the runs of the block, see runPacker
+    def addLayout(self, address: int, layout: Layout) -> int:
+        layoutId = self.layouts
+        self.layouts += 1
+        data = bytearray([BLOCK_LAYOUT]) + encodeVarint(layoutId) + encodeVarint(address) + encodeVarint(len(layout))
+        for registers, flags, sizes in layout:
+            data += bytes([len(registers)]) + bytes(registers) + bytes([1 if flags else 0, len(sizes)]) + bytes(sizes)
+        self.write(data)
+        return layoutId
+
+    # nextBuffer:: TraceWriter -> None
+    # Hands the current buffer to the writer thread and continues with a free buffer, waits when there is none
+    def nextBuffer(self):
+        self.full.put(self.buffer)
+        self.buffer = self.free.get()
+
+    # close:: TraceWriter -> None
+    # Writes the remaining records and waits for the writer thread, the file itself is not closed
+    def close(self):
+        self.full.put(self.buffer)
+        self.full.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+# generateTraceHook:: TraceWriter -> ProgramState -> ((int, int, Either int None) -> None)
+# The hook for interpreter.runInstrumentedProgram that writes the record of every instruction
+# This runs after every instruction so it is kept as short as possible: the record is appended to the buffer right away
+#   and only the registers the instruction can change are compared, see writtenRegisters
+# The memory writes are collected with ProgramState.memoryJournal, which is set here and must be reset to None after the run
+# The compiled blocks of a traced run append their records as well, so the last flags and address are kept in the trace
+def generateTraceHook(trace: TraceWriter, state: programState.ProgramState) -> Callable[[int, int, Optional[int]], None]:
+    written = list(map(writtenRegisters, state.instructions))
+    journal: List[Tuple[int, bytes]] = []
+    state.memoryJournal = journal
+    values = state.registers
+    previous = trace.registers
+    bufferSize = trace.bufferSize
+    packed = programState.FLAGS_PACKED
+
+    def hook(index: int, pc: int, nextAddress: Optional[int]):
+        buffer = trace.buffer
+        expected = trace.nextAddress
+        trace.nextAddress = pc + 4
+        start = len(buffer)
+        # The header is filled in at the end
+        buffer.append(0)
+        header = 0
+        if pc != expected:
+            header = PC_JUMP
+            delta = pc - expected
+            zigzag = delta << 1 if delta >= 0 else (-delta << 1) - 1
+            while zigzag >= 0x80:
+                buffer.append((zigzag & 0x7F) | 0x80)
+                zigzag >>= 7
+            buffer.append(zigzag)
+        for register in written[index]:
+            value = values[register]
+            old = previous[register]
+            if value != old:
+                previous[register] = value
+                # The zigzag encoding of the difference as a signed 32 bit number
+                delta = (value - old) & 0xFFFF_FFFF
+                zigzag = delta << 1 if delta < 0x8000_0000 else ((0x1_0000_0000 - delta) << 1) - 1
+                buffer.append(register)
+                while zigzag >= 0x80:
+                    buffer.append((zigzag & 0x7F) | 0x80)
+                    zigzag >>= 7
+                buffer.append(zigzag)
+                header += 1
+        if state.flagKind != packed or state.flags != trace.flags:
+            newFlags = state.getFlags()
+            if newFlags != trace.flags:
+                header |= FLAGS_CHANGED
+                buffer.append(newFlags)
+                trace.flags = newFlags
+        if journal:
+            header |= MEMORY_WRITTEN
+            memory = state.memory
+            buffer += encodeVarint(len(journal))
+            for writeAddress, contents in journal:
+                size = len(contents)
+                value = writeAddress
+                while value >= 0x80:
+                    buffer.append((value & 0x7F) | 0x80)
+                    value >>= 7
+                buffer.append(value)
+                buffer.append(size)
+                # The journal holds the old contents
+                buffer += memory[writeAddress:writeAddress + size]
+            journal.clear()
+        if header:
+            buffer[start] = header
+        if len(buffer) >= bufferSize:
+            trace.nextBuffer()
+    return hook
+
+
+# A decoded record of a trace
+# registers: the registers that changed with their new value, writes: the address and new contents of every memory write
+class TraceRecord:
+    def __init__(self, step: int, address: int, registers: Dict[int, int], flags: Optional[int], writes: List[Tuple[int, bytes]]):
+        self.step: int = step
+        self.address: int = address
+        self.registers: Dict[int, int] = registers
+        self.flags: Optional[int] = flags
+        self.writes: List[Tuple[int, bytes]] = writes
+
+    def __str__(self) -> str:
+        return "{}({}, {}, {}, {}, {})". \
+            format(type(self).__name__, self.step, self.address, self.registers, self.flags, self.writes)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# readTrace:: bytes -> ([int], int, Iterator[TraceRecord])
+# Decodes a trace, returns the registers and flags at the start and the records
+# Raises ValueError when the data is not a trace
+def readTrace(data: bytes) -> Tuple[List[int], int, Iterator[TraceRecord]]:
+    if len(data) < HEADER.size:
+        raise ValueError("The file is too short to be a trace")
+    magic, version, *fields = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("The file is not a trace of this version of the interpreter")
+    registers: List[int] = fields[:16]
+    flags: int = fields[16]
+
+    def records() -> Iterator[TraceRecord]:
+        values = list(registers)
+        currentFlags = flags
+        nextAddress = values[programState.PC_ID]
+        position = HEADER.size
+        step = 0
+        # The address and instructions of every layout, and the structs of the runs by layout and number of instructions
+        layouts: Dict[int, Tuple[int, Layout]] = {}
+        runStructs: Dict[Tuple[int, int], struct.Struct] = {}
+        while position < len(data):
+            header = data[position]
+            position += 1
+            if header == BLOCK_LAYOUT:
+                layoutId, position = decodeVarint(data, position)
+                address, position = decodeVarint(data, position)
+                count, position = decodeVarint(data, position)
+                layout: Layout = []
+                for _ in range(count):
+                    registerCount = data[position]
+                    written = tuple(data[position + 1:position + 1 + registerCount])
+                    position += 1 + registerCount
+                    flagsSet = data[position] != 0
+                    sizes = tuple(data[position + 2:position + 2 + data[position + 1]])
+                    position += 2 + len(sizes)
+                    layout.append((written, flagsSet, sizes))
+                layouts[layoutId] = (address, layout)
+                continue
+            if header == BLOCK_RUN:
+                layoutId, position = decodeVarint(data, position)
+                count, position = decodeVarint(data, position)
+                address, layout = layouts[layoutId]
+                if (layoutId, count) not in runStructs:
+                    runStructs[(layoutId, count)] = struct.Struct("<" + layoutFormat(layout[:count]))
+                runStruct = runStructs[(layoutId, count)]
+                runValues = runStruct.unpack_from(data, position)
+                position += runStruct.size
+                idx = 0
+                for written, flagsSet, sizes in layout[:count]:
+                    changed: Dict[int, int] = {}
+                    for register in written:
+                        if runValues[idx] != values[register]:
+                            values[register] = changed[register] = runValues[idx]
+                        idx += 1
+                    recordFlags: Optional[int] = None
+                    if flagsSet:
+                        if runValues[idx] != currentFlags:
+                            currentFlags = recordFlags = runValues[idx]
+                        idx += 1
+                    writes: List[Tuple[int, bytes]] = []
+                    for size in sizes:
+                        writes.append((runValues[idx], runValues[idx + 1].to_bytes(size, "little")))
+                        idx += 2
+                    yield TraceRecord(step, address, changed, recordFlags, writes)
+                    step += 1
+                    address += 4
+                nextAddress = address
+                continue
+            address = nextAddress
+            if header & PC_JUMP:
+                delta, position = decodeSignedVarint(data, position)
+                address += delta
+            changed = {}
+            for _ in range(header & REGISTER_COUNT_MASK):
+                register = data[position]
+                delta, position = decodeSignedVarint(data, position + 1)
+                values[register] = (values[register] + delta) & 0xFFFF_FFFF
+                changed[register] = values[register]
+            recordFlags = None
+            if header & FLAGS_CHANGED:
+                recordFlags = currentFlags = data[position]
+                position += 1
+            writes = []
+            if header & MEMORY_WRITTEN:
+                count, position = decodeVarint(data, position)
+                for _ in range(count):
+                    writeAddress, position = decodeVarint(data, position)
+                    size = data[position]
+                    writes.append((writeAddress, bytes(data[position + 1:position + 1 + size])))
+                    position += 1 + size
+            nextAddress = address + 4
+            yield TraceRecord(step, address, changed, recordFlags, writes)
+            step += 1
+
+    return registers, flags, records()
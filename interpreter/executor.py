@@ -0,0 +1,308 @@
+from typing import Callable, Dict, Optional
+from functools import partial
+
+import nodes
+import programState
+import instructions
+import instructionsMemory
+import instructionsUtils
+
+# Table driven backend: every opcode has one handler that runs any operation with that opcode by reading its operands from the Operation
+# The closure backend (instructions.generateFunction) generates a specialised function for every instruction instead,
+#   which is faster but hides the operands in closure variables
+# handler:: Operation -> ProgramState -> Either int None, returns the next address when the operation changes the flow of the program
+
+
+# secondOperand:: ProgramState -> Operation -> int
+# The last operand of an ALU operation: the register rm or the immediate value
+def secondOperand(state: programState.ProgramState, operation: nodes.Operation) -> int:
+    if operation.rm is not None:
+        return state.getRegByID(operation.rm)
+    return operation.immediate & 0xFFFFFFFF
+
+
+# shiftAmount:: ProgramState -> Operation -> int -> int
+# The shift value of a shift operation, a shift value from a register is checked against maxValue
+def shiftAmount(state: programState.ProgramState, operation: nodes.Operation, maxValue: int) -> int:
+    if operation.rm is None:
+        return operation.immediate
+    value = state.getRegByID(operation.rm)
+    if value > maxValue:
+        raise programState.RunError(f"Shift value is out of range: value must be below {maxValue + 1} but is {value}", programState.RunError.ErrorType.Error)
+    return value
+
+
+# setAddResult:: ProgramState -> Operation -> int -> int -> None
+# Stores the result of an addition in rd, when the operation has one, and saves what's needed to calculate the flags
+def setAddResult(state: programState.ProgramState, operation: nodes.Operation, a: int, b: int) -> None:
+    out = a + b
+    if operation.rd is not None:
+        state.setRegByID(operation.rd, out & 0xFFFFFFFF)
+    # The flags are calculated when they are needed
+    state.flagKind = programState.FLAGS_ADD
+    state.flagA = a
+    state.flagB = b
+    state.flagResult = out
+
+
+# setLogicResult:: ProgramState -> Operation -> int -> bool -> None
+# Stores the result of a logic operation in rd, when the operation has one, and saves what's needed to calculate the flags
+def setLogicResult(state: programState.ProgramState, operation: nodes.Operation, out: int, carry: bool) -> None:
+    if operation.rd is not None:
+        state.setRegByID(operation.rd, out)
+    state.flagKind = programState.FLAGS_LOGIC
+    state.flagB = carry
+    state.flagResult = out
+
+
+# executeADD:: Operation -> ProgramState -> None
+# Runs the ADD, ADC and CMN operations
+def executeADD(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    a = state.getRegByID(operation.rn)
+    b = secondOperand(state, operation)
+    if operation.opcode == "ADC" and state.getFlags() & programState.C_FLAG:
+        b += 1
+    setAddResult(state, operation, a, b)
+
+
+# executeSUB:: Operation -> ProgramState -> None
+# Runs the SUB, SBC and CMP operations
+def executeSUB(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    a = state.getRegByID(operation.rn)
+    b = secondOperand(state, operation)
+    # subtract one more if carry is set
+    if operation.opcode == "SBC" and state.getFlags() & programState.C_FLAG:
+        b += 1
+    setAddResult(state, operation, a, ((~b)+1) & 0xFFFFFFFF)
+
+
+# executeMUL:: Operation -> ProgramState -> None
+def executeMUL(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    out32 = (state.getRegByID(operation.rn) * state.getRegByID(operation.rm)) & 0xFFFFFFFF
+    state.setRegByID(operation.rd, out32)
+    # The carry and overflow flags are unaffected
+    flags = state.getFlags() & (programState.C_FLAG | programState.V_FLAG)
+    state.setFlags((programState.N_FLAG if (out32 >> 31) & 1 else 0) | (programState.Z_FLAG if out32 == 0 else 0) | flags)
+
+
+# The function that combines the operands of each logic operation
+LOGIC_FUNCTIONS: Dict[str, Callable[[int, int], int]] = {
+    "AND": lambda a, b: a & b,
+    "TST": lambda a, b: a & b,
+    "EOR": lambda a, b: a ^ b,
+    "ORR": lambda a, b: a | b,
+    "BIC": lambda a, b: a & (b ^ 0xFFFF_FFFF)
+}
+
+
+# executeLogic:: Operation -> ProgramState -> None
+# Runs the operations of LOGIC_FUNCTIONS
+def executeLogic(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    out = LOGIC_FUNCTIONS[operation.opcode](state.getRegByID(operation.rn), secondOperand(state, operation))
+    setLogicResult(state, operation, out, False)
+
+
+# shiftCarry:: ProgramState -> int -> int -> int -> bool
+# The last bit shifted out, the C flag is unaffected if the shift value is 0 - ARM docs
+def shiftCarry(state: programState.ProgramState, shift: int, value: int, bit: int) -> bool:
+    if shift == 0:
+        return bool(state.getFlags() & programState.C_FLAG)
+    return bool((value >> bit) & 1)
+
+
+# executeLSL:: Operation -> ProgramState -> None
+def executeLSL(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    a = state.getRegByID(operation.rn)
+    b = shiftAmount(state, operation, 31)
+    out = a << b
+    setLogicResult(state, operation, out & 0xFFFF_FFFF, shiftCarry(state, b, out, 32))
+
+
+# executeLSR:: Operation -> ProgramState -> None
+# Runs the LSR and ASR operations
+def executeLSR(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    a = state.getRegByID(operation.rn)
+    b = shiftAmount(state, operation, 32)
+    out32 = (a >> b) & 0xFFFF_FFFF
+    if operation.opcode == "ASR" and ((a >> 31) & 1) == 1:  # sign-extend
+        out32 |= (0xFFFF_FFFF << (32 - b)) & 0xFFFF_FFFF
+    setLogicResult(state, operation, out32, shiftCarry(state, b, a, b-1))
+
+
+# executeROR:: Operation -> ProgramState -> None
+def executeROR(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    a = state.getRegByID(operation.rn)
+    b = secondOperand(state, operation)
+    bMod32 = b & 31
+    out32 = ((a >> bMod32) | (a << (32 - bMod32))) & 0xFFFF_FFFF
+    setLogicResult(state, operation, out32, shiftCarry(state, b, a, bMod32-1))
+
+
+# executeMOV:: Operation -> ProgramState -> None
+# Runs the MOV and MOVN operations, an immediate value has already been inverted by the decoder
+def executeMOV(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    if operation.rm is None:
+        state.setRegByID(operation.rd, operation.immediate)
+    elif operation.opcode == "MOVN":
+        state.setRegByID(operation.rd, state.getRegByID(operation.rm) ^ 0xFFFF_FFFF)
+    else:
+        state.setRegByID(operation.rd, state.getRegByID(operation.rm))
+
+
+# The mask and the sign bit of each extend operation, the sign bit is 0 for an unsigned extend
+EXTEND_OPERATIONS: Dict[str, tuple] = {
+    "SXTH": (0xFFFF, 0b1000_0000_0000_0000),
+    "SXTB": (0xFF, 0b1000_0000),
+    "UXTH": (0xFFFF, 0),
+    "UXTB": (0xFF, 0)
+}
+
+
+# executeExtend:: Operation -> ProgramState -> None
+def executeExtend(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    mask, signBit = EXTEND_OPERATIONS[operation.opcode]
+    value = state.getRegByID(operation.rm)
+    if value & signBit:
+        value |= 0xFFFF_FFFF ^ mask  # Set the upper bits when sign bit is set
+    else:
+        value &= mask
+    state.setRegByID(operation.rd, value)
+
+
+# memoryAddress:: ProgramState -> Operation -> int
+# The address used by a load or store operation: the base register plus the offset register or the immediate offset
+def memoryAddress(state: programState.ProgramState, operation: nodes.Operation) -> int:
+    address = state.getRegByID(operation.rn)
+    if operation.rm is not None:
+        return address + state.getRegByID(operation.rm)
+    if operation.immediate is not None:
+        return address + operation.immediate
+    return address
+
+
+# executeLDR:: Operation -> ProgramState -> None
+# Runs the operations of instructionsMemory.LOAD_OPERATIONS
+def executeLDR(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    if operation.rn is None:
+        # LDR rd, =value and LDR rd, =label
+        state.setRegByID(operation.rd, operation.immediate)
+        return
+    bitSize, sign_extend = instructionsMemory.LOAD_OPERATIONS[operation.opcode]
+    state.loadRegister(memoryAddress(state, operation), bitSize, sign_extend, operation.rd)
+
+
+# executeSTR:: Operation -> ProgramState -> None
+# Runs the operations of instructionsMemory.STORE_OPERATIONS
+def executeSTR(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    state.storeRegister(memoryAddress(state, operation), operation.rd, instructionsMemory.STORE_OPERATIONS[operation.opcode])
+
+
+# executePUSH:: Operation -> ProgramState -> None
+# The immediate value is the stack size
+def executePUSH(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    address = state.registers[programState.SP_ID]
+    # check address is in 0...stacksize
+    if address > operation.immediate or address < 0:
+        raise programState.RunError("Stack overflow", programState.RunError.ErrorType.Error)
+    for reg in operation.registers:
+        address -= 4
+        state.storeRegister(address, reg, 32)
+    state.setRegByID(programState.SP_ID, address)
+
+
+# executePOP:: Operation -> ProgramState -> None
+# The immediate value is the stack size
+def executePOP(operation: nodes.Operation, state: programState.ProgramState) -> None:
+    address = state.registers[programState.SP_ID]
+    # check address is in 0...stacksize
+    if address > operation.immediate or address < 0:
+        raise programState.RunError("All stack entries have been pop'ed already", programState.RunError.ErrorType.Error)
+    for reg in operation.registers:
+        state.loadRegister(address, 32, False, reg)
+        address += 4
+    state.setRegByID(programState.SP_ID, address)
+
+
+# executeBranch:: Operation -> ProgramState -> Either int None
+# The immediate value is the address of the label
+def executeBranch(operation: nodes.Operation, state: programState.ProgramState) -> Optional[int]:
+    if instructions.BRANCH_TAKEN[operation.opcode][state.getFlags()]:
+        return operation.immediate
+    return None
+
+
+# executeBL:: Operation -> ProgramState -> int
+# The immediate value is the address of the label
+def executeBL(operation: nodes.Operation, state: programState.ProgramState) -> int:
+    # Save return address in LR
+    pc = state.registers[programState.PC_ID]
+    state.registers[programState.LR_ID] = pc
+    state.callStack.append(pc)
+    return operation.immediate
+
+
+# executeBX:: Operation -> ProgramState -> int
+def executeBX(operation: nodes.Operation, state: programState.ProgramState) -> int:
+    # BX LR returns from a subroutine
+    return state.returnTo(state.getRegByID(operation.rm))
+
+
+# executeBLX:: Operation -> ProgramState -> int
+def executeBLX(operation: nodes.Operation, state: programState.ProgramState) -> int:
+    # Read the address before LR is changed, BLX LR jumps to the old value of LR
+    address = state.getRegByID(operation.rm)
+    # Save return address in LR
+    pc = state.registers[programState.PC_ID]
+    state.registers[programState.LR_ID] = pc
+    state.callStack.append(pc)
+    return address
+
+
+# The handler of each opcode
+HANDLERS: Dict[str, Callable[[nodes.Operation, programState.ProgramState], Optional[int]]] = {
+    "ADD": executeADD,
+    "ADC": executeADD,
+    "CMN": executeADD,
+    "SUB": executeSUB,
+    "SBC": executeSUB,
+    "CMP": executeSUB,
+    "MUL": executeMUL,
+    **{opcode: executeLogic for opcode in LOGIC_FUNCTIONS},
+    "LSL": executeLSL,
+    "LSR": executeLSR,
+    "ASR": executeLSR,
+    "ROR": executeROR,
+    "MOV": executeMOV,
+    "MOVN": executeMOV,
+    **{opcode: executeExtend for opcode in EXTEND_OPERATIONS},
+    **{opcode: executeLDR for opcode in instructionsMemory.LOAD_OPERATIONS},
+    **{opcode: executeSTR for opcode in instructionsMemory.STORE_OPERATIONS},
+    "PUSH": executePUSH,
+    "POP": executePOP,
+    **{opcode: executeBranch for opcode in instructions.BRANCH_CONDITIONS},
+    "BL": executeBL,
+    "BX": executeBX,
+    "BLX": executeBLX
+}
+
+
+# destinationRegister:: Operation -> Either int None
+# The register an operation writes last, None when the operation doesn't write a register
+# Store operations use rd for the register that is stored, so they don't write it
+def destinationRegister(operation: nodes.Operation) -> Optional[int]:
+    if operation.opcode == "POP":
+        return operation.registers[-1]
+    if operation.opcode in instructionsMemory.STORE_OPERATIONS:
+        return None
+    return operation.rd
+
+
+# generateFunction:: Operation -> (ProgramState -> Either int None)
+# Generates the function of an instruction node that runs an operation with its handler
+def generateFunction(operation: nodes.Operation):
+    func = partial(HANDLERS[operation.opcode], operation)
+    destination = destinationRegister(operation)
+    if destination is None:
+        return func
+    # Writing to PC changes the flow of the program
+    return instructionsUtils.branchOnPCWrite(func, destination)
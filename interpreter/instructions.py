@@ -1,4 +1,4 @@
-from typing import Callable, Dict, List, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple
 
 import tokens
 import programState
@@ -6,44 +6,36 @@ import nodes
 import instructionsALU
 import instructionsMemory
 
-from instructionsUtils import generateToFewTokensError, generateUnexpectedTokenError, generateImmediateOutOfRangeError, advanceToNewline
+from instructionsUtils import generateToFewTokensError, generateUnexpectedTokenError, generateImmediateOutOfRangeError, advanceToNewline, branchOnPCWrite
+from programState import regToID
 
 
-# decodeMOV:: [Token] -> Node.Section -> (Node, [Token])
+# decodeMOV:: TokenStream -> Node.Section -> (Node, TokenStream)
 # decode the MOV instruction
-def decodeMOV(tokenList: List[tokens.Token], section: nodes.Node.Section, invert: bool) -> Tuple[nodes.Node, List[tokens.Token]]:
+def decodeMOV(tokenList: tokens.TokenStream, section: nodes.Node.Section, invert: bool) -> Tuple[nodes.Node, tokens.TokenStream]:
     if len(tokenList) == 0:
-        return generateToFewTokensError(-1, f"{'MOVN' if invert else 'MOV'} instruction"), []
-    dest, *tokenList = tokenList
+        return generateToFewTokensError(-1, f"{'MOVN' if invert else 'MOV'} instruction"), tokenList.advanceToEnd()
+    dest = tokenList.next()
     if len(tokenList) < 2:
-        return generateToFewTokensError(dest.line, f"{'MOVN' if invert else 'MOV'} instruction"), []
+        return generateToFewTokensError(dest.line, f"{'MOVN' if invert else 'MOV'} instruction"), tokenList.advanceToEnd()
     if not isinstance(dest, tokens.Register):
         # Wrong token, generate an error
         return generateUnexpectedTokenError(dest.line, dest.contents, "a register"), advanceToNewline(tokenList)
-    separator, *tokenList = tokenList
+    destID: int = regToID(dest.contents)
+    separator = tokenList.next()
     if isinstance(separator, tokens.Separator) and separator.contents == ",":
-        src, *tokenList = tokenList
+        src = tokenList.next()
         if isinstance(src, tokens.Register):
-            def movReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                value, err = state.getReg(src.contents)
-                if invert:
-                    value = value ^ 0xFFFF_FFFF
-                state.setReg(dest.contents, value)
-                return state, err
-            return nodes.InstructionNode(section, dest.line, movReg), tokenList
+            operation = nodes.Operation("MOVN" if invert else "MOV", dest.line, rd=destID, rm=regToID(src.contents))
+            return nodes.InstructionNode(section, dest.line, generateMOV(operation), operation), tokenList
         elif isinstance(src, tokens.ImmediateValue):
             # check 8 bits
             if src.value > 0xFF:
                 return generateImmediateOutOfRangeError(src.line, src.value, 0xFF), tokenList
 
-            def movImmed(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                if invert:
-                    value = src.value ^ 0xFFFF_FFFF
-                else:
-                    value = src.value
-                state.setReg(dest.contents, value)
-                return state, None
-            return nodes.InstructionNode(section, dest.line, movImmed), tokenList
+            value: int = (src.value ^ 0xFFFF_FFFF) if invert else src.value
+            operation = nodes.Operation("MOVN" if invert else "MOV", dest.line, rd=destID, immediate=value)
+            return nodes.InstructionNode(section, dest.line, generateMOV(operation), operation), tokenList
         else:
             # Wrong token, generate an error
             return generateUnexpectedTokenError(src.line, src.contents, "a register or an immediate value"), advanceToNewline(tokenList)
@@ -52,9 +44,27 @@ def decodeMOV(tokenList: List[tokens.Token], section: nodes.Node.Section, invert
         return generateUnexpectedTokenError(separator.line, separator.contents, "','"), advanceToNewline(tokenList)
 
 
-# decodeExtend:: [Token] -> Node.Section -> bool -> bool -> (Node, [Token])
+# generateMOV:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a MOV or MOVN operation, an immediate value has already been inverted by decodeMOV
+def generateMOV(operation: nodes.Operation):
+    destID, srcID, value = operation.rd, operation.rm, operation.immediate
+    invert: bool = operation.opcode == "MOVN"
+    if srcID is not None:
+        def movReg(state: programState.ProgramState) -> None:
+            value = state.getRegByID(srcID)
+            if invert:
+                value = value ^ 0xFFFF_FFFF
+            state.setRegByID(destID, value)
+        return branchOnPCWrite(movReg, destID)
+
+    def movImmed(state: programState.ProgramState) -> None:
+        state.setRegByID(destID, value)
+    return branchOnPCWrite(movImmed, destID)
+
+
+# decodeExtend:: TokenStream -> Node.Section -> bool -> bool -> (Node, TokenStream)
 # decode the SXTH, SXTB, UXTH and UXTB instructions
-def decodeExtend(tokenList: List[tokens.Token], section: nodes.Node.Section, signed: bool, halfWord: bool) -> Tuple[nodes.Node, List[tokens.Token]]:
+def decodeExtend(tokenList: tokens.TokenStream, section: nodes.Node.Section, signed: bool, halfWord: bool) -> Tuple[nodes.Node, tokens.TokenStream]:
     if halfWord:
         if signed:
             instrName = "SXTH"
@@ -66,39 +76,20 @@ def decodeExtend(tokenList: List[tokens.Token], section: nodes.Node.Section, sig
         else:
             instrName = "UXTB"
     if len(tokenList) == 0:
-        return generateToFewTokensError(-1, f"{instrName} instruction"), []
-    dest, *tokenList = tokenList
+        return generateToFewTokensError(-1, f"{instrName} instruction"), tokenList.advanceToEnd()
+    dest = tokenList.next()
     if len(tokenList) < 2:
-        return generateToFewTokensError(dest.line, f"{instrName} instruction"), []
+        return generateToFewTokensError(dest.line, f"{instrName} instruction"), tokenList.advanceToEnd()
     if not isinstance(dest, tokens.Register):
         # Wrong token, generate an error
         return generateUnexpectedTokenError(dest.line, dest.contents, "a register"), advanceToNewline(tokenList)
-    separator, *tokenList = tokenList
+    destID: int = regToID(dest.contents)
+    separator = tokenList.next()
     if isinstance(separator, tokens.Separator) and separator.contents == ",":
-        src, *tokenList = tokenList
+        src = tokenList.next()
         if isinstance(src, tokens.Register):
-            def movReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                value, err = state.getReg(src.contents)
-                if halfWord:
-                    if signed:
-                        if (value & 0b1000_0000_0000_0000) == 0b1000_0000_0000_0000:
-                            value |= 0xFFFF_0000  # Set upper half-word when sign bit is set
-                        else:
-                            value &= 0xFFFF
-                    else:
-                        value &= 0xFFFF
-                else:
-                    if signed:
-                        if (value & 0b1000_0000) == 0b1000_0000:
-                            value |= 0xFFFF_FF00  # Set upper three bytes when sign bit is set
-                        else:
-                            value &= 0xFF
-                    else:
-                        value &= 0xFF
-
-                state.setReg(dest.contents, value)
-                return state, err
-            return nodes.InstructionNode(section, dest.line, movReg), tokenList
+            operation = nodes.Operation(instrName, dest.line, rd=destID, rm=regToID(src.contents))
+            return nodes.InstructionNode(section, dest.line, generateExtend(operation), operation), tokenList
         else:
             # Wrong token, generate an error
             return generateUnexpectedTokenError(src.line, src.contents, "a register"), advanceToNewline(tokenList)
@@ -107,96 +98,165 @@ def decodeExtend(tokenList: List[tokens.Token], section: nodes.Node.Section, sig
         return generateUnexpectedTokenError(separator.line, separator.contents, "','"), advanceToNewline(tokenList)
 
 
-# decodeB:: Iterator[tokens.Token] -> Node.Section -> Node
-# decode the branch instruction
-def decodeBranch(tokenList: List[tokens.Token], section: nodes.Node.Section,
-                 condition: Callable[[programState.StatusRegister], bool]) -> Tuple[nodes.Node, List[tokens.Token]]:
-    if len(tokenList) == 0:
-        return generateToFewTokensError(-1, "Branch instruction"), []
-    label, *tokenList = tokenList
-    if isinstance(label, tokens.Label):
-        def branchTo(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-            if condition(state.status):
-                address: Union[int, programState.RunError] = state.getLabelAddress(label.contents)
-                if isinstance(address, programState.RunError):
-                    return state, address
+# generateExtend:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a SXTH, SXTB, UXTH or UXTB operation
+def generateExtend(operation: nodes.Operation):
+    destID, srcID = operation.rd, operation.rm
+    signed: bool = operation.opcode[0] == "S"
+    halfWord: bool = operation.opcode[3] == "H"
+
+    def movReg(state: programState.ProgramState) -> None:
+        value = state.getRegByID(srcID)
+        if halfWord:
+            if signed:
+                if (value & 0b1000_0000_0000_0000) == 0b1000_0000_0000_0000:
+                    value |= 0xFFFF_0000  # Set upper half-word when sign bit is set
+                else:
+                    value &= 0xFFFF
+            else:
+                value &= 0xFFFF
+        else:
+            if signed:
+                if (value & 0b1000_0000) == 0b1000_0000:
+                    value |= 0xFFFF_FF00  # Set upper three bytes when sign bit is set
                 else:
-                    # Subtract 4 because we will add 4 to the address later in the run loop and we need to start at address and not address+4
-                    state.setReg("PC", address-4)
-            return state, None
+                    value &= 0xFF
+            else:
+                value &= 0xFF
+
+        state.setRegByID(destID, value)
+    return branchOnPCWrite(movReg, destID)
+
+
+# The condition of each branch instruction, decides if the branch needs to be executed based on the StatusRegister
+BRANCH_CONDITIONS: Dict[str, Callable[[programState.StatusRegister], bool]] = {
+    "B": lambda status: True,
+    "BCC": lambda status: not status.C,
+    "BLO": lambda status: not status.C,
+    "BCS": lambda status: status.C,
+    "BHS": lambda status: status.C,
+    "BEQ": lambda status: status.Z,
+    "BGE": lambda status: status.N == status.V,
+    "BGT": lambda status: (not status.Z) and (status.N == status.V),
+    "BHI": lambda status: (not status.Z) and status.C,
+    "BLE": lambda status: status.Z or (status.N != status.V),
+    "BLS": lambda status: (not status.C) or status.Z,
+    "BLT": lambda status: (status.N != status.V),
+    "BMI": lambda status: status.N,
+    "BNE": lambda status: (not status.Z),
+    "BPL": lambda status: not status.N,
+    "BVC": lambda status: not status.V,
+    "BVS": lambda status: status.V
+}
 
-        return nodes.InstructionNode(section, label.line, branchTo), tokenList
+# The result of the condition of each branch instruction for every possible value of the flags, so running a branch only needs a lookup
+BRANCH_TAKEN: Dict[str, List[bool]] = {opcode: [condition(programState.flagsToStatus(flags)) for flags in range(16)]
+                                       for opcode, condition in BRANCH_CONDITIONS.items()}
+
+
+# decodeBranch:: TokenStream -> Node.Section -> String -> (Node, TokenStream)
+# decode the branch instruction, opcode is one of the keys of BRANCH_CONDITIONS
+def decodeBranch(tokenList: tokens.TokenStream, section: nodes.Node.Section, opcode: str) -> Tuple[nodes.Node, tokens.TokenStream]:
+    if len(tokenList) == 0:
+        return generateToFewTokensError(-1, "Branch instruction"), tokenList.advanceToEnd()
+    label = tokenList.next()
+    if isinstance(label, tokens.Label):
+        # The function is generated by the link stage, once the address of the label is known
+        return nodes.InstructionNode(section, label.line, None, nodes.Operation(opcode, label.line, label=label.contents)), tokenList
     else:
         # Wrong token, generate an error
         return generateUnexpectedTokenError(label.line, label.contents, "a label"), advanceToNewline(tokenList)
 
 
-# decodeBL:: Iterator[tokens.Token] -> Node.Section -> Node
+# decodeBL:: TokenStream -> Node.Section -> (Node, TokenStream)
 # decode the BL instruction
-def decodeBL(tokenList: List[tokens.Token], section: nodes.Node.Section) -> Tuple[nodes.Node, List[tokens.Token]]:
+def decodeBL(tokenList: tokens.TokenStream, section: nodes.Node.Section) -> Tuple[nodes.Node, tokens.TokenStream]:
     if len(tokenList) == 0:
-        return generateToFewTokensError(-1, "BL instruction"), []
-    label, *tokenList = tokenList
+        return generateToFewTokensError(-1, "BL instruction"), tokenList.advanceToEnd()
+    label = tokenList.next()
     if isinstance(label, tokens.Label):
-        def branchTo(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-            # Save return address in LR
-            pc, _ = state.getReg("PC")
-            state.setReg("LR", pc)
-
-            address: Union[int, programState.RunError] = state.getLabelAddress(label.contents)
-            if isinstance(address, programState.RunError):
-                return state, address
-            else:
-                # Subtract 4 because we will add 4 to the address later in the run loop and we need to start at address and not address+4
-                state.setReg("PC", address - 4)
-                state.hasReturned = False
-                return state, None
-
-        return nodes.InstructionNode(section, label.line, branchTo), tokenList
+        # The function is generated by the link stage, once the address of the label is known
+        return nodes.InstructionNode(section, label.line, None, nodes.Operation("BL", label.line, label=label.contents)), tokenList
     else:
         # Wrong token, generate an error
         return generateUnexpectedTokenError(label.line, label.contents, "a label"), advanceToNewline(tokenList)
 
 
-# decodeBL:: Iterator[tokens.Token] -> Node.Section -> bool -> Node
-# decode the BL instruction
-def decodeBLX(tokenList: List[tokens.Token], section: nodes.Node.Section, link: bool) -> Tuple[nodes.Node, List[tokens.Token]]:
+# decodeBLX:: TokenStream -> Node.Section -> String -> (Node, TokenStream)
+# decode the BX and BLX instructions
+def decodeBLX(tokenList: tokens.TokenStream, section: nodes.Node.Section, opcode: str) -> Tuple[nodes.Node, tokens.TokenStream]:
     if len(tokenList) == 0:
-        return generateToFewTokensError(-1, "BL instruction"), []
-    label, *tokenList = tokenList
+        return generateToFewTokensError(-1, f"{opcode} instruction"), tokenList.advanceToEnd()
+    label = tokenList.next()
     if isinstance(label, tokens.Register):
-        def branchTo(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-            if link:
-                # Save return address in LR
-                state.setReg("LR", state.getReg("PC")[0])
-
-            address, err = state.getReg(label.contents)
-            # Subtract 4 because we will add 4 to the address later in the run loop and we need to start at address and not address+4
-            state.setReg("PC", address - 4)
-            state.hasReturned = False
-            return state, err
-
-        return nodes.InstructionNode(section, label.line, branchTo), tokenList
+        operation = nodes.Operation(opcode, label.line, rm=regToID(label.contents))
+        return nodes.InstructionNode(section, label.line, generateBLX(operation, opcode == "BLX"), operation), tokenList
     else:
         # Wrong token, generate an error
-        return generateUnexpectedTokenError(label.line, label.contents, "a label"), advanceToNewline(tokenList)
+        return generateUnexpectedTokenError(label.line, label.contents, "a register"), advanceToNewline(tokenList)
+
+
+# generateBranch:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a branch operation, the immediate value is the address of the label
+def generateBranch(operation: nodes.Operation):
+    taken: List[bool] = BRANCH_TAKEN[operation.opcode]
+    address: int = operation.immediate
+
+    def branchTo(state: programState.ProgramState) -> Optional[int]:
+        if taken[state.getFlags()]:
+            return address
+        return None
+    return branchTo
+
+
+# generateBL:: Operation -> (ProgramState -> int)
+# Generates the function that runs a BL operation, the immediate value is the address of the label
+def generateBL(operation: nodes.Operation):
+    address: int = operation.immediate
+
+    def branchTo(state: programState.ProgramState) -> int:
+        # Save return address in LR
+        pc = state.registers[programState.PC_ID]
+        state.registers[programState.LR_ID] = pc
+        state.callStack.append(pc)
+        return address
+    return branchTo
+
+
+# generateBLX:: Operation -> bool -> (ProgramState -> int)
+# Generates the function that runs a BX or BLX operation
+# link: save the return address like BL does, for BLX
+def generateBLX(operation: nodes.Operation, link: bool):
+    regID: int = operation.rm
+
+    def branchTo(state: programState.ProgramState) -> int:
+        if link:
+            # Read the address before LR is changed, BLX LR jumps to the old value of LR
+            address = state.getRegByID(regID)
+            # Save return address in LR
+            pc = state.registers[programState.PC_ID]
+            state.registers[programState.LR_ID] = pc
+            state.callStack.append(pc)
+            return address
+        # BX LR returns from a subroutine
+        return state.returnTo(state.getRegByID(regID))
+    return branchTo
 
 
 # saves one function per instruction to be used to decode that instruction into a Node
-tokenFunctions: Dict[str, Callable[[List[tokens.Token], nodes.Node.Section], Tuple[nodes.Node, List[tokens.Token]]]] = {
+tokenFunctions: Dict[str, Callable[[tokens.TokenStream, nodes.Node.Section], Tuple[nodes.Node, tokens.TokenStream]]] = {
     # decodeMOV has a third argument to tell if the value must be inverted (MOVN)
     "MOV": lambda a, b: decodeMOV(a, b, False),
     "MOVN": lambda a, b: decodeMOV(a, b, True),
-    # decodeLDR and decodeSTR expect a int as it's third argument to tell the difference between LDR, LDRH and LDRB
-    # decodeLDR expects a bool as it's forth argument to tell if the value must be sign extended
-    "LDR": lambda a, b: instructionsMemory.decodeLDR(a, b, 32, False),
-    "LDRH": lambda a, b: instructionsMemory.decodeLDR(a, b, 16, False),
-    "LDRB": lambda a, b: instructionsMemory.decodeLDR(a, b, 8, False),
-    "STR": lambda a, b: instructionsMemory.decodeSTR(a, b, 32),
-    "STRH": lambda a, b: instructionsMemory.decodeSTR(a, b, 16),
-    "STRB": lambda a, b: instructionsMemory.decodeSTR(a, b, 8),
-    "LDRSH": lambda a, b: instructionsMemory.decodeLDR(a, b, 16, True),
-    "LDRSB": lambda a, b: instructionsMemory.decodeLDR(a, b, 8, True),
+    # decodeLDR and decodeSTR expect the opcode as their third argument to tell the difference between LDR, LDRH and LDRB
+    "LDR": lambda a, b: instructionsMemory.decodeLDR(a, b, "LDR"),
+    "LDRH": lambda a, b: instructionsMemory.decodeLDR(a, b, "LDRH"),
+    "LDRB": lambda a, b: instructionsMemory.decodeLDR(a, b, "LDRB"),
+    "STR": lambda a, b: instructionsMemory.decodeSTR(a, b, "STR"),
+    "STRH": lambda a, b: instructionsMemory.decodeSTR(a, b, "STRH"),
+    "STRB": lambda a, b: instructionsMemory.decodeSTR(a, b, "STRB"),
+    "LDRSH": lambda a, b: instructionsMemory.decodeLDR(a, b, "LDRSH"),
+    "LDRSB": lambda a, b: instructionsMemory.decodeLDR(a, b, "LDRSB"),
 
     "PUSH": instructionsMemory.decodePUSH,
     "POP": instructionsMemory.decodePOP,
@@ -234,29 +294,51 @@ tokenFunctions: Dict[str, Callable[[List[tokens.Token], nodes.Node.Section], Tup
     "REV16": None,
     "REVSH": None,
 
-    # decodeBranch expects a function as it's third argument
-    # to decide if a branch needs to be executed based on the StatusRegister
-    "B": lambda a, b: decodeBranch(a, b, lambda status: True),
+    # decodeBranch expects the opcode as it's third argument, to look up the condition in BRANCH_CONDITIONS
+    "B": lambda a, b: decodeBranch(a, b, "B"),
     "BL": decodeBL,
-    "BX": lambda a, b: decodeBLX(a, b, False),
-    "BLX": lambda a, b: decodeBLX(a, b, False),
-
-    # decodeBranch expects a function as it's third argument
-    # to decide if a branch needs to be executed based on the StatusRegister
-    "BCC": lambda a, b: decodeBranch(a, b, lambda status: not status.C),
-    "BLO": lambda a, b: decodeBranch(a, b, lambda status: not status.C),
-    "BCS": lambda a, b: decodeBranch(a, b, lambda status: status.C),
-    "BHS": lambda a, b: decodeBranch(a, b, lambda status: status.C),
-    "BEQ": lambda a, b: decodeBranch(a, b, lambda status: status.Z),
-    "BGE": lambda a, b: decodeBranch(a, b, lambda status: status.N == status.V),
-    "BGT": lambda a, b: decodeBranch(a, b, lambda status: (not status.Z) and (status.N == status.V)),
-    "BHI": lambda a, b: decodeBranch(a, b, lambda status: (not status.Z) and status.C),
-    "BLE": lambda a, b: decodeBranch(a, b, lambda status: status.Z or (status.N != status.V)),
-    "BLS": lambda a, b: decodeBranch(a, b, lambda status: (not status.C) or status.Z),
-    "BLT": lambda a, b: decodeBranch(a, b, lambda status: (status.N != status.V)),
-    "BMI": lambda a, b: decodeBranch(a, b, lambda status: status.N),
-    "BNE": lambda a, b: decodeBranch(a, b, lambda status: (not status.Z)),
-    "BPL": lambda a, b: decodeBranch(a, b, lambda status: not status.N),
-    "BVC": lambda a, b: decodeBranch(a, b, lambda status: not status.V),
-    "BVS": lambda a, b: decodeBranch(a, b, lambda status: status.V)
+    # decodeBLX expects the opcode as it's third argument
+    "BX": lambda a, b: decodeBLX(a, b, "BX"),
+    "BLX": lambda a, b: decodeBLX(a, b, "BLX"),
+
+    "BCC": lambda a, b: decodeBranch(a, b, "BCC"),
+    "BLO": lambda a, b: decodeBranch(a, b, "BLO"),
+    "BCS": lambda a, b: decodeBranch(a, b, "BCS"),
+    "BHS": lambda a, b: decodeBranch(a, b, "BHS"),
+    "BEQ": lambda a, b: decodeBranch(a, b, "BEQ"),
+    "BGE": lambda a, b: decodeBranch(a, b, "BGE"),
+    "BGT": lambda a, b: decodeBranch(a, b, "BGT"),
+    "BHI": lambda a, b: decodeBranch(a, b, "BHI"),
+    "BLE": lambda a, b: decodeBranch(a, b, "BLE"),
+    "BLS": lambda a, b: decodeBranch(a, b, "BLS"),
+    "BLT": lambda a, b: decodeBranch(a, b, "BLT"),
+    "BMI": lambda a, b: decodeBranch(a, b, "BMI"),
+    "BNE": lambda a, b: decodeBranch(a, b, "BNE"),
+    "BPL": lambda a, b: decodeBranch(a, b, "BPL"),
+    "BVC": lambda a, b: decodeBranch(a, b, "BVC"),
+    "BVS": lambda a, b: decodeBranch(a, b, "BVS")
 }
+
+
+# The closure backend: saves one function per opcode that generates the function that runs an operation
+# Most generators are defined next to the decoder of the instruction
+functionGenerators: Dict[str, Callable[[nodes.Operation], Callable]] = {
+    **instructionsALU.functionGenerators,
+    **instructionsMemory.functionGenerators,
+    "MOV": generateMOV,
+    "MOVN": generateMOV,
+    "SXTH": generateExtend,
+    "SXTB": generateExtend,
+    "UXTH": generateExtend,
+    "UXTB": generateExtend,
+    "BL": generateBL,
+    "BX": lambda operation: generateBLX(operation, False),
+    "BLX": lambda operation: generateBLX(operation, True),
+    **{opcode: generateBranch for opcode in BRANCH_CONDITIONS}
+}
+
+
+# generateFunction:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an operation, operations with a label need to be linked first
+def generateFunction(operation: nodes.Operation):
+    return functionGenerators[operation.opcode](operation)
@@ -1,38 +1,42 @@
-from typing import Callable, List, Tuple, Union
+from typing import Callable, Dict, Tuple, Union
 
 import tokens
 import programState
 import nodes
 import instructionsUtils
 
+from programState import regToID
 
-# decodeALUInstruction:: [Token] -> Section ->
+
+# decodeALUInstruction:: TokenStream -> Section ->
 # (Node.Section -> int -> String -> Either int String -> Either int String None -> Node)
-# -> String -> (Node, [Token])
+# -> String -> (Node, TokenStream)
 # Decodes any ALU instruction that uses the syntax INSTR {rd,} rn, <rm|#immed8>
 # When the instruction is run, the func parameter is used to perform the right action for the instruction and
 #   run checks specific to that instruction
-def decodeALUInstruction(tokenList: List[tokens.Token], section: nodes.Node.Section,
+def decodeALUInstruction(tokenList: tokens.TokenStream, section: nodes.Node.Section,
                          nodeGen: Callable[[nodes.Node.Section, int, str, Union[int, str], Union[int, str, None]], nodes.Node],
-                         instruction: str) -> Tuple[nodes.Node, List[tokens.Token]]:
+                         instruction: str) -> Tuple[nodes.Node, tokens.TokenStream]:
     if len(tokenList) == 0:
-        return instructionsUtils.generateToFewTokensError(-1, instruction + " instruction"), []
-    arg1, *tokenList = tokenList
+        return instructionsUtils.generateToFewTokensError(-1, instruction + " instruction"), tokenList.advanceToEnd()
+    arg1 = tokenList.next()
     if len(tokenList) < 2:
-        return instructionsUtils.generateToFewTokensError(arg1.line, instruction + " instruction"), []
-    seperator1, arg2, *tokenList = tokenList
+        return instructionsUtils.generateToFewTokensError(arg1.line, instruction + " instruction"), tokenList.advanceToEnd()
+    seperator1 = tokenList.next()
+    arg2 = tokenList.next()
     if len(tokenList) < 2:
         seperator2 = seperator1
         # arg3 does not exist
         arg3 = None
     else:
-        seperator2, arg3, *tokenList = tokenList
+        seperator2 = tokenList.next()
+        arg3 = tokenList.next()
     if not (isinstance(seperator1, tokens.Separator) and seperator1.contents == ","):
         # Wrong token, generate an error
         return instructionsUtils.generateUnexpectedTokenError(seperator1.line, seperator1.contents, "','"), instructionsUtils.advanceToNewline(tokenList)
     if not (isinstance(seperator2, tokens.Separator) and seperator2.contents == ","):
         if isinstance(seperator2, tokens.NewLine):
-            tokenList = [seperator2, arg3] + tokenList
+            tokenList.rewind(2)
             # arg3 does not exist
             arg3 = None
         else:
@@ -91,35 +95,33 @@ def decodeSUB(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
             if arg3 > 0b0111:
                 return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0b0111)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("SUB", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateSUB(operation), operation)
+
+
+# generateSUB:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a SUB operation
+def generateSUB(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg3 & 0XFFFFFFFF
 
         minusB = ((~b)+1) & 0xFFFFFFFF
         out = a + minusB
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
-
-        signA = (a >> 31) & 1
-        signB = (minusB >> 31) & 1
-
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
 
+        state.setRegByID(rd, out & 0xFFFFFFFF)
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = minusB
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeSBC:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the SBC instruction
@@ -149,39 +151,37 @@ def decodeSBC(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
             if arg3 > 0b0111:
                 return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0b0111)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("SBC", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateSBC(operation), operation)
+
+
+# generateSBC:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a SBC operation
+def generateSBC(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg3
 
         # subtract one more if carry is set
-        if state.status.C:
+        if state.getFlags() & programState.C_FLAG:
             b += 1
 
         minusB = ((~b)+1) & 0xFFFFFFFF
         out = a + minusB
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
-
-        signA = (a >> 31) & 1
-        signB = (minusB >> 31) & 1
-
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
 
+        state.setRegByID(rd, out & 0xFFFFFFFF)
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = minusB
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeADD:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the ADD instruction
@@ -218,34 +218,32 @@ def decodeADD(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
             if arg3 > 0b0111:
                 return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0b0111)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
-        else:
-            b = arg3 & 0XFFFFFFFF
-
-        out = a + b
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("ADD", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateADD(operation), operation)
 
-        signA = (a >> 31) & 1
-        signB = (b >> 31) & 1
 
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
+# generateADD:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an ADD operation
+def generateADD(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
 
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg3 & 0XFFFFFFFF
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out = a + b
 
+        state.setRegByID(rd, out & 0xFFFFFFFF)
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = b
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeADC:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the ADC instruction
@@ -282,38 +280,36 @@ def decodeADC(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
             if arg3 > 0b0111:
                 return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0b0111)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("ADC", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateADC(operation), operation)
+
+
+# generateADC:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an ADC operation
+def generateADC(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg3 & 0XFFFFFFFF
 
         # subtract one more if carry is set
-        if state.status.C:
+        if state.getFlags() & programState.C_FLAG:
             b += 1
 
         out = a + b
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
-
-        signA = (a >> 31) & 1
-        signB = (b >> 31) & 1
-
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
 
+        state.setRegByID(rd, out & 0xFFFFFFFF)
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = b
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeMUL:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the MUL instruction
@@ -324,24 +320,26 @@ def decodeMUL(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
     if isinstance(arg3, int):
         return instructionsUtils.generateUnexpectedTokenError(line, f'#{arg3}', "a register")
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if err is None:
-            b, err = state.getReg(arg3)
-        else:
-            b, _ = state.getReg(arg3)
+    operation = nodes.Operation("MUL", line, rd=regToID(arg1), rn=regToID(arg2), rm=regToID(arg3))
+    return nodes.InstructionNode(section, line, generateMUL(operation), operation)
 
-        out32 = (a * b) & 0xFFFFFFFF
 
-        n = bool((out32 >> 31) & 1)
-        z = out32 == 0
+# generateMUL:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a MUL operation
+def generateMUL(operation: nodes.Operation):
+    rd, rn, rm = operation.rd, operation.rn, operation.rm
 
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, state.status.C, state.status.V))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        b = state.getRegByID(rm)
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out32 = (a * b) & 0xFFFFFFFF
 
+        state.setRegByID(rd, out32)
+        # The carry and overflow flags are unaffected
+        flags = state.getFlags() & (programState.C_FLAG | programState.V_FLAG)
+        state.setFlags((programState.N_FLAG if (out32 >> 31) & 1 else 0) | (programState.Z_FLAG if out32 == 0 else 0) | flags)
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeAND:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the AND instruction
@@ -357,27 +355,30 @@ def decodeAND(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
-        else:
-            b = arg3 & 0XFFFFFFFF
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("AND", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateAND(operation), operation)
 
-        out = a & b
 
-        n = bool((out >> 31) & 1)
-        z = out == 0
+# generateAND:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an AND operation
+def generateAND(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
 
-        state.setReg(arg1, out)
-        state.setALUState(programState.StatusRegister(n, z, False, False))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg3 & 0XFFFFFFFF
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out = a & b
 
+        state.setRegByID(rd, out)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = False
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeEOR:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the EOR instruction
@@ -393,27 +394,30 @@ def decodeEOR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
-        else:
-            b = arg3 & 0XFFFFFFFF
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("EOR", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateEOR(operation), operation)
 
-        out = a ^ b
 
-        n = bool((out >> 31) & 1)
-        z = out == 0
+# generateEOR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an EOR operation
+def generateEOR(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
 
-        state.setReg(arg1, out)
-        state.setALUState(programState.StatusRegister(n, z, False, False))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg3 & 0XFFFFFFFF
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out = a ^ b
 
+        state.setRegByID(rd, out)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = False
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeORR:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the ORR instruction
@@ -429,27 +433,30 @@ def decodeORR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
-        else:
-            b = arg3 & 0XFFFFFFFF
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("ORR", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateORR(operation), operation)
 
-        out = a | b
 
-        n = bool((out >> 31) & 1)
-        z = out == 0
+# generateORR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an ORR operation
+def generateORR(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
 
-        state.setReg(arg1, out)
-        state.setALUState(programState.StatusRegister(n, z, False, False))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg3 & 0XFFFFFFFF
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out = a | b
 
+        state.setRegByID(rd, out)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = False
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeBIC:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the BIC instruction
@@ -465,27 +472,30 @@ def decodeBIC(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
-        else:
-            b = arg3 & 0XFFFFFFFF
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("BIC", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateBIC(operation), operation)
 
-        out = a & (b ^ 0xFFFF_FFFF)  # out = a & ! b
 
-        n = bool((out >> 31) & 1)
-        z = out == 0
+# generateBIC:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a BIC operation
+def generateBIC(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
 
-        state.setReg(arg1, out)
-        state.setALUState(programState.StatusRegister(n, z, False, False))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg3 & 0XFFFFFFFF
 
-        return state, err
-    return nodes.InstructionNode(section, line, run)
+        out = a & (b ^ 0xFFFF_FFFF)  # out = a & ! b
 
+        state.setRegByID(rd, out)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = False
+        state.flagResult = out
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeLSL:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the LSL instruction
@@ -499,16 +509,23 @@ def decodeLSL(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 31:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 32)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("LSL", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateLSL(operation), operation)
+
+
+# generateLSL:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an LSL operation
+def generateLSL(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
 
             if b > 31:
-                return state, programState.RunError(f"Shift value is out of range: value must be below 32 but is {b}", programState.RunError.ErrorType.Error)
+                raise programState.RunError(f"Shift value is out of range: value must be below 32 but is {b}", programState.RunError.ErrorType.Error)
         else:
             b = arg3
 
@@ -516,18 +533,14 @@ def decodeLSL(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         out32 = out & 0xFFFF_FFFF
 
         if b == 0:
-            c = state.status.C  # The C flag is unaffected if the shift value is 0 - ARM docs
+            c = bool(state.getFlags() & programState.C_FLAG)  # The C flag is unaffected if the shift value is 0 - ARM docs
         else:
             c = bool((out >> 32) & 1)  # Get the last bit shifted out
-        n = bool((out32 >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, False))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
-
+        state.setRegByID(rd, out32)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = c
+        state.flagResult = out32
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeLSR:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the LSR instruction
@@ -541,16 +554,23 @@ def decodeLSR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 32:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 33)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("LSR", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateLSR(operation), operation)
+
+
+# generateLSR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an LSR operation
+def generateLSR(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
 
             if b > 32:
-                return state, programState.RunError(f"Shift value is out of range: value must be below 33 but is {b}", programState.RunError.ErrorType.Error)
+                raise programState.RunError(f"Shift value is out of range: value must be below 33 but is {b}", programState.RunError.ErrorType.Error)
         else:
             b = arg3
 
@@ -558,18 +578,14 @@ def decodeLSR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         out32 = out & 0xFFFF_FFFF
 
         if b == 0:
-            c = state.status.C  # The C flag is unaffected if the shift value is 0 - ARM docs
+            c = bool(state.getFlags() & programState.C_FLAG)  # The C flag is unaffected if the shift value is 0 - ARM docs
         else:
             c = bool((a >> (b-1)) & 1)  # Get last bit shifted out
-        n = bool((out32 >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, False))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
-
+        state.setRegByID(rd, out32)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = c
+        state.flagResult = out32
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeASR:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the ASR instruction
@@ -583,16 +599,23 @@ def decodeASR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg3 > 32:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg3, 33)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("ASR", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateASR(operation), operation)
+
+
+# generateASR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs an ASR operation
+def generateASR(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
 
             if b > 32:
-                return state, programState.RunError(f"Shift value is out of range: value must be below 33 but is {b}", programState.RunError.ErrorType.Error)
+                raise programState.RunError(f"Shift value is out of range: value must be below 33 but is {b}", programState.RunError.ErrorType.Error)
         else:
             b = arg3
 
@@ -603,19 +626,15 @@ def decodeASR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
             out32 |= (0xFFFF_FFFF << (32 - b)) & 0xFFFF_FFFF
 
         if b == 0:
-            c = state.status.C  # The C flag is unaffected if the shift value is 0 - ARM docs
+            c = bool(state.getFlags() & programState.C_FLAG)  # The C flag is unaffected if the shift value is 0 - ARM docs
         else:
             c = bool((a >> (b-1)) & 1)  # Get last bit shifted out
 
-        n = bool((out32 >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, False))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
-
+        state.setRegByID(rd, out32)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = c
+        state.flagResult = out32
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeROR:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the ROR instruction
@@ -624,13 +643,20 @@ def decodeROR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
     if arg3 is None:
         return instructionsUtils.generateUnexpectedTokenError(line, "End of line", "a register")
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg2)
-        if isinstance(arg3, str):
-            if err is None:
-                b, err = state.getReg(arg3)
-            else:
-                b, _ = state.getReg(arg3)
+    rm: Union[int, None] = regToID(arg3) if isinstance(arg3, str) else None
+    operation = nodes.Operation("ROR", line, rd=regToID(arg1), rn=regToID(arg2), rm=rm, immediate=arg3 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateROR(operation), operation)
+
+
+# generateROR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a ROR operation
+def generateROR(operation: nodes.Operation):
+    rd, rn, rm, arg3 = operation.rd, operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg3 & 0XFFFFFFFF
 
@@ -639,19 +665,15 @@ def decodeROR(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         out32 = out & 0xFFFF_FFFF
 
         if b == 0:
-            c = state.status.C  # The C flag is unaffected if the shift value is 0 - ARM docs
+            c = bool(state.getFlags() & programState.C_FLAG)  # The C flag is unaffected if the shift value is 0 - ARM docs
         else:
             c = bool((a >> (bMod32-1)) & 1)  # Get last bit shifted out
 
-        n = bool((out32 >> 31) & 1)
-        z = out32 == 0
-
-        state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, False))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
-
+        state.setRegByID(rd, out32)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = c
+        state.flagResult = out32
+    return instructionsUtils.branchOnPCWrite(run, rd)
 
 # decodeCMP:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the CMP instruction
@@ -666,35 +688,32 @@ def decodeCMP(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg2 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg2, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg1)
-        if isinstance(arg2, str):
-            if err is None:
-                b, err = state.getReg(arg2)
-            else:
-                b, _ = state.getReg(arg2)
+    rm: Union[int, None] = regToID(arg2) if isinstance(arg2, str) else None
+    operation = nodes.Operation("CMP", line, rn=regToID(arg1), rm=rm, immediate=arg2 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateCMP(operation), operation)
+
+
+# generateCMP:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a CMP operation
+def generateCMP(operation: nodes.Operation):
+    rn, rm, arg2 = operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg2 & 0XFFFFFFFF
 
         minusB = ((~b) + 1) & 0xFFFFFFFF
         out = a + minusB
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
-
-        signA = (a >> 31) & 1
-        signB = (minusB >> 31) & 1
-
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
-
-        # state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
-
-        return state, err
-    return nodes.InstructionNode(section, line, run)
 
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = minusB
+        state.flagResult = out
+    return run
 
 # decodeCMN:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the CMN instruction
@@ -709,34 +728,31 @@ def decodeCMN(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg2 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg2, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg1)
-        if isinstance(arg2, str):
-            if err is None:
-                b, err = state.getReg(arg2)
-            else:
-                b, _ = state.getReg(arg2)
-        else:
-            b = arg2 & 0XFFFFFFFF
+    rm: Union[int, None] = regToID(arg2) if isinstance(arg2, str) else None
+    operation = nodes.Operation("CMN", line, rn=regToID(arg1), rm=rm, immediate=arg2 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateCMN(operation), operation)
 
-        out = a + b
-        out32 = out & 0xFFFFFFFF
-        bit31 = (out32 >> 31) & 1
 
-        signA = (a >> 31) & 1
-        signB = (b >> 31) & 1
+# generateCMN:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a CMN operation
+def generateCMN(operation: nodes.Operation):
+    rn, rm, arg2 = operation.rn, operation.rm, operation.immediate
 
-        v = signA == signB and signB != bit31
-        c = bool((out >> 32) & 1)
-        n = bool((out >> 31) & 1)
-        z = out32 == 0
-
-        # state.setReg(arg1, out32)
-        state.setALUState(programState.StatusRegister(n, z, c, v))
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = arg2 & 0XFFFFFFFF
 
-        return state, None
-    return nodes.InstructionNode(section, line, run)
+        out = a + b
 
+        # The flags are calculated when they are needed
+        state.flagKind = programState.FLAGS_ADD
+        state.flagA = a
+        state.flagB = b
+        state.flagResult = out
+    return run
 
 # decodeTST:: Node.Section -> int -> String -> Either int String -> Either int String None -> Node
 # Decode the TST instruction
@@ -751,23 +767,47 @@ def decodeTST(section: nodes.Node.Section, line: int, arg1: str, arg2: Union[int
         if arg2 > 0xFF:
             return instructionsUtils.generateImmediateOutOfRangeError(line, arg2, 0xFF)
 
-    def run(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-        a, err = state.getReg(arg1)
-        if isinstance(arg2, str):
-            if err is None:
-                b, err = state.getReg(arg2)
-            else:
-                b, _ = state.getReg(arg2)
+    rm: Union[int, None] = regToID(arg2) if isinstance(arg2, str) else None
+    operation = nodes.Operation("TST", line, rn=regToID(arg1), rm=rm, immediate=arg2 if rm is None else None)
+    return nodes.InstructionNode(section, line, generateTST(operation), operation)
+
+
+# generateTST:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a TST operation
+def generateTST(operation: nodes.Operation):
+    rn, rm, arg2 = operation.rn, operation.rm, operation.immediate
+
+    def run(state: programState.ProgramState) -> None:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
         else:
             b = arg2 & 0XFFFFFFFF
 
         out = a & b
 
-        n = bool((out >> 31) & 1)
-        z = out == 0
-
-        # state.setReg(arg1, out)
-        state.setALUState(programState.StatusRegister(n, z, False, False))
-
-        return state, None
-    return nodes.InstructionNode(section, line, run)
+        state.flagKind = programState.FLAGS_LOGIC
+        state.flagB = False
+        state.flagResult = out
+    return run
+
+
+# The functions that generate the function of each ALU operation, see instructions.generateFunction
+functionGenerators: Dict[str, Callable[[nodes.Operation], Callable]] = {
+    "SUB": generateSUB,
+    "SBC": generateSBC,
+    "ADD": generateADD,
+    "ADC": generateADC,
+    "MUL": generateMUL,
+    "AND": generateAND,
+    "EOR": generateEOR,
+    "ORR": generateORR,
+    "BIC": generateBIC,
+    "LSL": generateLSL,
+    "LSR": generateLSR,
+    "ASR": generateASR,
+    "ROR": generateROR,
+    "CMP": generateCMP,
+    "CMN": generateCMN,
+    "TST": generateTST
+}
@@ -1,74 +1,74 @@
-from typing import List, Tuple, Union
+from typing import Callable, Dict, List, Tuple, Union
 
 import tokens
 import programState
 import nodes
 import instructionsUtils
 
+from programState import regToID
 
-# decodeLDR:: [Token] -> Node.Section -> int -> bool -> (Node, [Token])
-# bitSize: the number ob bits to load, either 32, 16 or 8 bit
-# decode the LDR, LDRH and LDRB instructions
-def decodeLDR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSize: int, sign_extend: bool) -> Tuple[nodes.Node, List[tokens.Token]]:
+# The number of bits each load operation loads and if the value is sign extended
+LOAD_OPERATIONS: Dict[str, Tuple[int, bool]] = {
+    "LDR": (32, False),
+    "LDRH": (16, False),
+    "LDRB": (8, False),
+    "LDRSH": (16, True),
+    "LDRSB": (8, True)
+}
+
+# The number of bits each store operation stores
+STORE_OPERATIONS: Dict[str, int] = {
+    "STR": 32,
+    "STRH": 16,
+    "STRB": 8
+}
+
+# decodeLDR:: TokenStream -> Node.Section -> String -> (Node, TokenStream)
+# opcode: the load operation, see LOAD_OPERATIONS
+# decode the LDR, LDRH, LDRB, LDRSH and LDRSB instructions
+def decodeLDR(tokenList: tokens.TokenStream, section: nodes.Node.Section, opcode: str) -> Tuple[nodes.Node, tokens.TokenStream]:
+    bitSize, sign_extend = LOAD_OPERATIONS[opcode]
     if len(tokenList) == 0:
-        return instructionsUtils.generateToFewTokensError(-1, "LDR instruction"), []
-    dest, *tokenList = tokenList
+        return instructionsUtils.generateToFewTokensError(-1, "LDR instruction"), tokenList.advanceToEnd()
+    dest = tokenList.next()
     if len(tokenList) < 2:
-        return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), []
+        return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), tokenList.advanceToEnd()
     if not isinstance(dest, tokens.Register):
         # Wrong token, generate an error
         return instructionsUtils.generateUnexpectedTokenError(dest.line, dest.contents, "a register or an immediate value"), instructionsUtils.advanceToNewline(tokenList)
-    separator, *tokenList = tokenList
+    destID: int = regToID(dest.contents)
+    separator = tokenList.next()
     if isinstance(separator, tokens.Separator) and separator.contents == ",":
-        separator, *tokenList = tokenList
+        separator = tokenList.next()
         if isinstance(separator, tokens.LoadImmediateValue) and not sign_extend:  # sign extend is not supported for this syntax
-            value: int = separator.value & 0xFFFFFFFF
-
-            def ldrImmed(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                state.setReg(dest.contents, value)
-                return state, None
-            return nodes.InstructionNode(section, dest.line, ldrImmed), tokenList
+            operation = nodes.Operation(opcode, dest.line, rd=destID, immediate=separator.value & 0xFFFFFFFF)
+            return nodes.InstructionNode(section, dest.line, generateLDR(operation), operation), tokenList
         elif isinstance(separator, tokens.LoadLabel) and not sign_extend:  # sign extend is not supported for this syntax
-            label: tokens.LoadLabel = separator
-
-            def ldrLabel(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                val: Union[int, programState.RunError] = state.getLabelAddress(label.label)
-                if isinstance(val, programState.RunError):
-                    return state, val
-                else:
-                    state.setReg(dest.contents, val)
-                    return state, None
-            return nodes.InstructionNode(section, dest.line, ldrLabel), tokenList
+            # The address of the label is loaded like an immediate value once the program has been linked
+            operation = nodes.Operation(opcode, dest.line, rd=destID, label=separator.label)
+            return nodes.InstructionNode(section, dest.line, None, operation), tokenList
         elif isinstance(separator, tokens.Separator) and separator.contents == "[":
             if len(tokenList) < 2:
-                return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), []
-            src1, *tokenList = tokenList
+                return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), tokenList.advanceToEnd()
+            src1 = tokenList.next()
             if not isinstance(src1, tokens.Register):
                 # Wrong token, generate an error
                 return instructionsUtils.generateUnexpectedTokenError(src1.line, src1.contents, "a register"), instructionsUtils.advanceToNewline(tokenList)
-            separator, *tokenList = tokenList
+            src1ID: int = regToID(src1.contents)
+            separator = tokenList.next()
             if isinstance(separator, tokens.Separator) and separator.contents == "]":
-                def ldrOneReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                    adr, loadErr = state.getReg(src1.contents)
-                    err: Union[None, programState.RunError] = state.loadRegister(adr, bitSize, sign_extend, dest.contents)
-                    return state, loadErr if err is None else err
-                return nodes.InstructionNode(section, dest.line, ldrOneReg), tokenList
+                operation = nodes.Operation(opcode, dest.line, rd=destID, rn=src1ID)
+                return nodes.InstructionNode(section, dest.line, generateLDR(operation), operation), tokenList
             elif isinstance(separator, tokens.Separator) and separator.contents == ",":
                 if len(tokenList) < 2:
-                    return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), []
-                src2, separator, *tokenList = tokenList
+                    return instructionsUtils.generateToFewTokensError(dest.line, "LDR instruction"), tokenList.advanceToEnd()
+                src2 = tokenList.next()
+                separator = tokenList.next()
                 if isinstance(separator, tokens.Separator) and separator.contents != "]":
                     return instructionsUtils.generateUnexpectedTokenError(separator.line, separator.contents, "']'"), instructionsUtils.advanceToNewline(tokenList)
                 if isinstance(src2, tokens.Register):
-                    def ldrDualReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                        adr1, loadErr = state.getReg(src1.contents)
-                        if loadErr is None:
-                            adr2, loadErr = state.getReg(src2.contents)
-                        else:
-                            adr2, _ = state.getReg(src2.contents)
-                        err: Union[None, programState.RunError] = state.loadRegister(adr1 + adr2, bitSize, sign_extend, dest.contents)
-                        return state, loadErr if err is None else err
-                    return nodes.InstructionNode(section, dest.line, ldrDualReg), tokenList
+                    operation = nodes.Operation(opcode, dest.line, rd=destID, rn=src1ID, rm=regToID(src2.contents))
+                    return nodes.InstructionNode(section, dest.line, generateLDR(operation), operation), tokenList
                 elif isinstance(src2, tokens.ImmediateValue):
                     src2: tokens.ImmediateValue = src2
                     value: int = src2.value
@@ -95,11 +95,8 @@ def decodeLDR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSiz
                             elif bitSize == 16:
                                 value *= 2
 
-                    def ldrRegImmed(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                        adr, loadErr = state.getReg(src1.contents)
-                        err: Union[None, programState.RunError] = state.loadRegister(adr + value, bitSize, sign_extend, dest.contents)
-                        return state, loadErr if err is None else err
-                    return nodes.InstructionNode(section, dest.line, ldrRegImmed), tokenList
+                    operation = nodes.Operation(opcode, dest.line, rd=destID, rn=src1ID, immediate=value)
+                    return nodes.InstructionNode(section, dest.line, generateLDR(operation), operation), tokenList
                 else:
                     # Wrong token, generate an error
                     return instructionsUtils.generateUnexpectedTokenError(src2.line, src2.contents, "a register or an immediate value"), instructionsUtils.advanceToNewline(tokenList)
@@ -114,51 +111,45 @@ def decodeLDR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSiz
         return instructionsUtils.generateUnexpectedTokenError(separator.line, separator.contents, "','"), instructionsUtils.advanceToNewline(tokenList)
 
 
-# decodeLDR:: [Token] -> Node.Section -> ijt -> (Node, [Token])
-# bitSize: the number ob bits to load, either 32, 16 or 8 bit
-# decode the LDR, LDRH and LDRB instructions
-def decodeSTR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSize: int) -> Tuple[nodes.Node, List[tokens.Token]]:
+# decodeSTR:: TokenStream -> Node.Section -> String -> (Node, TokenStream)
+# opcode: the store operation, see STORE_OPERATIONS
+# decode the STR, STRH and STRB instructions
+def decodeSTR(tokenList: tokens.TokenStream, section: nodes.Node.Section, opcode: str) -> Tuple[nodes.Node, tokens.TokenStream]:
+    bitSize = STORE_OPERATIONS[opcode]
     if len(tokenList) == 0:
-        return instructionsUtils.generateToFewTokensError(-1, "STR instruction"), []
-    src, *tokenList = tokenList
+        return instructionsUtils.generateToFewTokensError(-1, "STR instruction"), tokenList.advanceToEnd()
+    src = tokenList.next()
     if len(tokenList) < 2:
-        return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), []
+        return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), tokenList.advanceToEnd()
     if not isinstance(src, tokens.Register):
         # Wrong token, generate an error
         return instructionsUtils.generateUnexpectedTokenError(src.line, src.contents, "a register or an immediate value"), instructionsUtils.advanceToNewline(tokenList)
-    separator, *tokenList = tokenList
+    srcID: int = regToID(src.contents)
+    separator = tokenList.next()
     if isinstance(separator, tokens.Separator) and separator.contents == ",":
-        separator, *tokenList = tokenList
+        separator = tokenList.next()
         if isinstance(separator, tokens.Separator) and separator.contents == "[":
             if len(tokenList) < 2:
-                return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), []
-            dest1, *tokenList = tokenList
+                return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), tokenList.advanceToEnd()
+            dest1 = tokenList.next()
             if not isinstance(dest1, tokens.Register):
                 # Wrong token, generate an error
                 return instructionsUtils.generateUnexpectedTokenError(dest1.line, dest1.contents, "a register"), instructionsUtils.advanceToNewline(tokenList)
-            separator, *tokenList = tokenList
+            dest1ID: int = regToID(dest1.contents)
+            separator = tokenList.next()
             if isinstance(separator, tokens.Separator) and separator.contents == "]":
-                def strOneReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                    adr, err = state.getReg(dest1.contents)
-                    newState: Union[None, programState.RunError] = state.storeRegister(adr, src.contents, bitSize)
-                    return state, err if newState is None else newState
-                return nodes.InstructionNode(section, src.line, strOneReg), tokenList
+                operation = nodes.Operation(opcode, src.line, rd=srcID, rn=dest1ID)
+                return nodes.InstructionNode(section, src.line, generateSTR(operation), operation), tokenList
             elif isinstance(separator, tokens.Separator) and separator.contents == ",":
                 if len(tokenList) < 2:
-                    return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), []
-                dest2, separator, *tokenList = tokenList
+                    return instructionsUtils.generateToFewTokensError(src.line, "STR instruction"), tokenList.advanceToEnd()
+                dest2 = tokenList.next()
+                separator = tokenList.next()
                 if isinstance(separator, tokens.Separator) and separator.contents != "]":
                     return instructionsUtils.generateUnexpectedTokenError(separator.line, separator.contents, "']'"), instructionsUtils.advanceToNewline(tokenList)
                 if isinstance(dest2, tokens.Register):
-                    def strDualReg(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                        adr1, err = state.getReg(dest1.contents)
-                        if err is None:
-                            adr2, err = state.getReg(dest2.contents)
-                        else:
-                            adr2, _ = state.getReg(dest2.contents)
-                        newState: Union[None, programState.RunError] = state.storeRegister(adr1 + adr2, src.contents, bitSize)
-                        return state, err if newState is None else newState
-                    return nodes.InstructionNode(section, src.line, strDualReg), tokenList
+                    operation = nodes.Operation(opcode, src.line, rd=srcID, rn=dest1ID, rm=regToID(dest2.contents))
+                    return nodes.InstructionNode(section, src.line, generateSTR(operation), operation), tokenList
                 elif isinstance(dest2, tokens.ImmediateValue):
                     dest2: tokens.ImmediateValue = dest2
                     value: int = dest2.value
@@ -185,11 +176,8 @@ def decodeSTR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSiz
                             elif bitSize == 16:
                                 value *= 2
 
-                    def strRegImmed(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-                        adr, err = state.getReg(dest1.contents)
-                        newState: Union[None, programState.RunError] = state.storeRegister(adr + value, src.contents, bitSize)
-                        return state, err if newState is None else newState
-                    return nodes.InstructionNode(section, src.line, strRegImmed), tokenList
+                    operation = nodes.Operation(opcode, src.line, rd=srcID, rn=dest1ID, immediate=value)
+                    return nodes.InstructionNode(section, src.line, generateSTR(operation), operation), tokenList
                 else:
                     # Wrong token, generate an error
                     return instructionsUtils.generateUnexpectedTokenError(dest2.line, dest2.contents, "a register or an immediate value"), instructionsUtils.advanceToNewline(tokenList)
@@ -204,19 +192,20 @@ def decodeSTR(tokenList: List[tokens.Token], section: nodes.Node.Section, bitSiz
         return instructionsUtils.generateUnexpectedTokenError(separator.line, separator.contents, "','"), instructionsUtils.advanceToNewline(tokenList)
 
 
-# getRegisterList:: [Token] -> String -> boolean -> (Either [Token] ErrorNode, [Token]]
+# getRegisterList:: TokenStream -> String -> (Either [int] ErrorNode, TokenStream)
+# Returns the indices of the registers in the list, sorted from low to high
 # The instruction string is used to create the error messages
-def getRegisterList(tokenList: List[tokens.Token], instruction: str) -> Tuple[Union[List[str], nodes.ErrorNode], List[tokens.Token]]:
+def getRegisterList(tokenList: tokens.TokenStream, instruction: str) -> Tuple[Union[List[int], nodes.ErrorNode], tokens.TokenStream]:
     if len(tokenList) == 0:
-        return instructionsUtils.generateToFewTokensError(-1, instruction + " instruction"), []
+        return instructionsUtils.generateToFewTokensError(-1, instruction + " instruction"), tokenList.advanceToEnd()
 
     regs = []
 
-    nextToken, *tokenList = tokenList
+    nextToken = tokenList.next()
     if isinstance(nextToken, tokens.Separator) and nextToken.contents == "{":
         if len(tokenList) == 0:
             return instructionsUtils.generateToFewTokensError(nextToken.line, instruction + " instruction"), instructionsUtils.advanceToNewline(tokenList)
-        nextToken, *tokenList = tokenList
+        nextToken = tokenList.next()
         if isinstance(nextToken, tokens.Register):
             regs.append(nextToken.contents)
         else:
@@ -225,11 +214,11 @@ def getRegisterList(tokenList: List[tokens.Token], instruction: str) -> Tuple[Un
         return instructionsUtils.generateUnexpectedTokenError(nextToken.line, nextToken.contents, "'{'"), instructionsUtils.advanceToNewline(tokenList)
     # add remaining registers
     while True:
-        nextToken, *tokenList = tokenList
+        nextToken = tokenList.next()
         if isinstance(nextToken, tokens.Separator) and nextToken.contents == ",":
             if len(tokenList) == 0:
-                return instructionsUtils.generateToFewTokensError(nextToken.line, instruction + " instruction"), []
-            nextToken, *tokenList = tokenList
+                return instructionsUtils.generateToFewTokensError(nextToken.line, instruction + " instruction"), tokenList.advanceToEnd()
+            nextToken = tokenList.next()
             if isinstance(nextToken, tokens.Register):
                 regs.append(nextToken.contents)
             else:
@@ -239,66 +228,140 @@ def getRegisterList(tokenList: List[tokens.Token], instruction: str) -> Tuple[Un
         else:
             return instructionsUtils.generateUnexpectedTokenError(nextToken.line, nextToken.contents, "',' or '}'"), instructionsUtils.advanceToNewline(tokenList)
 
-    return sorted(list(set(regs))), tokenList
+    return sorted(set(map(regToID, regs))), tokenList
 
 
-# decodePUSH:: [Token] -> Node.Section -> (Node, [Token])
+# decodePUSH:: TokenStream -> Node.Section -> (Node, TokenStream)
 # decode the PUSH instruction
-def decodePUSH(tokenList: List[tokens.Token], section: nodes.Node.Section) -> Tuple[nodes.Node, List[tokens.Token]]:
-    line = tokenList[0].line
+def decodePUSH(tokenList: tokens.TokenStream, section: nodes.Node.Section) -> Tuple[nodes.Node, tokens.TokenStream]:
+    line = tokenList.peek().line
 
     regs, tokenList = getRegisterList(tokenList, "PUSH")
 
     if isinstance(regs, nodes.ErrorNode):
         return regs, tokenList
+    # The highest register is stored at the highest address
+    regs = list(reversed(regs))
+
+    # The stack size is known once the program has been linked, see generatePUSH
+    operation = nodes.Operation("PUSH", line, registers=tuple(regs), label="__STACKSIZE")
+    return nodes.InstructionNode(section, line, None, operation), tokenList
+
+
+# decodePOP:: TokenStream -> Node.Section -> (Node, TokenStream)
+# decode the POP instruction
+def decodePOP(tokenList: tokens.TokenStream, section: nodes.Node.Section) -> Tuple[nodes.Node, tokens.TokenStream]:
+    line = tokenList.peek().line
+
+    regs, tokenList = getRegisterList(tokenList, "POP")
+
+    if isinstance(regs, nodes.ErrorNode):
+        return regs, tokenList
+
+    # The stack size is known once the program has been linked, see generatePOP
+    operation = nodes.Operation("POP", line, registers=tuple(regs), label="__STACKSIZE")
+    return nodes.InstructionNode(section, line, None, operation), tokenList
 
-    def push(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
+
+# generateLDR:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a load operation
+# An operation without a base register loads its immediate value, which is the address of the label for LDR rd, =label
+def generateLDR(operation: nodes.Operation):
+    bitSize, sign_extend = LOAD_OPERATIONS[operation.opcode]
+    destID, src1ID, src2ID, value = operation.rd, operation.rn, operation.rm, operation.immediate
+    if src1ID is None:
+        def ldrImmed(state: programState.ProgramState) -> None:
+            state.setRegByID(destID, value)
+        return instructionsUtils.branchOnPCWrite(ldrImmed, destID)
+    elif src2ID is not None:
+        def ldrDualReg(state: programState.ProgramState) -> None:
+            adr1 = state.getRegByID(src1ID)
+            adr2 = state.getRegByID(src2ID)
+            state.loadRegister(adr1 + adr2, bitSize, sign_extend, destID)
+        return instructionsUtils.branchOnPCWrite(ldrDualReg, destID)
+    elif value is not None:
+        def ldrRegImmed(state: programState.ProgramState) -> None:
+            adr = state.getRegByID(src1ID)
+            state.loadRegister(adr + value, bitSize, sign_extend, destID)
+        return instructionsUtils.branchOnPCWrite(ldrRegImmed, destID)
+    else:
+        def ldrOneReg(state: programState.ProgramState) -> None:
+            adr = state.getRegByID(src1ID)
+            state.loadRegister(adr, bitSize, sign_extend, destID)
+        return instructionsUtils.branchOnPCWrite(ldrOneReg, destID)
+
+
+# generateSTR:: Operation -> (ProgramState -> None)
+# Generates the function that runs a store operation
+def generateSTR(operation: nodes.Operation):
+    bitSize = STORE_OPERATIONS[operation.opcode]
+    srcID, dest1ID, dest2ID, value = operation.rd, operation.rn, operation.rm, operation.immediate
+    if dest2ID is not None:
+        def strDualReg(state: programState.ProgramState) -> None:
+            adr1 = state.getRegByID(dest1ID)
+            adr2 = state.getRegByID(dest2ID)
+            state.storeRegister(adr1 + adr2, srcID, bitSize)
+        return strDualReg
+    elif value is not None:
+        def strRegImmed(state: programState.ProgramState) -> None:
+            adr = state.getRegByID(dest1ID)
+            state.storeRegister(adr + value, srcID, bitSize)
+        return strRegImmed
+    else:
+        def strOneReg(state: programState.ProgramState) -> None:
+            adr = state.getRegByID(dest1ID)
+            state.storeRegister(adr, srcID, bitSize)
+        return strOneReg
+
+
+# generatePUSH:: Operation -> (ProgramState -> None)
+# Generates the function that runs a PUSH operation, the immediate value is the stack size
+def generatePUSH(operation: nodes.Operation):
+    regs, stackSize = operation.registers, operation.immediate
+
+    def push(state: programState.ProgramState) -> None:
         if len(regs) == 0:
-            return state, None
-        # head, *tail = registers
+            return
 
-        address, _ = state.getReg("SP")
+        address = state.registers[programState.SP_ID]
         # check address is in 0...stacksize
-        if address > (state.getLabelAddress("__STACKSIZE")) or address < 0:
-            return state, programState.RunError("Stack overflow", programState.RunError.ErrorType.Error)
+        if address > stackSize or address < 0:
+            raise programState.RunError("Stack overflow", programState.RunError.ErrorType.Error)
 
         for reg in regs:
             address -= 4
-            err = state.storeRegister(address, reg, 32)
-            if err is not None:
-                return state, err
-        state.setReg("SP", address)
-        return state, None
+            state.storeRegister(address, reg, 32)
+        state.setRegByID(programState.SP_ID, address)
 
-    return nodes.InstructionNode(section, line, push), tokenList
+    return push
 
 
-# decodePOP:: [Token] -> Node.Section -> (Node, [Token])
-# decode the POP instruction
-def decodePOP(tokenList: List[tokens.Token], section: nodes.Node.Section) -> Tuple[nodes.Node, List[tokens.Token]]:
-    line = tokenList[0].line
+# generatePOP:: Operation -> (ProgramState -> Either int None)
+# Generates the function that runs a POP operation, the immediate value is the stack size
+def generatePOP(operation: nodes.Operation):
+    regs, stackSize = operation.registers, operation.immediate
 
-    regs, tokenList = getRegisterList(tokenList, "POP")
-
-    if isinstance(regs, nodes.ErrorNode):
-        return regs, tokenList
-    regs = list(reversed(regs))
-
-    def pop(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
+    def pop(state: programState.ProgramState) -> None:
         if len(regs) == 0:
-            return state, None
-        # head, *tail = registers
+            return
 
-        address, _ = state.getReg("SP")
+        address = state.registers[programState.SP_ID]
         # check address is in 0...stacksize
-        if address > (state.getLabelAddress("__STACKSIZE")) or address < 0:
-            return state, programState.RunError("All stack entries have been pop'ed already", programState.RunError.ErrorType.Error)
+        if address > stackSize or address < 0:
+            raise programState.RunError("All stack entries have been pop'ed already", programState.RunError.ErrorType.Error)
         for reg in regs:
-            err = state.loadRegister(address, 32, False, reg)
+            state.loadRegister(address, 32, False, reg)
             address += 4
-            if err is not None:
-                return state, err
-        state.setReg("SP", address)
-        return state, None
+        state.setRegByID(programState.SP_ID, address)
+
+    # Popping PC returns from a subroutine
+    return instructionsUtils.branchOnPCWrite(pop, regs[-1])
+
 
-    return nodes.InstructionNode(section, line, pop), tokenList
+# The functions that generate the function of each memory operation, see instructions.generateFunction
+functionGenerators: Dict[str, Callable[[nodes.Operation], Callable]] = {
+    **{opcode: generateLDR for opcode in LOAD_OPERATIONS},
+    **{opcode: generateSTR for opcode in STORE_OPERATIONS},
+    "PUSH": generatePUSH,
+    "POP": generatePOP
+}
@@ -1,6 +1,5 @@
-from typing import List
-
 import nodes
+import programState
 import tokens
 
 
@@ -37,14 +36,21 @@ def generateToFewTokensError(line: int, instruction: str) -> nodes.ErrorNode:
                                f"\033[0m\n")
 
 
-# advanceToNewline:: [Token] -> [Token]
+# advanceToNewline:: TokenStream -> TokenStream
 # Advance to the first token after a newline
-def advanceToNewline(tokenList: List[tokens.Token]) -> List[tokens.Token]:
-    if len(tokenList) == 0:
-        return []
-    head, *tail = tokenList
-
-    if isinstance(head, tokens.NewLine):
-        return tail
-    else:
-        return advanceToNewline(tail)
+def advanceToNewline(tokenList: tokens.TokenStream) -> tokens.TokenStream:
+    return tokenList.advanceToNewline()
+
+
+# branchOnPCWrite:: (ProgramState -> None) -> int -> (ProgramState -> Either int None)
+# Generates the function of an instruction that writes to the register destID
+# Writing to PC changes the flow of the program, execution continues after the address that was written
+def branchOnPCWrite(func, destID: int):
+    if destID != programState.PC_ID:
+        return func
+
+    def writePC(state: programState.ProgramState) -> int:
+        func(state)
+        # Writing the PC can return from a subroutine, like POP {PC} and MOV PC, LR
+        return state.returnTo(state.registers[programState.PC_ID] + 4)
+    return writePC
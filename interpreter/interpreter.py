@@ -1,11 +1,21 @@
-from typing import List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from functools import reduce
 
 import nodes
 import programContext
 import programState
 import asmParser
+import blockCompiler
+import callGraph
+import codeCoverage
+import executor
+import instructions
+import executionBudget
+import executionTrace
 import lexer
+import profiler
+import programCache
+import superinstructions
 import tokens
 
 
@@ -21,80 +31,499 @@ def generateStacktraceElement(state: programState.ProgramState, address: int, fi
 # generateStacktrace:: ProgramState -> RunError -> String -> [String] -> String
 # Generates the stacktrace of an error
 def generateStacktrace(state: programState.ProgramState, error: programState.RunError, fileName: str, lines: List[str]) -> str:
-    # Get return addresses from the stack
-    sp: int = state.getReg("SP")[0]
-    stackSize = state.getLabelAddress("__STACKSIZE")
-    stack: List[nodes.Node] = state.memory[sp >> 2:stackSize >> 2]
-    callbacks = list(map(lambda n: generateStacktraceElement(state, n.value, fileName, lines), filter(lambda x: isinstance(x, nodes.DataNode) and x.source == "LR", stack)))[:-1]
+    # The calls that haven't returned come from the shadow call stack, see ProgramState.callStack
+    # The first call is the call of the start label by the interpreter, it is left out
+    callbacks = list(map(lambda address: generateStacktraceElement(state, address, fileName, lines), reversed(state.callStack[1:])))
 
     # Generate the error
     res = f"\033[31m"  # Red color
     res += "Traceback (most recent call first):\n"
-    res += generateStacktraceElement(state, state.getReg("PC")[0], fileName, lines) + '\n'
-    if not state.hasReturned:
-        res += generateStacktraceElement(state, state.getReg("LR")[0], fileName, lines) + '\n'
+    res += generateStacktraceElement(state, state.getReg("PC"), fileName, lines) + '\n'
     if len(callbacks) > 0:
         res += reduce(lambda a, b: a + "\n" + b, callbacks) + '\n'
     res += error.message + '\n'
     return res + f"\033[0m"  # Normal color
 
 
-warningNodes: List[nodes.InstructionNode] = []
+# generateWarningHandler:: String -> [String] -> (ProgramState -> String -> None)
+# Generates the function that shows the warnings of a program, see ProgramState.warn
+# Every instruction only shows its first warning, the warning is only formatted when it is shown
+def generateWarningHandler(fileName: str, lines: List[str]) -> Callable[[programState.ProgramState, str], None]:
+    # The addresses of the instructions that have shown a warning
+    warned: Set[int] = set()
+
+    def showWarning(state: programState.ProgramState, message: str):
+        address = state.registers[programState.PC_ID]
+        if address not in warned:
+            warned.add(address)
+            print(generateStacktrace(state, programState.RunError(message, programState.RunError.ErrorType.Warning), fileName, lines))
+    return showWarning
+
+
+# handleError:: ProgramState -> RunError -> String -> [String] -> None
+# Handles an error raised by an instruction, the program always stops after it
+# An error (not a warning or the normal end of the program) is saved in state.error
+def handleError(state: programState.ProgramState, err: programState.RunError, fileName: str, lines: List[str]):
+    if err.errorType == programState.RunError.ErrorType.Error:
+        state.error = err
+        print(generateStacktrace(state, err, fileName, lines))
+
+
+# finishInstruction:: ProgramState -> Either int None -> None
+# Moves the program counter to the next instruction after an instruction has been executed
+# nextAddress: the result of the instruction, the address of the next instruction when it changed the flow of the program
+def finishInstruction(state: programState.ProgramState, nextAddress: Optional[int]):
+    registers = state.registers
+    if nextAddress is None:
+        registers[programState.PC_ID] += 4
+        return
+    registers[programState.PC_ID] = nextAddress
 
 
 # executeInstruction:: InstructionNode -> ProgramState -> String -> [String] -> ProgramState, bool
+# Returns False when the program should stop
 def executeInstruction(node: nodes.InstructionNode, state: programState.ProgramState, fileName: str, lines: List[str]) -> Tuple[programState.ProgramState, bool]:
+    if state.warningHandler is None:
+        state.warningHandler = generateWarningHandler(fileName, lines)
     if isinstance(node, nodes.InstructionNode):
         # Execute the instruction
-        state, err = node.function(state)
-
-        # Exception handling
-        if err is not None:
-            if isinstance(err, programState.RunError):
-                if err.errorType == programState.RunError.ErrorType.Error:
-                    print(generateStacktrace(state, err, fileName, lines))
-                    return state, False
-                elif err.errorType == programState.RunError.ErrorType.Warning:
-                    if node not in warningNodes:
-                        print(generateStacktrace(state, err, fileName, lines))
-                        warningNodes.append(node)
-                elif isinstance(err, programState.StopProgram):
-                    return state, False
-        # Set a flag in the ProgramState when a subroutine returned. This way the stacktrace generator knows to not print a stacktrace element for the link register
-        pc, _ = state.getReg("PC")
-        if pc == state.getReg("LR")[0]:
-            state.hasReturned = True
-        # increment the program counter
-        state.setReg("PC", pc + 4)
+        try:
+            nextAddress = node.function(state)
+        except programState.RunError as err:
+            handleError(state, err, fileName, lines)
+            return state, False
+        finishInstruction(state, nextAddress)
         return state, True
     else:
         if isinstance(node, programState.RunError):
-            print(generateStacktrace(state, node, fileName, lines))
+            handleError(state, node, fileName, lines)
         return state, False
 
 
-# runProgram:: ProgramState -> String -> [String] -> ProgramState
-def runProgram(state: programState.ProgramState, fileName: str, lines: List[str]) -> programState.ProgramState:
-    while True:
-        state, res = executeInstruction(state.getInstructionFromMem(state.getReg("PC")[0]), state, fileName, lines)
-        if not res:
-            break
+# generateDispatchTable:: ProgramState -> ([ProgramState -> Either int None], [int])
+# Generates the functions the run loop calls for each entry of the instruction table, and the number of instructions each of them executes
+# Words that don't contain an instruction get a function that raises the same error as getInstructionFromMem,
+#   an extra entry at the end is used for addresses outside of the table
+def generateDispatchTable(state: programState.ProgramState) -> Tuple[List[Callable[[programState.ProgramState], Optional[int]]], List[int]]:
+    def noInstruction(s: programState.ProgramState) -> Optional[int]:
+        raise s.getInstructionFromMem(s.registers[programState.PC_ID])
+
+    code = list(map(lambda node: noInstruction if node is None else node.function, state.instructions)) + [noInstruction]
+    counts = list(map(lambda node: 0 if node is None else node.instructionCount, state.instructions)) + [0]
+    return code, counts
+
+
+# generateUnfusedDispatchTable:: ProgramState -> ([ProgramState -> Either int None], [int])
+# The dispatch table of generateDispatchTable with the fused instructions replaced by their first instruction,
+#   the second instruction is still in the table after it. Used by the run loops that look at every instruction separately
+def generateUnfusedDispatchTable(state: programState.ProgramState) -> Tuple[List[Callable[[programState.ProgramState], Optional[int]]], List[int]]:
+    code, counts = generateDispatchTable(state)
+    for idx, node in enumerate(state.instructions):
+        if isinstance(node, nodes.FusedInstructionNode):
+            code[idx], counts[idx] = node.first.function, 1
+    return code, counts
+
+
+# runProgram:: ProgramState -> String -> [String] -> int -> ProgramState
+# Threaded dispatch: the program counter is kept as an index in the dispatch table, see generateDispatchTable
+#   It's only written to the PC register right before an instruction runs, so instructions and stacktraces see the right address
+# The blocks that execution enters often are compiled, see blockCompiler.py. A compiled block runs instead of the dispatch table
+#   when it starts at the program counter, it returns 0 instructions when it can't run and the instruction is dispatched instead
+# maxSteps: stop the program after this number of instructions
+# budget: the limits of the run, see executionBudget.py, replaces maxSteps when it is given.
+#   The loops only compare the number of executed instructions with the next check of the budget
+# profile: when given, the number of times each instruction is executed is added to it, see runProfiledProgram
+# costs: the not taken and taken costs that are added to profile instead of the number of executions, like profiler.cycleTables
+# graph: when given, the instructions and costs are added to it per call stack, see runCallGraphProgram
+# coverage: when given, the executed instructions and the directions of the conditional branches are added to it, see runCoverageProgram
+def runProgram(state: programState.ProgramState, fileName: str, lines: List[str], maxSteps: Optional[int] = None,
+               profile: Optional[List[int]] = None, costs: Optional[Tuple[List[int], List[int]]] = None,
+               graph: Optional[callGraph.CallGraph] = None, coverage: Optional[codeCoverage.Coverage] = None,
+               budget: Optional[executionBudget.Budget] = None) -> programState.ProgramState:
+    if budget is None:
+        budget = executionBudget.Budget(maxSteps)
+    if coverage is not None:
+        return runCoverageProgram(state, fileName, lines, coverage, budget)
+    if graph is not None:
+        return runCallGraphProgram(state, fileName, lines, graph, budget, costs)
+    if profile is not None:
+        return runProfiledProgram(state, fileName, lines, profile, budget, costs)
+    code, counts = generateDispatchTable(state)
+    registers = state.registers
+    base = state.instructionBase
+    size = len(state.instructions)
+    cache = blockCompiler.BlockCache(state)
+    blocks, heat = cache.functions, cache.heat
+    hotThreshold = blockCompiler.HOT_THRESHOLD
+    # The compiled blocks don't add their writes to the journal of the history, see ProgramState.memoryJournal
+    if state.memoryJournal is not None:
+        hotThreshold = -1
+    state.warningHandler = generateWarningHandler(fileName, lines)
+    state.textWriteHandler = cache.invalidate
+    steps = state.steps
+    nextCheck = budget.start(state)
+    pc = registers[programState.PC_ID]
+    index = (pc >> 2) - base
+    if (pc & 3) != 0 or not 0 <= index < size:
+        index = size
+    # Errors stop the program, so the loop doesn't have to check the result of every instruction
+    try:
+        while True:
+            if steps >= nextCheck:
+                registers[programState.PC_ID] = pc
+                error = budget.check(state, steps)
+                if error is not None:
+                    handleError(state, error, fileName, lines)
+                    break
+                nextCheck = budget.nextCheck(steps)
+            block = blocks[index]
+            if block is not None:
+                nextAddress, executed = block(state, nextCheck - steps)
+                if executed != 0:
+                    steps += executed
+                    pc = nextAddress
+                    index = (pc >> 2) - base
+                    if (pc & 3) != 0 or not 0 <= index < size:
+                        index = size
+                    elif blocks[index] is None:
+                        # A block is left at a jump or right before the next block, which is entered here
+                        heat[index] += 1
+                        if heat[index] == hotThreshold:
+                            cache.compile(index)
+                    continue
+            registers[programState.PC_ID] = pc
+            nextAddress = code[index](state)
+            steps += counts[index]
+            if nextAddress is None:
+                pc += 4
+                index += 1
+                continue
+            # Execution jumped to nextAddress
+            pc = nextAddress
+            index = (pc >> 2) - base
+            if (pc & 3) != 0 or not 0 <= index < size:
+                # The extra entry of the dispatch table raises the error
+                index = size
+                continue
+            heat[index] += 1
+            if heat[index] == hotThreshold:
+                cache.compile(index)
+    except programState.RunError as err:
+        # The instruction that raised the error has been executed as well
+        steps += counts[index]
+        handleError(state, err, fileName, lines)
+    finally:
+        state.textWriteHandler = None
+
+    state.steps = steps
+    return state
+
+
+# runInstrumentedProgram:: ProgramState -> String -> [String] -> ((int, int, Either int None) -> None) -> Budget -> ProgramState
+# The run loop of runProgram with a hook that is called after every instruction, used by the profiles, the coverage and the trace
+# Fused instructions are executed as two separate instructions, so the hook sees every instruction, see generateUnfusedDispatchTable
+# hook(index, pc, nextAddress): index: the entry of the instruction in the instruction table, pc: its address,
+#   nextAddress: the result of the instruction, None when the program continues with the next instruction
+# The instruction that raised an error is passed to the hook as well, with nextAddress None. An address outside of the table is not
+# cache: compiled blocks that do the work of the hook themselves for the instructions they run, like the blocks of a trace,
+#   they run like in runProgram and the hook is only called for the other instructions
+def runInstrumentedProgram(state: programState.ProgramState, fileName: str, lines: List[str], hook: Callable[[int, int, Optional[int]], None],
+                           budget: Optional[executionBudget.Budget] = None,
+                           cache: Optional[blockCompiler.BlockCache] = None) -> programState.ProgramState:
+    code, counts = generateUnfusedDispatchTable(state)
+    registers = state.registers
+    base = state.instructionBase
+    size = len(state.instructions)
+    if cache is None:
+        blocks: List[Optional[Callable]] = [None] * (size + 1)
+        heat = [0] * (size + 1)
+        hotThreshold = -1
+    else:
+        blocks, heat = cache.functions, cache.heat
+        hotThreshold = blockCompiler.HOT_THRESHOLD
+        state.textWriteHandler = cache.invalidate
+    state.warningHandler = generateWarningHandler(fileName, lines)
+    steps = state.steps
+    if budget is None:
+        budget = executionBudget.Budget()
+    nextCheck = budget.start(state)
+    pc = registers[programState.PC_ID]
+    index = (pc >> 2) - base
+    if (pc & 3) != 0 or not 0 <= index < size:
+        index = size
+    try:
+        while True:
+            if steps >= nextCheck:
+                registers[programState.PC_ID] = pc
+                error = budget.check(state, steps)
+                if error is not None:
+                    handleError(state, error, fileName, lines)
+                    break
+                nextCheck = budget.nextCheck(steps)
+            block = blocks[index]
+            if block is not None:
+                nextAddress, executed = block(state, nextCheck - steps)
+                if executed != 0:
+                    steps += executed
+                    pc = nextAddress
+                    index = (pc >> 2) - base
+                    if (pc & 3) != 0 or not 0 <= index < size:
+                        index = size
+                    elif blocks[index] is None:
+                        heat[index] += 1
+                        if heat[index] == hotThreshold:
+                            cache.compile(index)
+                    continue
+            registers[programState.PC_ID] = pc
+            nextAddress = code[index](state)
+            # Every entry of the unfused table is a single instruction
+            steps += 1
+            hook(index, pc, nextAddress)
+            if nextAddress is None:
+                pc += 4
+                index += 1
+                continue
+            pc = nextAddress
+            index = (pc >> 2) - base
+            if (pc & 3) != 0 or not 0 <= index < size:
+                index = size
+                continue
+            heat[index] += 1
+            if heat[index] == hotThreshold:
+                cache.compile(index)
+    except programState.RunError as err:
+        # The instruction that raised the error has been executed as well
+        steps += counts[index]
+        if index < size:
+            hook(index, pc, None)
+        handleError(state, err, fileName, lines)
+    finally:
+        state.textWriteHandler = None
+
+    state.steps = steps
+    return state
+
+
+# runProfiledProgram:: ProgramState -> String -> [String] -> [int] -> Budget -> ([int], [int]) -> ProgramState
+# Counts the executions of every instruction in profile, indexed like state.instructions, see profiler.generateProfileHook
+# costs: the cost of each instruction when the program continues with the next instruction and when it changes the flow of the program,
+#   the cost is added to profile instead of 1. The cost of an instruction that raises an error is the first cost
+def runProfiledProgram(state: programState.ProgramState, fileName: str, lines: List[str], profile: List[int],
+                       budget: Optional[executionBudget.Budget] = None, costs: Optional[Tuple[List[int], List[int]]] = None) -> programState.ProgramState:
+    return runInstrumentedProgram(state, fileName, lines, profiler.generateProfileHook(profile, costs), budget)
+
+
+# runCallGraphProgram:: ProgramState -> String -> [String] -> CallGraph -> Budget -> ([int], [int]) -> ProgramState
+# Fills a call-graph profile, see callGraph.py
+# costs: like runProfiledProgram, the cycles of the profile are 0 without costs
+# The loop of runProgram, instructions that continue with the next instruction don't do anything extra. The cycles are added up
+#   when the program jumps: a straight run of instructions since the previous jump costs the difference of their prefix sums,
+#   plus the taken cost of the instruction that jumped. The profile is only updated after the instructions that can call or return
+def runCallGraphProgram(state: programState.ProgramState, fileName: str, lines: List[str], graph: callGraph.CallGraph,
+                        budget: Optional[executionBudget.Budget] = None, costs: Optional[Tuple[List[int], List[int]]] = None) -> programState.ProgramState:
+    code, counts = generateDispatchTable(state)
+    size = len(state.instructions)
+    if costs is None:
+        costs = ([0] * size, [0] * size)
+    cost, takenCost = costs
+    base = state.instructionBase
+    # The address a fused instruction continues at when its branch is not taken, -1 for the other instructions
+    # A fused instruction that branches to the instruction after it can't be told apart from one that didn't branch, it is split
+    fallThrough: List[int] = [-1] * (size + 1)
+    for idx, node in enumerate(state.instructions):
+        if isinstance(node, nodes.FusedInstructionNode):
+            address = (base + idx + 2) << 2
+            if node.second.operation is not None and node.second.operation.immediate == address:
+                code[idx], counts[idx] = node.first.function, 1
+            else:
+                fallThrough[idx] = address
+    # cyclesBefore[idx]: the not taken cost of the instructions before idx
+    cyclesBefore: List[int] = [0]
+    for value in cost:
+        cyclesBefore.append(cyclesBefore[-1] + value)
+    callsOrReturns = callGraph.callsAndReturns(state) + [False]
+    callStack = state.callStack
+    registers = state.registers
+    state.warningHandler = generateWarningHandler(fileName, lines)
+    steps = state.steps
+    cycles = 0
+    if budget is None:
+        budget = executionBudget.Budget()
+    nextCheck = budget.start(state)
+    pc = registers[programState.PC_ID]
+    index = (pc >> 2) - base
+    if (pc & 3) != 0 or not 0 <= index < size:
+        index = size
+    # The first instruction of the current straight run
+    start = index
+    try:
+        while True:
+            if steps >= nextCheck:
+                registers[programState.PC_ID] = pc
+                error = budget.check(state, steps)
+                if error is not None:
+                    cycles += cyclesBefore[index] - cyclesBefore[start]
+                    handleError(state, error, fileName, lines)
+                    break
+                nextCheck = budget.nextCheck(steps)
+            registers[programState.PC_ID] = pc
+            nextAddress = code[index](state)
+            steps += counts[index]
+            if nextAddress is None:
+                pc += 4
+                index += 1
+                continue
+            if nextAddress == fallThrough[index]:
+                pc = nextAddress
+                index += 2
+                continue
+            last = index + counts[index] - 1
+            cycles += cyclesBefore[last] - cyclesBefore[start] + takenCost[last]
+            if callsOrReturns[index] and len(callStack) != graph.depth:
+                graph.update(state, nextAddress, steps, cycles)
+            pc = nextAddress
+            index = (pc >> 2) - base
+            if (pc & 3) != 0 or not 0 <= index < size:
+                index = size
+            start = index
+    except programState.RunError as err:
+        # The instruction that raised the error has been executed as well
+        steps += counts[index]
+        cycles += cyclesBefore[index + counts[index]] - cyclesBefore[start]
+        handleError(state, err, fileName, lines)
 
+    state.steps = steps
+    graph.addSample(steps, cycles)
     return state
 
 
-# parse:: String -> String -> int -> String -> ProgramState
-# calls the parser and the lexer
-def parse(fileName: str, file_contents: str, stackSize: int, startLabel: str) -> Optional[programState.ProgramState]:
+# runCoverageProgram:: ProgramState -> String -> [String] -> Coverage -> Budget -> ProgramState
+# Marks every executed instruction in the coverage, see codeCoverage.generateCoverageHook
+def runCoverageProgram(state: programState.ProgramState, fileName: str, lines: List[str], coverage: codeCoverage.Coverage,
+                       budget: Optional[executionBudget.Budget] = None) -> programState.ProgramState:
+    return runInstrumentedProgram(state, fileName, lines, codeCoverage.generateCoverageHook(coverage), budget)
+
+
+# runTracedProgram:: ProgramState -> String -> [String] -> TraceWriter -> Budget -> ProgramState
+# Writes a record of every instruction to the trace, see executionTrace.generateTraceHook
+# The instruction that raised an error is in the trace as well. The trace is not closed
+def runTracedProgram(state: programState.ProgramState, fileName: str, lines: List[str], trace: executionTrace.TraceWriter,
+                     budget: Optional[executionBudget.Budget] = None) -> programState.ProgramState:
+    try:
+        # The compiled blocks append the records of the instructions they run themselves, see blockCompiler.BlockSource.record
+        return runInstrumentedProgram(state, fileName, lines, executionTrace.generateTraceHook(trace, state), budget,
+                                      blockCompiler.BlockCache(state, trace))
+    finally:
+        state.memoryJournal = None
+
+
+# runPairHistogram:: ProgramState -> String -> [String] -> Budget -> {(String, String): int}
+# Counts how often each pair of instructions is executed right after each other, see superinstructions.generatePairHistogramHook
+# The result shows which pairs are worth fusing, see superinstructions.py
+def runPairHistogram(state: programState.ProgramState, fileName: str, lines: List[str],
+                     budget: Optional[executionBudget.Budget] = None) -> Dict[Tuple[str, str], int]:
+    pairCounts: Dict[Tuple[str, str], int] = {}
+    runInstrumentedProgram(state, fileName, lines, superinstructions.generatePairHistogramHook(pairCounts, state), budget)
+    return pairCounts
+
+
+# The backends that generate the functions of the instructions from their operations
+# closures: a specialised function per instruction, table: the handler of the opcode from executor.HANDLERS
+ENGINES: Dict[str, Callable[[nodes.Operation], Callable]] = {
+    "closures": instructions.generateFunction,
+    "table": executor.generateFunction
+}
+
+
+# lex:: String -> String -> Either [Token] None
+# calls the lexer, prints the errors and returns None when there are any
+def lex(fileName: str, file_contents: str) -> Optional[List[tokens.Token]]:
     loadedTokens = lexer.lexFile(file_contents)
     loadedTokens: List[tokens.Token] = lexer.fixMismatches(loadedTokens, file_contents)
 
     if lexer.printErrors(loadedTokens, fileName):
         return None
+    return loadedTokens
+
+
+# assemble:: String -> String -> Either ProgramContext None
+# calls the lexer and the parser, prints the errors and returns None when there are any
+def assemble(fileName: str, file_contents: str) -> Optional[programContext.ProgramContext]:
+    loadedTokens = lex(fileName, file_contents)
+    if loadedTokens is None:
+        return None
+    return parseTokens(fileName, loadedTokens)
 
+
+# parseTokens:: String -> [Token] -> Either ProgramContext None
+# calls the parser on the tokens of the lexer, prints the errors and returns None when there are any
+def parseTokens(fileName: str, loadedTokens: List[tokens.Token]) -> Optional[programContext.ProgramContext]:
     context = asmParser.parse(loadedTokens)
     errCount = asmParser.printErrors(context, fileName)
     if errCount > 0:
         return None
+    return context
+
+
+# parseImage:: String -> String -> int -> String -> bool -> String -> Either String None -> ProgramImage
+# assembles and links a program, the image can be run many times with ProgramImage.newState
+# fuse: replace common pairs of instructions by fused instructions, should be disabled when using breakpoints
+# engine: the backend that runs the instructions, one of the keys of ENGINES
+# cacheDir: the directory of the cache of assembled programs, see programCache.py, None disables the cache
+def parseImage(fileName: str, file_contents: str, stackSize: int, startLabel: str, fuse: bool = True, engine: str = "closures",
+               cacheDir: Optional[str] = None) -> Optional[programContext.ProgramImage]:
+    key: Optional[str] = None
+    cached: Optional[Tuple[programContext.ProgramContext, List[str]]] = None
+    if cacheDir is not None:
+        key = programCache.cacheKey(file_contents, stackSize, startLabel)
+        cached = programCache.loadContext(cacheDir, key)
+    if cached is not None:
+        context, warnings = cached
+        # The lexer doesn't run for a cached program, so its warnings are shown from the cache
+        for message in warnings:
+            print(message.replace("$fileName$", fileName))
+    else:
+        loadedTokens = lex(fileName, file_contents)
+        if loadedTokens is None:
+            return None
+        context = parseTokens(fileName, loadedTokens)
+        if context is None:
+            return None
+        # Store the program before it is linked, the link stage changes the operations
+        if key is not None:
+            programCache.storeContext(cacheDir, key, context, lexer.warnings(loadedTokens))
+    return link(context, fileName, stackSize, startLabel, fuse, engine)
+
+
+# link:: ProgramContext -> String -> int -> String -> bool -> String -> Either ProgramImage None
+# generates the image of an assembled program and links it, prints the errors and returns None when there are any
+# The link stage changes the operations of the context, so a context can only be linked once
+def link(context: programContext.ProgramContext, fileName: str, stackSize: int, startLabel: str, fuse: bool = True,
+         engine: str = "closures") -> Optional[programContext.ProgramImage]:
+    image = programContext.generateProgramImage(context, stackSize, startLabel, fileName)
+    generateFunction = ENGINES[engine]
+    if engine != "closures":
+        # The decoders generate closures, the link stage generates the functions of the instructions that refer to a label
+        for node in image.instructions:
+            if node is not None and node.operation is not None and node.operation.label is None:
+                node.function = generateFunction(node.operation)
+    linkErrors = programContext.linkProgram(image, generateFunction)
+    for err in linkErrors:
+        print(err)
+    if len(linkErrors) > 0:
+        return None
+
+    # Fuse after linking, the fused instructions use the linked functions
+    if fuse:
+        image.instructions = superinstructions.fuseInstructions(image.instructions)
+    return image
 
-    return programContext.generateProgramState(context, stackSize, startLabel, fileName)
+
+# parse:: String -> String -> int -> String -> bool -> String -> Either String None -> ProgramState
+# assembles and links a program and generates the state to run it, see parseImage
+def parse(fileName: str, file_contents: str, stackSize: int, startLabel: str, fuse: bool = True, engine: str = "closures",
+          cacheDir: Optional[str] = None) -> Optional[programState.ProgramState]:
+    image = parseImage(fileName, file_contents, stackSize, startLabel, fuse, engine, cacheDir)
+    if image is None:
+        return None
+    return image.newState()
@@ -1,5 +1,6 @@
-from typing import Union, Any, Match, Callable, List
+from typing import Union, Any, Match, Callable, List, Optional
 import re
+from bisect import bisect_left
 from functools import reduce
 
 import tokens
@@ -51,8 +52,15 @@ def lastIndex(string: str, search: str) -> int:
         return lastIndex(string[:-1], search)
 
 
-# match_to_token:: Match -> String -> int -> Either Token None
-def match_to_token(match: Match[Union[str, Any]], file_contents: str, offset: int) -> Union[tokens.Token, None]:
+# findNewlines:: String -> [int]
+# Get the indices of all newlines in the text, in a single pass
+def findNewlines(file_contents: str) -> List[int]:
+    return [match.start() for match in re.finditer("\n", file_contents)]
+
+
+# match_to_token:: Match -> [int] -> Either Token None
+# newlines: the indices of all newlines in the text, the line number is the number of newlines before the token plus one
+def match_to_token(match: Match[Union[str, Any]], newlines: List[int]) -> Union[tokens.Token, None]:
     kind: str = match.lastgroup
     value: str = match.group()
 
@@ -60,18 +68,21 @@ def match_to_token(match: Match[Union[str, Any]], file_contents: str, offset: in
     if func is None:
         return None
 
-    processed: str = file_contents[:match.start()+offset]
-    line = processed.count('\n') + 1
-    token = func(value, match.start()+offset, line)
+    start = match.start()
+    line = bisect_left(newlines, start) + 1
+    token = func(value, start, line)
     return token
 
 
 # Convert the text to tokens from a certain index
 # Used in fixMismatches to redo part of the lexing process after fixing an error
-def lexFrom(file_contents: str, indexFrom: int) -> List[tokens.Token]:
-    matches = TOKEN_REGEX.finditer(file_contents[indexFrom:])
+# newlines: the result of findNewlines for file_contents, is calculated when not given
+def lexFrom(file_contents: str, indexFrom: int, newlines: Optional[List[int]] = None) -> List[tokens.Token]:
+    if newlines is None:
+        newlines = findNewlines(file_contents)
+    matches = TOKEN_REGEX.finditer(file_contents, indexFrom)
     tokenList = list(filter(lambda x: x is not None,
-                            map(lambda a: match_to_token(a, file_contents, indexFrom), matches)))
+                            map(lambda a: match_to_token(a, newlines), matches)))
     return tokenList
 
 
@@ -80,92 +91,98 @@ def lexFile(file_contents: str) -> List[tokens.Token]:
     return lexFrom(file_contents, 0)
 
 
-# addSubsequentTokens:: [Token] -> str
-# Adds all subsequent tokens to a string, stops when more then one token is no Mismatch
+# addSubsequentTokens:: [Token] -> int -> int -> str
+# Adds all subsequent tokens from index start to a string, stops when more then one token is no Mismatch
 # This way, a character after a ' will be added to the string even though it is classified as a Label
-def addSubsequentTokens(tokenList: List[tokens.Token]) -> str:
-    def addSubsequentTokensRecursive(tokenlijst, add) -> str:
-        if len(tokenlijst) == 0:
-            return add
-        head, *tail = tokenlijst
-        if head.is_mismatch or (len(tail) > 0 and tail[0].is_mismatch):
-            return addSubsequentTokensRecursive(tail, add + head.contents)
-        else:
-            return add+head.contents
-    return addSubsequentTokensRecursive(tokenList, "")
+# Only the first few characters are needed to recognize the mismatch, so it also stops after maxLength characters
+def addSubsequentTokens(tokenList: List[tokens.Token], start: int, maxLength: int = 4) -> str:
+    res = ""
+    idx = start
+    while idx < len(tokenList) and len(res) < maxLength:
+        token = tokenList[idx]
+        res += token.contents
+        if not (token.is_mismatch or (idx+1 < len(tokenList) and tokenList[idx+1].is_mismatch)):
+            break
+        idx += 1
+    return res
 
 
 # Fix mismatches that can be fixed.
 # This is done by inserting additional characters and converting the remaining text again
+# The tokens are processed in a single pass, only the text after a fixed mismatch is converted again
 def fixMismatches(tokenList: List[tokens.Token], file_contents: str) -> List[tokens.Token]:
-    if len(tokenList) == 0:
-        return []
-    head, *tail = tokenList
-    head: tokens.Token = head
-    if head.is_mismatch:
-        idx: int = head.start_index
-        text: str = addSubsequentTokens(tokenList)
+    res: List[tokens.Token] = []
+    newlines: Optional[List[int]] = None
+    idx = 0
+    while idx < len(tokenList):
+        head: tokens.Token = tokenList[idx]
+        if not head.is_mismatch:
+            res.append(head)
+            idx += 1
+            continue
+
+        text: str = addSubsequentTokens(tokenList, idx)
         # string
         if text[0] == '"':
             # String is not terminated, add " to the end of the file
-            error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                    f"File \"$fileName$\"\n"
-                                                    f"\tSyntax warning: Unterminated string at end of file, '\"' inserted"
-                                                    f"\033[0m", tokens.ErrorToken.ErrorType.Warning)
+            res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                         f"File \"$fileName$\"\n"
+                                         f"\tSyntax warning: Unterminated string at end of file, '\"' inserted"
+                                         f"\033[0m", tokens.ErrorToken.ErrorType.Warning))
             file_contents = file_contents + "\""
         # comment
         elif text[0:2] == '/*':
             # Multi-line comment is not terminated, add */ to the end of the file
-            error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                    f"File \"$fileName$\"\n"
-                                                    f"\tSyntax warning: Multi-line comment opened, but not closed (*/ is missing)"
-                                                    f"\033[0m", tokens.ErrorToken.ErrorType.Warning)
+            res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                         f"File \"$fileName$\"\n"
+                                         f"\tSyntax warning: Multi-line comment opened, but not closed (*/ is missing)"
+                                         f"\033[0m", tokens.ErrorToken.ErrorType.Warning))
             file_contents = file_contents + "*/"
         # immed char
         elif len(text) > 1 and text[0] in '#=':
             if text[1] == "'":
                 # quote
                 if len(text) > 3 and text[2] == '\\' and text[3] in "tnrfv":
-                    error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                            f"File \"$fileName$\", line {head.line}\n"
-                                                            f"\tSyntax error: No \"'\" found after \"{text[0:4]}\""
-                                                            f"\033[0m", tokens.ErrorToken.ErrorType.Error)
-                    return [error] + fixMismatches(tail[3:], file_contents)
+                    res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                                 f"File \"$fileName$\", line {head.line}\n"
+                                                 f"\tSyntax error: No \"'\" found after \"{text[0:4]}\""
+                                                 f"\033[0m", tokens.ErrorToken.ErrorType.Error))
+                    idx += 4
                 elif len(text) > 2:
-                    error: tokens.Token = \
-                        tokens.ErrorToken(f"\033[31m"  # red color
-                                          f"File \"$fileName$\", line {head.line}\n"
-                                          f"\tSyntax error: No \"'\" found after \"{text[0:3]}\""
-                                          f"\033[0m", tokens.ErrorToken.ErrorType.Error)
-                    return [error] + fixMismatches(tail[2:], file_contents)
+                    res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                                 f"File \"$fileName$\", line {head.line}\n"
+                                                 f"\tSyntax error: No \"'\" found after \"{text[0:3]}\""
+                                                 f"\033[0m", tokens.ErrorToken.ErrorType.Error))
+                    idx += 3
                 else:
-                    error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                            f"File \"$fileName$\", line {head.line}\n"
-                                                            f"\tSyntax error: No character found after \"{text[:2]}\""
-                                                            f"\033[0m", tokens.ErrorToken.ErrorType.Error)
-                    return [error] + fixMismatches(tail[1:], file_contents)
+                    res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                                 f"File \"$fileName$\", line {head.line}\n"
+                                                 f"\tSyntax error: No character found after \"{text[:2]}\""
+                                                 f"\033[0m", tokens.ErrorToken.ErrorType.Error))
+                    idx += 2
             else:
-                error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                        f"File \"$fileName$\", line {head.line}\n"
-                                                        f"\tSyntax error: Unknown token: {text[1]}"
-                                                        f"\033[0m", tokens.ErrorToken.ErrorType.Error)
-                return [error] + fixMismatches(tail, file_contents)
+                res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                             f"File \"$fileName$\", line {head.line}\n"
+                                             f"\tSyntax error: Unknown token: {text[1]}"
+                                             f"\033[0m", tokens.ErrorToken.ErrorType.Error))
+                idx += 1
+            continue
         else:
             # Don't know what to do, generate an error
-            error: tokens.Token = tokens.ErrorToken(f"\033[31m"  # red color
-                                                    f"File \"$fileName$\", line {head.line}\n"
-                                                    f"\tSyntax error: Unknown token: {text[0]}"
-                                                    f"\033[0m", tokens.ErrorToken.ErrorType.Error)
-            return [error] + fixMismatches(tail, file_contents)
-
-        # Re-generate the tokens with the changes text
-        newTokens = lexFrom(file_contents, idx)
-        if error is not None:
-            return [error] + fixMismatches(newTokens, file_contents)
-        else:
-            return fixMismatches(newTokens, file_contents)
-    else:
-        return [head] + fixMismatches(tail, file_contents)
+            res.append(tokens.ErrorToken(f"\033[31m"  # red color
+                                         f"File \"$fileName$\", line {head.line}\n"
+                                         f"\tSyntax error: Unknown token: {text[0]}"
+                                         f"\033[0m", tokens.ErrorToken.ErrorType.Error))
+            idx += 1
+            continue
+
+        # Re-generate the tokens after the mismatch with the changed text
+        # The inserted characters contain no newlines, so the newline indices stay valid
+        if newlines is None:
+            newlines = findNewlines(file_contents)
+        tokenList = lexFrom(file_contents, head.start_index, newlines)
+        idx = 0
+    return res
 
 
 # printAndReturn:: Token -> String -> ErrorType
@@ -182,3 +199,10 @@ def printAndReturn(token: tokens.Token, fileName: str) -> tokens.ErrorToken.Erro
 def printErrors(tokenList: List[tokens.Token], fileName: str) -> bool:
     errList = list(filter(lambda a: a == tokens.ErrorToken.ErrorType.Error, map(lambda a: printAndReturn(a, fileName), tokenList)))
     return len(errList) > 0
+
+
+# warnings:: [Token] -> [String]
+# The messages of the warnings in the tokens, with the $fileName$ placeholder of the messages that printErrors prints
+def warnings(tokenList: List[tokens.Token]) -> List[str]:
+    return [token.message for token in tokenList
+            if isinstance(token, tokens.ErrorToken) and token.errorType == tokens.ErrorToken.ErrorType.Warning]
@@ -1,27 +1,15 @@
-from functools import reduce
+import sys
 
-import interpreter
+import cli
 
-fileName = "decompress.asm"
-useGUI = True
-stackSize = 1024
-startLabel = "_start"
-
-
-if useGUI:
+# Without arguments the visualizer is started
+# With arguments the program is run without the visualizer, see cli.py or run 'python main.py --help' for the arguments
+if len(sys.argv) > 1:
+    sys.exit(cli.main(sys.argv[1:]))
+else:
     import visualizer
 
-    visualizer.startLabel = startLabel
-    visualizer.stackSize = stackSize
+    visualizer.startLabel = cli.DEFAULT_START_LABEL
+    visualizer.stackSize = cli.DEFAULT_STACK_SIZE
 
     visualizer.app.MainLoop()
-else:
-    file = open(fileName, "r")
-    lines = file.readlines()
-
-    file_contents: str = reduce(lambda X, Y: X + Y, lines)
-
-    state = interpreter.parse(fileName, file_contents, stackSize, startLabel)
-    if state is None:
-        exit(-1)
-    interpreter.runProgram(state, fileName, lines)
@@ -1,4 +1,7 @@
 from enum import Enum
+from typing import Optional, Tuple
+
+import cycleModel
 
 
 class Node:
@@ -32,22 +35,85 @@ class DataNode(Node):
             format(type(self).__name__, hex(self.value), self.source)
 
 
+# The decoded form of an instruction: the opcode with its operands
+# Registers are stored as their index in ProgramState.registers, operands the instruction doesn't have are None
+# The functions that run an operation are generated from it, see instructions.generateFunction and executor.py
+class Operation:
+    __slots__ = ("opcode", "line", "rd", "rn", "rm", "immediate", "label", "registers")
+
+    # Operation:: String -> int -> Either int None -> Either int None -> Either int None -> Either int None -> Either String None -> Either (int) None -> Operation
+    # rd: the destination register, or the register that is stored by a store instruction
+    # immediate: the immediate value as it is used while running, for an operation with a label it is set to the address of the label by the link stage
+    # registers: the register list of PUSH and POP, in the order the registers are transferred
+    def __init__(self, opcode: str, line: int, rd: Optional[int] = None, rn: Optional[int] = None, rm: Optional[int] = None,
+                 immediate: Optional[int] = None, label: Optional[str] = None, registers: Optional[Tuple[int, ...]] = None):
+        self.opcode: str = opcode
+        self.line: int = line
+        self.rd: Optional[int] = rd
+        self.rn: Optional[int] = rn
+        self.rm: Optional[int] = rm
+        self.immediate: Optional[int] = immediate
+        self.label: Optional[str] = label
+        self.registers: Optional[Tuple[int, ...]] = registers
+
+    def __str__(self) -> str:
+        operands = ", ".join(f"{name}={getattr(self, name)}" for name in self.__slots__[2:] if getattr(self, name) is not None)
+        return "{}({}, {}, {})".\
+            format(type(self).__name__, self.opcode, self.line, operands)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
 class InstructionNode(Node):
-    # InstructionNode:: Node.Section -> int -> (ProgramState -> (ProgramState, RunError)) -> InstructionNode
-    def __init__(self, section: Node.Section, line: int, func):
+    # InstructionNode:: Node.Section -> int -> (ProgramState -> Either int None) -> Operation -> InstructionNode
+    # An instruction that refers to a label is created without a function, the link stage generates it from the operation
+    def __init__(self, section: Node.Section, line: int, func, operation: Optional[Operation] = None):
         super().__init__(section, line)
-        self.function = func  # Callable[[programState.ProgramState], Tuple[programState.ProgramState, programState.RunError]]
+        # Callable[[programState.ProgramState], Optional[int]]
+        # Returns the address of the next instruction when the instruction changes the flow of the program, otherwise None
+        self.function = func
+        # The mnemonic of the instruction, set by the parser
+        self.opcode: str = ""
+        # The number of instructions of the program that are executed by this node
+        self.instructionCount: int = 1
+        # The clock cycles of the instruction when it doesn't and when it does change the flow of the program, see cycleModel.py
+        self.cycles: int = 0
+        self.takenCycles: int = 0
+        if operation is not None:
+            self.cycles, self.takenCycles = cycleModel.operationCycles(operation.opcode, operation.registers)
+        # The decoded instruction, None for a node that is only a function (a fused instruction or a subroutine of the interpreter)
+        self.operation: Optional[Operation] = operation
 
     def __str__(self) -> str:
         return "{}({}, {}, {})".\
             format(type(self).__name__, self.section, self.line, self.function)
 
 
+# Two adjacent instructions that are executed with a single call, see superinstructions.py
+# The node replaces the first instruction, the second instruction stays in memory right after it
+class FusedInstructionNode(InstructionNode):
+    # FusedInstructionNode:: InstructionNode -> InstructionNode -> (ProgramState -> Either int None) -> FusedInstructionNode
+    def __init__(self, first: InstructionNode, second: InstructionNode, func):
+        super().__init__(first.section, first.line, func)
+        self.first: InstructionNode = first
+        self.second: InstructionNode = second
+        self.opcode = first.opcode + "+" + second.opcode
+        self.instructionCount = 2
+
+    def __str__(self) -> str:
+        return "{}({}, {}, {})".\
+            format(type(self).__name__, self.section, self.line, self.opcode)
+
+
 class SystemCall(InstructionNode):
-    # InstructionNode:: Node.Section -> int -> (ProgramState -> (ProgramState, RunError)) -> SystemCall
-    def __init__(self, func, name: str):
-        super().__init__(Node.Section.TEXT, -1, func)
+    # SystemCall:: (ProgramState -> Either int None) -> String -> Operation -> SystemCall
+    def __init__(self, func, name: str, operation: Optional[Operation] = None):
+        super().__init__(Node.Section.TEXT, -1, func, operation)
         self.name = name
+        # The subroutines of the interpreter cost nothing
+        self.cycles = 0
+        self.takenCycles = 0
 
     def __str__(self) -> str:
         return "{}({}, internal function {})".\
@@ -0,0 +1,116 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+import nodes
+import programState
+
+# Reports of the number of times each instruction of a program has been executed
+# A profile is a list with a count for every entry of the instruction table, filled by interpreter.runProgram
+# With the cycles of cycleModel.py as costs, a profile holds the clock cycles of every instruction instead
+
+
+# newProfile:: ProgramState -> [int]
+def newProfile(state: programState.ProgramState) -> List[int]:
+    return [0] * len(state.instructions)
+
+
+# generateProfileHook:: [int] -> ([int], [int]) -> ((int, int, Either int None) -> None)
+# The hook for interpreter.runInstrumentedProgram that adds the cost of every executed instruction to the profile
+# costs: the not taken and taken cost of every instruction, like cycleTables, every instruction costs 1 without costs
+def generateProfileHook(profile: List[int], costs: Optional[Tuple[List[int], List[int]]] = None) -> Callable[[int, int, Optional[int]], None]:
+    if costs is None:
+        costs = ([1] * len(profile), [1] * len(profile))
+    cost, takenCost = costs
+
+    def hook(index: int, pc: int, nextAddress: Optional[int]):
+        if nextAddress is None:
+            profile[index] += cost[index]
+        else:
+            profile[index] += takenCost[index]
+    return hook
+
+
+# instructionCounts:: ProgramState -> [int] -> [(int, InstructionNode, int)]
+# The address, node and count of every instruction of the program that has been executed
+def instructionCounts(state: programState.ProgramState, profile: List[int]) -> List[Tuple[int, nodes.InstructionNode, int]]:
+    res: List[Tuple[int, nodes.InstructionNode, int]] = []
+    for idx, (node, count) in enumerate(zip(state.instructions, profile)):
+        if count > 0 and isinstance(node, nodes.InstructionNode) and not isinstance(node, nodes.SystemCall):
+            # The fused instruction in the table is counted as its first instruction, the second one has its own entry
+            if isinstance(node, nodes.FusedInstructionNode):
+                node = node.first
+            res.append(((idx + state.instructionBase) << 2, node, count))
+    return res
+
+
+# lineCounts:: ProgramState -> [int] -> {int: int}
+# The number of executed instructions per line of the source file
+def lineCounts(state: programState.ProgramState, profile: List[int]) -> Dict[int, int]:
+    res: Dict[int, int] = {}
+    for _, node, count in instructionCounts(state, profile):
+        res[node.line] = res.get(node.line, 0) + count
+    return res
+
+
+# formatHotSpots:: ProgramState -> [int] -> [String] -> int -> String
+# Generates a report of the instructions that have been executed most often
+def formatHotSpots(state: programState.ProgramState, profile: List[int], lines: List[str], count: int = 20) -> str:
+    counts = instructionCounts(state, profile)
+    total = sum(map(lambda entry: entry[2], counts))
+    if total == 0:
+        return "No instructions were executed\n"
+    res = f"{'Line':>6}{'Address':>9}{'Count':>12}{'Share':>9}  Instruction\n"
+    for address, node, instructionCount in sorted(counts, key=lambda entry: entry[2], reverse=True)[:count]:
+        res += f"{node.line:>6}{address:>9}{instructionCount:>12}{instructionCount * 100 / total:>8.1f}%  {lines[node.line - 1].strip()}\n"
+    return res
+
+
+# cycleTables:: ProgramState -> ([int], [int])
+# The not taken and taken cycles of every entry of the instruction table, as costs for interpreter.runProgram
+# A fused instruction is run as two separate instructions while counting, so its entry gets the cycles of its first instruction
+def cycleTables(state: programState.ProgramState) -> Tuple[List[int], List[int]]:
+    costs: List[int] = []
+    takenCosts: List[int] = []
+    for node in state.instructions:
+        if isinstance(node, nodes.FusedInstructionNode):
+            node = node.first
+        if isinstance(node, nodes.InstructionNode):
+            costs.append(node.cycles)
+            takenCosts.append(node.takenCycles)
+        else:
+            costs.append(0)
+            takenCosts.append(0)
+    return costs, takenCosts
+
+
+# subroutineCycles:: ProgramState -> [int] -> {String: int}
+# Adds up the cycles of the instructions per subroutine, the cycles of a subroutine don't include the subroutines it calls
+# A subroutine is a label that is called with BL, every instruction belongs to the last subroutine label before it
+def subroutineCycles(state: programState.ProgramState, cycles: List[int]) -> Dict[str, int]:
+    called = set(node.operation.label for node in state.instructions
+                 if isinstance(node, nodes.InstructionNode) and node.operation is not None and node.operation.opcode == "BL")
+    starts = sorted((label.address, name) for name, label in state.labels.items() if name in called)
+    res: Dict[str, int] = {}
+    current: Optional[str] = None
+    startIdx = 0
+    for idx, (node, count) in enumerate(zip(state.instructions, cycles)):
+        address = (idx + state.instructionBase) << 2
+        while startIdx < len(starts) and starts[startIdx][0] <= address:
+            current = starts[startIdx][1]
+            startIdx += 1
+        if count > 0:
+            name = current if current is not None else "(no subroutine)"
+            res[name] = res.get(name, 0) + count
+    return res
+
+
+# formatCycleReport:: ProgramState -> [int] -> String
+# Generates a report of the total cycles of a run and the cycles per subroutine
+def formatCycleReport(state: programState.ProgramState, cycles: List[int]) -> str:
+    total = sum(cycles)
+    res = f"Cycles: {total}\n"
+    if total == 0:
+        return res
+    res += f"{'Subroutine':<24}{'Cycles':>12}{'Share':>9}\n"
+    for name, count in sorted(subroutineCycles(state, cycles).items(), key=lambda item: item[1], reverse=True):
+        res += f"{name:<24}{count:>12}{count * 100 / total:>8.1f}%\n"
+    return res
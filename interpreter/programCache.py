@@ -0,0 +1,135 @@
+from typing import List, Optional, Tuple
+from functools import lru_cache
+import hashlib
+import importlib
+import marshal
+import os
+import sys
+import tempfile
+
+import nodes
+import instructions
+from programContext import ProgramContext
+
+# On-disk cache of decoded programs, so running an unchanged file skips the lexer and the parser
+# A cache file holds the ProgramContext of a file that was parsed without errors, as tuples of plain values,
+#   and the warnings of the lexer, which are shown again when the program is loaded from the cache
+# marshal is used instead of pickle because loading a marshalled file can't run code, and it is faster
+# The marshal format depends on the Python version, so the version is part of the key
+
+# Changes when the layout of the cached tuples changes
+CACHE_FORMAT = 2
+
+# The modules that decide how a source file is decoded, changing any of them invalidates the cache
+# programState numbers the registers of the operands and programContext the sections and the labels
+DECODER_MODULES = ["lexer", "tokens", "asmParser", "nodes", "instructions", "instructionsALU", "instructionsMemory", "instructionsUtils",
+                   "programState", "programContext"]
+
+# The sections by their value, faster than calling Node.Section for every node
+SECTIONS: Tuple[nodes.Node.Section, ...] = tuple(sorted(nodes.Node.Section, key=lambda section: section.value))
+
+
+# interpreterVersion:: String
+# The hash of the source of the decoder modules, calculated once per run
+@lru_cache(maxsize=None)
+def interpreterVersion() -> str:
+    digest = hashlib.sha256(f"{CACHE_FORMAT} {sys.version}".encode())
+    for name in DECODER_MODULES:
+        with open(importlib.import_module(name).__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# cacheKey:: String -> int -> String -> String
+# The key of a source file, a program is only loaded from the cache when the source, the interpreter, the stack size and the start label are the same
+def cacheKey(file_contents: str, stackSize: int, startLabel: str) -> str:
+    digest = hashlib.sha256(f"{interpreterVersion()}\0{stackSize}\0{startLabel}\0".encode())
+    digest.update(file_contents.encode())
+    return digest.hexdigest()
+
+
+# serializeNodes:: [Node] -> [tuple]
+# Converts the nodes of a section to tuples, consecutive data nodes with the same contents are stored once with a count
+def serializeNodes(sectionNodes: List[nodes.Node]) -> List[tuple]:
+    res: List[tuple] = []
+    for node in sectionNodes:
+        if isinstance(node, nodes.InstructionNode):
+            op = node.operation
+            res.append(("I", node.section.value, node.line, op.opcode, op.line, op.rd, op.rn, op.rm, op.immediate, op.label, op.registers))
+        elif isinstance(node, nodes.DataNode):
+            entry = ("D", node.section.value, node.line, node.value, node.source)
+            if len(res) > 0 and res[-1][:5] == entry:
+                res[-1] = entry + (res[-1][5] + 1,)
+            else:
+                res.append(entry + (1,))
+    return res
+
+
+# deserializeNodes:: [tuple] -> [Node]
+# Converts the tuples of serializeNodes back to nodes, the functions of instructions without a label are generated again
+def deserializeNodes(entries: List[tuple]) -> List[nodes.Node]:
+    res: List[nodes.Node] = []
+    for entry in entries:
+        section = SECTIONS[entry[1]]
+        if entry[0] == "I":
+            op = nodes.Operation(*entry[3:])
+            node = nodes.InstructionNode(section, entry[2], None if op.label is not None else instructions.generateFunction(op), op)
+            node.opcode = op.opcode
+            res.append(node)
+        else:
+            # The nodes are never changed, so the words can share the same node like the parser does for .skip
+            res += [nodes.DataNode(entry[3], entry[4], section, entry[2])] * entry[5]
+    return res
+
+
+# serializeContext:: ProgramContext -> [String] -> tuple
+def serializeContext(context: ProgramContext, warnings: List[str]) -> tuple:
+    return (CACHE_FORMAT,
+            serializeNodes(context.text), serializeNodes(context.bss), serializeNodes(context.data),
+            [(label.name, label.section.value, label.address) for label in context.labels],
+            list(context.globalLabels), list(warnings))
+
+
+# deserializeContext:: tuple -> (ProgramContext, [String])
+def deserializeContext(data: tuple) -> Tuple[ProgramContext, List[str]]:
+    _, text, bss, data, labels, globalLabels, warnings = data
+    return ProgramContext(deserializeNodes(text), deserializeNodes(bss), deserializeNodes(data),
+                          [nodes.Label(name, SECTIONS[section], address) for name, section, address in labels],
+                          globalLabels), warnings
+
+
+# cachePath:: String -> String -> String
+def cachePath(cacheDir: str, key: str) -> str:
+    return os.path.join(cacheDir, key + ".marshal")
+
+
+# loadContext:: String -> String -> Either (ProgramContext, [String]) None
+# Loads a program and the warnings of the lexer from the cache, returns None when it isn't cached or the cache file can't be used
+def loadContext(cacheDir: str, key: str) -> Optional[Tuple[ProgramContext, List[str]]]:
+    try:
+        with open(cachePath(cacheDir, key), "rb") as file:
+            # Reading the whole file at once is a lot faster than letting marshal read from the file
+            data: Tuple = marshal.loads(file.read())
+        if data[0] != CACHE_FORMAT:
+            return None
+        return deserializeContext(data)
+    except (OSError, EOFError, ValueError, TypeError, IndexError, KeyError):
+        return None
+
+
+# storeContext:: String -> String -> ProgramContext -> [String] -> None
+# Stores a program and the warnings of the lexer in the cache, the cache is only an optimisation so failing to write it is not an error
+# The file is written under a temporary name and renamed, so other processes never load a partially written file
+def storeContext(cacheDir: str, key: str, context: ProgramContext, warnings: List[str]) -> None:
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(dir=cacheDir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                marshal.dump(serializeContext(context, warnings), file)
+            os.replace(tempPath, cachePath(cacheDir, key))
+        except BaseException:
+            os.unlink(tempPath)
+            raise
+    except OSError:
+        pass
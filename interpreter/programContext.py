@@ -1,9 +1,8 @@
-from typing import List, Union, Tuple, Dict
+from typing import Callable, List, Dict, Optional, TextIO, Tuple
 
 import nodes
 import programState
-
-from programState import regToID
+import instructions
 
 
 class ProgramContext:
@@ -22,82 +21,159 @@ class ProgramContext:
         return self.__str__()
 
 
-# subroutine_print_char:: ProgramState -> ProgramState, Either RunError or None
+# The stream the print subroutines write to, None means sys.stdout at the moment of printing
+# This way the output of the program follows a redirected sys.stdout, like the console of the visualizer
+output: Optional[TextIO] = None
+
+
+# subroutine_print_char:: ProgramState -> int
 # Implementation of the 'print_char' subroutine
 # Note: prints a char to the default output
-def subroutine_print_char(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
+def subroutine_print_char(state: programState.ProgramState) -> int:
     # print char
-    r0, err = state.getReg("R0")
-    print(chr(r0), end='')
-    # mov PC, LR
-    lr, _ = state.getReg("LR")
-    state.setReg("PC", lr)
-    state.lowRegDirtyFlags = [True, True, True, True]
-    return state, err
+    r0 = state.getRegByID(0)
+    print(chr(r0), end='', file=output)
+    state.outputSize += 1
+    state.lowRegDirty = programState.LOW_REGISTERS_DIRTY
+    # Return to the instruction after the BL
+    return state.returnTo(state.registers[programState.LR_ID] + 4)
 
 
-# subroutine_print_int:: ProgramState -> ProgramState, Either RunError or None
+# subroutine_print_int:: ProgramState -> int
 # Implementation of the 'print_int' subroutine
 # Note: prints an integer to the default output and adds a newline
-def subroutine_print_int(state: programState.ProgramState) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
+def subroutine_print_int(state: programState.ProgramState) -> int:
     # print char
-    r0, err = state.getReg("R0")
-    print(int(r0), end='\n')
-    # mov PC, LR
-    lr, _ = state.getReg("LR")
-    state.setReg("PC", lr)
-    state.lowRegDirtyFlags = [True, True, True, True]
-    return state, err
-
-
-# branchToLabel:: ProgramState -> (ProgramState, Either RunError or None)
-def branchToLabel(state: programState.ProgramState, label: str) -> Tuple[programState.ProgramState, Union[programState.RunError, None]]:
-    # Save return address in LR
-    state.setReg("LR", state.getReg("PC")[0])
-
-    address: Union[int, programState.RunError] = state.getLabelAddress(label)
-    if isinstance(address, programState.RunError):
-        return state, programState.RunError(f"Unknown startup label: {label}", programState.RunError.ErrorType.Error)
-    else:
-        # Subtract 4 because we will add 4 to the address later in the run loop and we need to start at address and not address+4
-        state.setReg("PC", address - 4)
-        state.hasReturned = False
-        return state, None
+    r0 = state.getRegByID(0)
+    text = str(int(r0))
+    print(text, end='\n', file=output)
+    state.outputSize += len(text) + 1
+    state.lowRegDirty = programState.LOW_REGISTERS_DIRTY
+    # Return to the instruction after the BL
+    return state.returnTo(state.registers[programState.LR_ID] + 4)
+
+
+# stopProgram:: ProgramState -> None
+# Stops the program when the startup label has returned
+def stopProgram(state: programState.ProgramState) -> None:
+    raise programState.StopProgram()
 
 
 # convertLabelsToDict:: [label] -> int -> int -> int -> {str, label}
 # converts a list of labels to a dict of labels
+# Note: when a label is defined twice, the first definition is used
 def convertLabelsToDict(labelList: List[nodes.Label], stackSize: int, textSize: int, bssSize: int) -> Dict[str, nodes.Label]:
-    if len(labelList) == 0:
-        return {}
-    label, *tail = labelList
-
-    if label.section == nodes.Node.Section.TEXT:
-        label = nodes.Label(label.name, label.section, stackSize + (4*label.address))
-    elif label.section == nodes.Node.Section.BSS:
-        label = nodes.Label(label.name, label.section, stackSize + (4*textSize) + (4*label.address))
-    elif label.section == nodes.Node.Section.DATA:
-        label = nodes.Label(label.name, label.section, stackSize + (4*textSize) + (4*bssSize) + (4*label.address))
-
-    res = convertLabelsToDict(tail, stackSize, textSize, bssSize)
-    res[label.name] = label
+    sectionStart: Dict[nodes.Node.Section, int] = {
+        nodes.Node.Section.TEXT: stackSize,
+        nodes.Node.Section.BSS: stackSize + (4*textSize),
+        nodes.Node.Section.DATA: stackSize + (4*textSize) + (4*bssSize)
+    }
+    res: Dict[str, nodes.Label] = {}
+    for label in reversed(labelList):
+        res[label.name] = nodes.Label(label.name, label.section, sectionStart[label.section] + (4*label.address))
     return res
 
 
-# generateProgramState:: ProgramContext -> int -> String -> String -> ProgramState
-# Generate a ProgramState based on a ProgramContext
-def generateProgramState(context: ProgramContext, stackSize: int, startLabel: str, fileName: str) -> programState.ProgramState:
+# generateLinkError:: String -> int -> String -> String
+# generate an error because a label can't be found by the link stage
+def generateLinkError(fileName: str, line: int, message: str) -> str:
+    if line == -1:
+        return (f"\033[31m"  # red color
+                f"File \"{fileName}\"\n"
+                f"\tLink error: {message}"
+                f"\033[0m\n")
+    return (f"\033[31m"  # red color
+            f"File \"{fileName}\", line {line}\n"
+            f"\tLink error: {message}"
+            f"\033[0m\n")
+
+
+# An assembled program that can be run many times: the instruction table, the initial memory and the labels
+# The image is not changed by running the program, every run gets its own ProgramState from newState
+# instructions: the instruction table, see ProgramState, the nodes are shared by all states
+# memory: the contents of the memory before the program starts
+class ProgramImage:
+    def __init__(self, regs: List[int], memory: bytes, instructions: List[Optional[nodes.InstructionNode]], labels: Dict[str, nodes.Label],
+                 fileName: str, textRange: Tuple[int, int], lineAddresses: Dict[int, int]):
+        self.registers: List[int] = regs
+        self.memory: bytes = memory
+        self.instructions: List[Optional[nodes.InstructionNode]] = instructions
+        self.labels: Dict[str, nodes.Label] = labels
+        self.fileName: str = fileName
+        self.textRange: Tuple[int, int] = textRange
+        self.lineAddresses: Dict[int, int] = lineAddresses
+
+    def __str__(self) -> str:
+        return "{}({}, {} bytes of memory, {} labels)". \
+            format(type(self).__name__, self.fileName, len(self.memory), len(self.labels))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # newState:: ProgramImage -> ProgramState
+    # Generates a state at the start of the program, only the registers and the memory are copied
+    def newState(self) -> programState.ProgramState:
+        state = programState.ProgramState(list(self.registers), programState.StatusRegister(False, False, False, False), bytearray(self.memory),
+                                          self.instructions, self.labels, self.fileName, self.textRange)
+        state.lineAddresses = self.lineAddresses
+        return state
+
+    # resetState:: ProgramImage -> ProgramState -> None
+    # Puts a state that was generated by newState back at the start of the program, so it can be run again
+    def resetState(self, state: programState.ProgramState):
+        state.reset(self.registers, self.memory)
+        state.instructions = self.instructions
+
+
+# linkProgram:: ProgramImage -> (Operation -> (ProgramState -> Either int None)) -> [String]
+# Link stage: stores the address of the label in the operations that refer to a label, now the addresses of all labels are known,
+#   and generates their functions with generateFunction
+# This way running a branch doesn't need to look up the label, and unknown labels are found before the program is started
+# Returns the errors of the labels that could not be found
+def linkProgram(image: ProgramImage,
+                generateFunction: Callable[[nodes.Operation], Callable] = instructions.generateFunction) -> List[str]:
+    errors: List[str] = []
+    for node in image.instructions:
+        if node is None or node.operation is None or node.operation.label is None:
+            continue
+        operation: nodes.Operation = node.operation
+        label: Optional[nodes.Label] = image.labels.get(operation.label)
+        if label is None:
+            if isinstance(node, nodes.SystemCall):
+                errors.append(generateLinkError(image.fileName, node.line, f"Unknown startup label: {operation.label}"))
+            else:
+                errors.append(generateLinkError(image.fileName, node.line, f"Unknown label: '{operation.label}'"))
+        else:
+            operation.immediate = label.address
+            node.function = generateFunction(operation)
+    return errors
+
+
+# generateProgramImage:: ProgramContext -> int -> String -> String -> ProgramImage
+# Generate a ProgramImage based on a ProgramContext, the image still needs to be linked
+def generateProgramImage(context: ProgramContext, stackSize: int, startLabel: str, fileName: str) -> ProgramImage:
     text: List[nodes.Node] = context.text + [nodes.SystemCall(subroutine_print_char, "print_char"),
                                              nodes.SystemCall(subroutine_print_int, "print_int"),
-                                             # Subroutine to start the program and stop it afterwards
-                                             nodes.SystemCall(lambda s: branchToLabel(s, startLabel), "__STARTUP"),
-                                             nodes.SystemCall(lambda s: (s, programState.StopProgram()), "__STARTUP")
+                                             # Subroutine to start the program and stop it afterwards, it calls the startup label like a BL instruction
+                                             nodes.SystemCall(None, "__STARTUP", nodes.Operation("BL", -1, label=startLabel)),
+                                             nodes.SystemCall(stopProgram, "__STARTUP")
                                              ]
 
-    mem: List[nodes.Node] = [nodes.DataNode(0, "SETUP") for _ in range(stackSize >> 2)] + text + context.bss + context.data
+    words: List[nodes.Node] = text + context.bss + context.data
+    # The stack is followed by the text, bss and data sections
+    base = (stackSize >> 2) * 4
+    mem = bytearray(base + 4 * len(words))
+    instructionTable: List[Optional[nodes.InstructionNode]] = []
+    for idx, node in enumerate(words):
+        if isinstance(node, nodes.InstructionNode):
+            # Fill the table up to this instruction
+            instructionTable += [None] * (idx - len(instructionTable))
+            instructionTable.append(node)
+        elif isinstance(node, nodes.DataNode) and node.value != 0:
+            # The parser packs the bytes of a word with the first byte in the most significant position
+            mem[base + 4 * idx:base + 4 * idx + 4] = node.value.to_bytes(4, "big")
     regs = [0 for _ in range(16)]
-    regs[regToID("SP")] = stackSize
-    status = programState.StatusRegister(False, False, False, False)
+    regs[programState.SP_ID] = stackSize
     labelList = context.labels + [nodes.Label("print_char", nodes.Node.Section.TEXT, len(context.text)),
                                   nodes.Label("print_int", nodes.Node.Section.TEXT, len(context.text)+1),
                                   nodes.Label("__STACKSIZE", nodes.Node.Section.TEXT, 0)
@@ -105,5 +181,9 @@ def generateProgramState(context: ProgramContext, stackSize: int, startLabel: st
 
     labels = convertLabelsToDict(labelList, stackSize, len(text), len(context.bss))
 
-    regs[regToID("PC")] = labels["print_int"].address+4
-    return programState.ProgramState(regs, status, mem, labels, fileName)
+    regs[programState.PC_ID] = labels["print_int"].address+4
+    lineAddresses: Dict[int, int] = {}
+    for idx, node in enumerate(words):
+        if node.line != -1:
+            lineAddresses[node.line] = base + 4 * idx
+    return ProgramImage(regs, bytes(mem), instructionTable, labels, fileName, (base, base + 4 * len(text)), lineAddresses)
@@ -1,10 +1,13 @@
-from typing import List, Dict, Callable, Tuple, Union
+from typing import List, Dict, Callable, Optional, Tuple, Union
 from enum import Enum
+import struct
 
 import nodes
 
 
-class RunError:
+# Raised by an instruction when the program can't continue
+# Warnings are not raised, they are reported with ProgramState.warn so the instruction can finish
+class RunError(Exception):
     class ErrorType(Enum):
         NoError = 0
         Warning = 1
@@ -14,6 +17,7 @@ class RunError:
     def __init__(self, message: str, errType: ErrorType):
         self.message = ("Runtime Error: " if errType == RunError.ErrorType.Error else "Runtime Warning: ") + message
         self.errorType = errType
+        super().__init__(self.message)
 
     def __repr__(self) -> str:
         return self.message
@@ -28,6 +32,21 @@ class StopProgram(RunError):
         super().__init__("Program has stopped", RunError.ErrorType.NoError)
 
 
+# Bits of the flags in the packed representation of the status register
+N_FLAG = 0b1000
+Z_FLAG = 0b0100
+C_FLAG = 0b0010
+V_FLAG = 0b0001
+
+# Kinds of the last operation that changed the flags, the flags are only calculated when they are needed
+# FLAGS_PACKED: ProgramState.flags contains the flags
+# FLAGS_ADD: flagResult = flagA + flagB, a subtraction is stored as an addition of the two's complement
+# FLAGS_LOGIC: flagResult is a 32 bit result and flagB is the carry flag, the overflow flag is cleared
+FLAGS_PACKED = 0
+FLAGS_ADD = 1
+FLAGS_LOGIC = 2
+
+
 class StatusRegister:
     def __init__(self, n: bool = False, z: bool = False, c: bool = False, v: bool = False):
         self.N: bool = n
@@ -35,6 +54,11 @@ class StatusRegister:
         self.C: bool = c
         self.V: bool = v
 
+    # toFlags:: StatusRegister -> int
+    # Get the packed representation of the status register
+    def toFlags(self) -> int:
+        return (N_FLAG if self.N else 0) | (Z_FLAG if self.Z else 0) | (C_FLAG if self.C else 0) | (V_FLAG if self.V else 0)
+
     def __str__(self) -> str:
         return "{}({}, {}, {}, {})". \
             format(type(self).__name__, self.N, self.Z, self.C, self.V)
@@ -43,7 +67,24 @@ class StatusRegister:
         return self.__str__()
 
 
+# flagsToStatus:: int -> StatusRegister
+# Unpack the packed representation of the status register
+def flagsToStatus(flags: int) -> StatusRegister:
+    return StatusRegister(bool(flags & N_FLAG), bool(flags & Z_FLAG), bool(flags & C_FLAG), bool(flags & V_FLAG))
+
+
+# Indices of the special registers in the register file
+SP_ID = 13
+LR_ID = 14
+PC_ID = 15
+
+# Names of the registers by index, used to remember which register a value in memory came from
+REGISTER_NAMES = ["R0", "R1", "R2", "R3", "R4", "R5", "R6", "R7", "R8", "R9", "R10", "R11", "R12", "SP", "LR", "PC"]
+
+
 # regToID:: str -> int
+# Converts the name of a register to its index in the register file
+# Instructions call this while they are decoded, so it is never needed while running a program
 def regToID(name: str) -> int:
     name = name.upper()
     if name[0] == "R":
@@ -60,135 +101,237 @@ def regToID(name: str) -> int:
         return -1
 
 
+# The messages of the warnings, a RunError is only created for a warning that is shown
+UNDEFINED_REGISTER_WARNING = "You are reading the value of a low register when it's value is undefined"
+
+# Bits of R0-R3 in ProgramState.lowRegDirty
+LOW_REGISTERS_DIRTY = 0b1111
+
+# Formats to read and write words and half-words in memory, little-endian like the Cortex M0
+WORD = struct.Struct("<I")
+HALF_WORD = struct.Struct("<H")
+
+
 class ProgramState:
-    def __init__(self, regs: List[int], status: StatusRegister, memory: List[nodes.Node], labels: Dict[str, nodes.Label], file: str):
+    # memory: the contents of the memory, the words that contain an instruction are 0
+    # instructions: the instruction in each word of memory starting at the text section, or None when the word contains data
+    #   The table ends at the last instruction, so it does not grow with the size of the stack, bss and data sections
+    # textRange: the first address of the text section and the address after it, the text section can't be written to
+    def __init__(self, regs: List[int], status: StatusRegister, memory: bytearray, instructions: List[Optional[nodes.InstructionNode]],
+                 labels: Dict[str, nodes.Label], file: str, textRange: Tuple[int, int]):
         self.registers: List[int] = regs
-        self.status: StatusRegister = status
-        self.memory: List[nodes.Node] = memory
+        # The flags are stored as the last operation that changed them, see getFlags
+        self.flagKind: int = FLAGS_PACKED
+        self.flags: int = status.toFlags()
+        self.flagA: int = 0
+        self.flagB: int = 0
+        self.flagResult: int = 0
+        self.memory: bytearray = memory
+        self.instructions: List[Optional[nodes.InstructionNode]] = instructions
         self.labels: Dict[str, nodes.Label] = labels
         self.fileName = file
-        self.hasReturned = True
-        self.lowRegDirtyFlags = [False, False, False, False]
+        self.textStart, self.textEnd = textRange
+        # The index of the word in memory that corresponds to the first entry of the instruction table
+        self.instructionBase: int = self.textStart >> 2
+        # The shadow call stack: the address of every BL that has not returned yet, the oldest call first
+        # Used for stacktraces, so they don't have to search the stack in memory for return addresses
+        self.callStack: List[int] = []
+        # Bit n is set when the value of Rn is undefined, only R0-R3 can be undefined
+        self.lowRegDirty: int = 0
+        # The number of instructions that have been executed by runProgram
+        self.steps: int = 0
+        # The number of characters the program has printed, for the output limit of executionBudget.Budget
+        self.outputSize: int = 0
+        # The runtime error that stopped the program, set by interpreter.handleError, None while it runs and when it stopped normally
+        self.error: Optional[RunError] = None
+        # The address of the last word that was generated by each line of the source, used by the visualizer
+        self.lineAddresses: Dict[int, int] = {}
+        # Called by warn with the message of the warning, set by the interpreter to show the warning
+        self.warningHandler: Optional[Callable[[ProgramState, str], None]] = None
+        # When set, storeRegister adds the address and the old contents of every write to it, see debugHistory.py
+        self.memoryJournal: Optional[List[Tuple[int, bytes]]] = None
+        # Called by storeRegister with the address of a write to the text section, set by the run loop to drop its compiled code
+        #   of that address, see blockCompiler.BlockCache
+        self.textWriteHandler: Optional[Callable[[int], None]] = None
 
     def __str__(self) -> str:
-        return "{}({}, {})".format(type(self).__name__, self.registers, self.status)
+        return "{}({}, {})".format(type(self).__name__, self.registers, self.getALUState())
+
+    # reset:: ProgramState -> [int] -> bytes -> None
+    # Puts the state back at the start of the program, the memory is copied into the existing buffer
+    def reset(self, regs: List[int], memory: bytes):
+        self.registers[:] = regs
+        self.flagKind = FLAGS_PACKED
+        self.flags = 0
+        self.memory[:] = memory
+        self.callStack = []
+        self.lowRegDirty = 0
+        self.steps = 0
+        self.outputSize = 0
+        self.error = None
 
     def __repr__(self) -> str:
         return self.__str__()
 
-    # setReg:: ProgramState -> str -> int -> None
-    def setReg(self, name: str, value: int):
-        regID: int = regToID(name)
+    # setRegByID:: ProgramState -> int -> int -> None
+    def setRegByID(self, regID: int, value: int):
         if regID < 4:
-            self.lowRegDirtyFlags[regID] = False
+            self.lowRegDirty &= ~(1 << regID)
         self.registers[regID] = value
 
-    # setReg:: ProgramState -> str -> int
-    def getReg(self, name: str) -> Tuple[int, Union[RunError, None]]:
-        regID: int = regToID(name)
-        if regID < 4 and self.lowRegDirtyFlags[regID]:
-            return self.registers[regID], RunError("You are reading the value of a low register when it's value is undefined", RunError.ErrorType.Warning)
-        return self.registers[regID], None
+    # getRegByID:: ProgramState -> int -> int
+    # Warns when the value of the register is undefined
+    def getRegByID(self, regID: int) -> int:
+        if (self.lowRegDirty >> regID) & 1:
+            self.warn(UNDEFINED_REGISTER_WARNING)
+        return self.registers[regID]
+
+    # setReg:: ProgramState -> str -> int -> None
+    # Note: instructions use setRegByID, this is meant for the interpreter and the visualizer
+    def setReg(self, name: str, value: int):
+        self.setRegByID(regToID(name), value)
+
+    # getReg:: ProgramState -> str -> int
+    # Note: instructions use getRegByID, this is meant for the interpreter and the visualizer, so it never warns
+    def getReg(self, name: str) -> int:
+        return self.registers[regToID(name)]
+
+    # warn:: ProgramState -> str -> None
+    # Reports a warning, the instruction continues after it
+    def warn(self, message: str):
+        if self.warningHandler is not None:
+            self.warningHandler(self, message)
+
+    # getFlags:: ProgramState -> int
+    # Get the packed representation of the status register, the flags are calculated from the last operation that changed them
+    def getFlags(self) -> int:
+        kind = self.flagKind
+        if kind == FLAGS_ADD:
+            a = self.flagA
+            b = self.flagB
+            out = self.flagResult
+            out32 = out & 0xFFFFFFFF
+            bit31 = out32 >> 31
+            signA = (a >> 31) & 1
+            signB = (b >> 31) & 1
+
+            flags = (N_FLAG if bit31 else 0) | (Z_FLAG if out32 == 0 else 0) | \
+                    (C_FLAG if (out >> 32) & 1 else 0) | (V_FLAG if signA == signB and signB != bit31 else 0)
+        elif kind == FLAGS_LOGIC:
+            out = self.flagResult
+            flags = (N_FLAG if (out >> 31) & 1 else 0) | (Z_FLAG if out == 0 else 0) | (C_FLAG if self.flagB else 0)
+        else:
+            return self.flags
+        # Remember the flags so they are only calculated once
+        self.flags = flags
+        self.flagKind = FLAGS_PACKED
+        return flags
+
+    # setFlags:: ProgramState -> int -> None
+    # Set the packed representation of the status register
+    def setFlags(self, flags: int):
+        self.flags = flags
+        self.flagKind = FLAGS_PACKED
+
+    # getALUState:: ProgramState -> StatusRegister
+    # get the status register, meant for the interpreter and the visualizer
+    def getALUState(self) -> StatusRegister:
+        return flagsToStatus(self.getFlags())
 
     # setALUState:: ProgramState -> StatusRegister -> None
     # set the status register
     def setALUState(self, value: StatusRegister):
-        self.status = value
+        self.setFlags(value.toFlags())
 
-    # loadRegister:: ProgramState -> int -> int -> String -> RunError
+    # loadRegister:: ProgramState -> int -> int -> bool -> int -> None
     # bitSize: the number of bits to load, either 32, 16 or 8 bit
-    # don't need to copy the ProgramState as setReg does that already
-    def loadRegister(self, address: int, bitSize: int, sign_extend: bool, register: str) -> Union[RunError, None]:
-        offset = address & 3
-        if bitSize == 32 and offset != 0:
-            return RunError("To load a word from memory, the address needs to be a multiple of 4", RunError.ErrorType.Error)
+    # register: the index of the register to load the value into
+    def loadRegister(self, address: int, bitSize: int, sign_extend: bool, register: int) -> None:
+        if bitSize == 32 and (address & 3) != 0:
+            raise RunError("To load a word from memory, the address needs to be a multiple of 4", RunError.ErrorType.Error)
         elif bitSize == 16 and (address & 1) != 0:
-            return RunError("To load a half-word from memory, the address needs to be a multiple of 2", RunError.ErrorType.Error)
+            raise RunError("To load a half-word from memory, the address needs to be a multiple of 2", RunError.ErrorType.Error)
 
-        internal_address = address >> 2
         # check address is in range
-        if internal_address < 0 or internal_address >= len(self.memory):
-            return RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory) * 4}]", RunError.ErrorType.Error)
+        if address < 0 or address >= len(self.memory):
+            raise RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory)}]", RunError.ErrorType.Error)
 
-        word = self.memory[internal_address]
-        if not isinstance(word, nodes.DataNode):
-            return RunError("It is not possible to load the contents of an instruction", RunError.ErrorType.Error)
+        idx = (address >> 2) - self.instructionBase
+        if 0 <= idx < len(self.instructions) and self.instructions[idx] is not None:
+            raise RunError("It is not possible to load the contents of an instruction", RunError.ErrorType.Error)
         if bitSize == 32:
-            self.setReg(register, word.value)
+            self.setRegByID(register, WORD.unpack_from(self.memory, address)[0])
         elif bitSize == 16:
-            value = (word.value >> (1 - offset) * 16) & 0xFFFF
+            value = HALF_WORD.unpack_from(self.memory, address)[0]
             if sign_extend and ((value & 0b1000_0000_0000_0000) == 0b1000_0000_0000_0000):
                 value |= 0xFFFF_0000  # Set upper half-word when sign bit is set
-            self.setReg(register, value)
+            self.setRegByID(register, value)
         elif bitSize == 8:
-            value = (word.value >> (3 - offset) * 8) & 0xFF
+            value = self.memory[address]
             if sign_extend and ((value & 0b1000_0000) == 0b1000_0000):
                 value |= 0xFFFF_FF00  # Set upper three bytes when sign bit is set
-            self.setReg(register, value)
+            self.setRegByID(register, value)
         else:
             # Invalid bitsize, should never happen
             print("BITSIZE", bitSize)
-        return None
+
+    # readWord:: ProgramState -> int -> int
+    # Reads a word from memory without any checks, meant for the interpreter and the visualizer
+    def readWord(self, address: int) -> int:
+        return WORD.unpack_from(self.memory, address)[0]
 
     # getInstructionFromMem:: ProgramState -> int -> Either InstructionNode or RunError
     def getInstructionFromMem(self, address: int) -> Union[nodes.InstructionNode, RunError]:
         if (address & 3) != 0:
             return RunError("To load an instruction from memory, the address needs to be a multiple of 4", RunError.ErrorType.Error)
 
-        internal_address = address >> 2
         # check address is in range
-        if internal_address < 0 or internal_address >= len(self.memory):
-            return RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory) * 4}]", RunError.ErrorType.Error)
+        if address < 0 or address >= len(self.memory):
+            return RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory)}]", RunError.ErrorType.Error)
 
-        word = self.memory[internal_address]
-        if isinstance(word, nodes.InstructionNode):
-            return word
+        idx = (address >> 2) - self.instructionBase
+        if 0 <= idx < len(self.instructions) and self.instructions[idx] is not None:
+            return self.instructions[idx]
         else:
             return RunError("Loaded data is no instruction", RunError.ErrorType.Error)
 
-    # storeRegister:: ProgramState -> int -> String -> int -> RunError
+    # storeRegister:: ProgramState -> int -> int -> int -> None
     # bitSize: the number of bits to store, either 32, 16 or 8 bit
-    def storeRegister(self, address: int, register: str, bitSize: int) -> Union[RunError, None]:
-        offset = address & 3
-        if bitSize == 32 and offset != 0:
-            return RunError("To store a word in memory, the address needs to be a multiple of 4", RunError.ErrorType.Error)
+    # register: the index of the register to store
+    def storeRegister(self, address: int, register: int, bitSize: int) -> None:
+        if bitSize == 32 and (address & 3) != 0:
+            raise RunError("To store a word in memory, the address needs to be a multiple of 4", RunError.ErrorType.Error)
         elif bitSize == 16 and (address & 1) != 0:
-            return RunError("To store a half-word in memory, the address needs to be a multiple of 2", RunError.ErrorType.Error)
+            raise RunError("To store a half-word in memory, the address needs to be a multiple of 2", RunError.ErrorType.Error)
 
-        value, err = self.getReg(register)
-        internal_address = address >> 2
         # check address is in range
-        if internal_address < 0 or internal_address >= len(self.memory):
-            return RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory) * 4}]", RunError.ErrorType.Error)
-
-        word = self.memory[internal_address]
-        if word.section == nodes.Node.Section.TEXT:
-            return RunError("It is not possible to change the contents of a text section", RunError.ErrorType.Error)
-        if not isinstance(word, nodes.DataNode):
-            if bitSize == 32:
-                return RunError("You are replacing the contents of an instruction", RunError.ErrorType.Warning)
-            else:
-                return RunError("It is not possible to change part of the contents of an instruction", RunError.ErrorType.Error)
+        if address < 0 or address >= len(self.memory):
+            raise RunError(f"memory address out of range: {address}, must be in range [0...{len(self.memory)}]", RunError.ErrorType.Error)
+
+        if self.textStart <= address < self.textEnd:
+            if self.textWriteHandler is not None:
+                self.textWriteHandler(address)
+            raise RunError("It is not possible to change the contents of a text section", RunError.ErrorType.Error)
+        # All instructions are in the text section, so a store never replaces an instruction
+        value = self.getRegByID(register)
+        journal = self.memoryJournal
+        if journal is not None:
+            journal.append((address, bytes(self.memory[address:address + (bitSize >> 3)])))
         if bitSize == 32:
-            self.memory[internal_address] = nodes.DataNode(value, register)
-            return err
+            WORD.pack_into(self.memory, address, value & 0xFFFF_FFFF)
         elif bitSize == 16:
-            self.memory[internal_address] = nodes.DataNode(
-                ((value & 0xFFFF) << ((2 - offset) * 8)) |
-                (word.value & (0xFFFF << offset * 8)), register)
-            return err
+            HALF_WORD.pack_into(self.memory, address, value & 0xFFFF)
         elif bitSize == 8:
-            self.memory[internal_address] = nodes.DataNode((
-                ((value & 0xFF) << ((3 - offset) * 8)) |
-                (word.value & (0xFFFFFF00FFFFFF >> offset * 8))
-            ) & 0xFFFFFFFF, register)
-            return err
+            self.memory[address] = value & 0xFF
         else:
             # Invalid bitsize, should never happen
-            return RunError("Invalid bitsize", RunError.ErrorType.Error)
+            raise RunError("Invalid bitsize", RunError.ErrorType.Error)
 
-    # getLabelAddress:: ProgramState -> str -> int
-    def getLabelAddress(self, label: str) -> Union[int, RunError]:
-        if label not in self.labels.keys():
-            return RunError(f"Unknown label: {label}", RunError.ErrorType.Error)
-        return self.labels[label].address
+    # returnTo:: ProgramState -> int -> int
+    # Called by the instructions that can return from a subroutine with the address they jump to
+    # When it is the return address of the last call, the call is removed from the shadow call stack
+    def returnTo(self, address: int) -> int:
+        callStack = self.callStack
+        if callStack and callStack[-1] + 4 == address:
+            callStack.pop()
+        return address
@@ -0,0 +1,135 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import instructions
+import nodes
+import programState
+
+CONDITIONAL_BRANCHES = ["BCC", "BLO", "BCS", "BHS", "BEQ", "BGE", "BGT", "BHI", "BLE", "BLS", "BLT", "BMI", "BNE", "BPL", "BVC", "BVS"]
+
+# The pairs of instructions that are fused by default, chosen with the pair histogram of the programs in the benchmarks directory
+#   (cli.py --pair-histogram). A compare followed by a conditional branch is 18% of the executed pairs (CMP BNE 6.8%, CMP BLS 4.7%,
+#   CMP BLT 4.4%, CMP BEQ 1.7%), it is fused by fuseCompareBranch, which makes printInt and sort about 10% faster and doesn't change the other benchmarks.
+# The other frequent pairs (SUB LDR 7.3%, LDR CMP 4.7%, MOV SUB 4.5%, SUB BNE 3.4%, LDRB STRB 2.1% and others) are not fused:
+#   measured one pair at a time, fuse saves no time for them, calling two functions from a third costs as much as the
+#   run loop saves by dispatching one instruction less
+COMPARE_OPCODES = ["CMP", "CMN"]
+FUSED_PAIRS: Set[Tuple[str, str]] = {(first, branch) for first in COMPARE_OPCODES for branch in CONDITIONAL_BRANCHES}
+
+
+# fuse:: InstructionNode -> InstructionNode -> FusedInstructionNode
+# Generates a node that executes both instructions with a single call
+# The program counter is updated between the instructions exactly like the run loop would,
+#   so when the second instruction raises an error the program counter points to the second instruction
+def fuse(first: nodes.InstructionNode, second: nodes.InstructionNode) -> nodes.FusedInstructionNode:
+    firstFunc = first.function
+    secondFunc = second.function
+
+    def fused(state: programState.ProgramState) -> int:
+        registers = state.registers
+        start = registers[programState.PC_ID]
+        nextAddress = firstFunc(state)
+        if nextAddress is not None:
+            # The first instruction branched, so the second instruction should not be executed
+            return nextAddress
+        registers[programState.PC_ID] = start + 4
+        nextAddress = secondFunc(state)
+        # Always return the next address, the run loop only knows how to skip a single instruction
+        return start + 8 if nextAddress is None else nextAddress
+
+    return nodes.FusedInstructionNode(first, second, fused)
+
+
+# fuseCompareBranch:: InstructionNode -> InstructionNode -> FusedInstructionNode
+# Generates a node from the operations of a CMP or CMN followed by a conditional branch, like fuse but with a single function:
+#   the flags are calculated right away instead of lazily, so the branch only needs a lookup in BRANCH_TAKEN
+# The flags are calculated like ProgramState.getFlags does for FLAGS_ADD
+def fuseCompareBranch(first: nodes.InstructionNode, second: nodes.InstructionNode) -> nodes.FusedInstructionNode:
+    operation = first.operation
+    rn, rm, immediate = operation.rn, operation.rm, operation.immediate
+    negate = operation.opcode == "CMP"
+    taken: List[bool] = instructions.BRANCH_TAKEN[second.operation.opcode]
+    address: int = second.operation.immediate
+    nFlag, zFlag, cFlag, vFlag = programState.N_FLAG, programState.Z_FLAG, programState.C_FLAG, programState.V_FLAG
+
+    def fused(state: programState.ProgramState) -> int:
+        a = state.getRegByID(rn)
+        if rm is not None:
+            b = state.getRegByID(rm)
+        else:
+            b = immediate & 0xFFFFFFFF
+        if negate:
+            b = ((~b) + 1) & 0xFFFFFFFF
+        out = a + b
+        out32 = out & 0xFFFFFFFF
+        bit31 = out32 >> 31
+        signB = b >> 31
+        flags = (nFlag if bit31 else 0) | (zFlag if out32 == 0 else 0) | (cFlag if out >> 32 else 0) | \
+                (vFlag if (a >> 31) == signB and signB != bit31 else 0)
+        state.flags = flags
+        state.flagKind = programState.FLAGS_PACKED
+        if taken[flags]:
+            return address
+        return state.registers[programState.PC_ID] + 8
+
+    return nodes.FusedInstructionNode(first, second, fused)
+
+
+# fuseInstructions:: [Optional[InstructionNode]] -> {(String, String)} -> [Optional[InstructionNode]]
+# Peephole pass over the instruction table of a linked program that replaces adjacent pairs of instructions by a fused instruction
+# The second instruction of a pair is kept, so a branch to it still works and all addresses stay the same
+def fuseInstructions(text: List[Optional[nodes.InstructionNode]], pairs: Optional[Set[Tuple[str, str]]] = None) -> List[Optional[nodes.InstructionNode]]:
+    if pairs is None:
+        pairs = FUSED_PAIRS
+    res: List[Optional[nodes.InstructionNode]] = list(text)
+    idx = 0
+    while idx < len(res) - 1:
+        first, second = res[idx], res[idx+1]
+        if isinstance(first, nodes.InstructionNode) and isinstance(second, nodes.InstructionNode) and \
+                (first.opcode, second.opcode) in pairs:
+            if first.opcode in COMPARE_OPCODES and second.opcode in CONDITIONAL_BRANCHES and \
+                    first.operation is not None and second.operation is not None:
+                res[idx] = fuseCompareBranch(first, second)
+            else:
+                res[idx] = fuse(first, second)
+            # The second instruction can't be the start of another pair, it is executed by the fused instruction
+            idx += 2
+        else:
+            idx += 1
+    return res
+
+
+# generatePairHistogramHook:: {(String, String): int} -> ProgramState -> ((int, int, Either int None) -> None)
+# The hook for interpreter.runInstrumentedProgram that counts how often each pair of instructions is executed right after each other
+# Only instructions that directly follow each other in memory can be fused, so a pair after a jump is not counted
+def generatePairHistogramHook(pairCounts: Dict[Tuple[str, str], int], state: programState.ProgramState) -> Callable[[int, int, Optional[int]], None]:
+    # The opcode of every entry of the instruction table, None for the entries that are not an instruction of the program
+    opcodes: List[Optional[str]] = []
+    for node in state.instructions:
+        if isinstance(node, nodes.FusedInstructionNode):
+            node = node.first
+        opcodes.append(node.opcode if isinstance(node, nodes.InstructionNode) and not isinstance(node, nodes.SystemCall) else None)
+    # The entry of the previous instruction, the first instruction has no previous instruction
+    prevIndex = -2
+
+    def hook(index: int, pc: int, nextAddress: Optional[int]):
+        nonlocal prevIndex
+        opcode = opcodes[index]
+        if opcode is None:
+            return
+        if index == prevIndex + 1:
+            pair = (opcodes[prevIndex], opcode)
+            pairCounts[pair] = pairCounts.get(pair, 0) + 1
+        prevIndex = index
+    return hook
+
+
+# formatPairHistogram:: {(String, String): int} -> int -> String
+# Generates a report of the pairs of instructions that were executed right after each other most often
+def formatPairHistogram(pairCounts: Dict[Tuple[str, str], int], count: int = 20) -> str:
+    total = sum(pairCounts.values())
+    if total == 0:
+        return "No instruction pairs were executed\n"
+    res = f"{'Pair':<16}{'Count':>12}{'Share':>9}\n"
+    for pair, pairCount in sorted(pairCounts.items(), key=lambda item: item[1], reverse=True)[:count]:
+        res += f"{pair[0] + ' ' + pair[1]:<16}{pairCount:>12}{pairCount * 100 / total:>8.1f}%\n"
+    return res
@@ -0,0 +1,189 @@
+import contextlib
+import io
+import random
+import unittest
+from typing import List, Optional, Tuple
+
+import blockCompiler
+import executionBudget
+import executionTrace
+import interpreter
+import programContext
+import programState
+
+# State:: (registers, flags, memory, call stack, low registers that are undefined, steps, output, error)
+State = Tuple[Tuple[int, ...], int, bytes, Tuple[int, ...], int, int, str, Optional[str]]
+
+# The operations of the random programs, rd and rn are R0-R4, rm is R0-R5, R5 is the counter of the loop,
+#   R6 is the shift by a register and R7 the address of the buffer
+ALU_OPERATIONS = ["add {rd}, {rn}, {rm}", "add {rd}, #{imm8}", "sub {rd}, {rn}, {rm}", "sub {rd}, #{imm8}", "adc {rd}, {rn}, {rm}",
+                  "sbc {rd}, {rn}, {rm}", "mul {rd}, {rn}, {rm}", "and {rd}, {rn}, {rm}", "eor {rd}, #{imm8}", "orr {rd}, {rn}, {rm}",
+                  "bic {rd}, {rn}, {rm}", "lsl {rd}, {rn}, #{shift}", "lsr {rd}, {rn}, #{shift1}", "asr {rd}, {rn}, #{shift1}",
+                  "ror {rd}, {rn}, #{shift}", "lsl {rd}, {rn}, r6", "lsr {rd}, {rn}, r6", "asr {rd}, {rn}, r6", "ror {rd}, {rn}, r6",
+                  "cmp {rn}, {rm}", "cmp {rn}, #{imm8}", "cmn {rn}, {rm}", "tst {rn}, {rm}", "mov {rd}, #{imm8}", "mov {rd}, {rm}",
+                  "movn {rd}, {rm}", "sxtb {rd}, {rm}", "sxth {rd}, {rm}", "uxtb {rd}, {rm}", "uxth {rd}, {rm}",
+                  "ldr {rd}, [r7, #{word}]", "ldrb {rd}, [r7, #{byte}]", "ldrh {rd}, [r7, #{half}]", "str {rm}, [r7, #{word}]",
+                  "strb {rm}, [r7, #{byte}]", "strh {rm}, [r7, #{half}]", "ldrsb {rd}, [r7, r6]", "ldrsh {rd}, [r7, r5]",
+                  "push {{r0, r1, r2}}\n    pop {{r2, r3, r4}}", "mov r6, #{shift}"]
+CONDITIONAL_BRANCHES = ["beq", "bne", "bcs", "bcc", "bmi", "bpl", "bvs", "bvc", "bhi", "bls", "bge", "blt", "bgt", "ble"]
+
+
+# randomProgram:: Random -> bool -> String
+# A loop with a random body that runs 30 times, straight: the body is a single block without branches, so it loops inside its function
+def randomProgram(rand: random.Random, straight: bool) -> str:
+    lines = [".text", ".global _start", "_start:", "    push {r4, r5, r6, r7, lr}", "    ldr r7, =buffer", "    mov r5, #30"]
+    for register in range(5):
+        lines.append(f"    ldr r{register}, ={rand.choice([0, 1, 0x7FFFFFFF, 0x80000000, 0xFFFFFFFF, rand.getrandbits(32)])}")
+    lines.append("    mov r6, #3")
+    lines.append("loop:")
+    labels = 0
+    for _ in range(rand.randrange(4, 16)):
+        if not straight and rand.random() < 0.15:
+            lines.append(f"    {rand.choice(CONDITIONAL_BRANCHES)} skip{labels}")
+            lines.append(f"    {formatOperation(rand, rand.choice(ALU_OPERATIONS))}")
+            lines.append(f"skip{labels}:")
+            labels += 1
+        elif not straight and rand.random() < 0.05:
+            lines.append("    bl subroutine")
+        lines.append(f"    {formatOperation(rand, rand.choice(ALU_OPERATIONS))}")
+    lines += ["    sub r5, r5, #1", "    bne loop", "    mov r0, r4", "    bl print_int", "    pop {r4, r5, r6, r7, pc}",
+              "subroutine:", "    push {lr}", "    add r4, r4, r3", "    cmp r4, r2", "    bhi done", "    eor r4, r4, r1",
+              "done:", "    pop {pc}", ".bss", "buffer: .skip 64"]
+    return "\n".join(lines) + "\n"
+
+
+# formatOperation:: Random -> String -> String
+def formatOperation(rand: random.Random, operation: str) -> str:
+    return operation.format(rd=f"r{rand.randrange(5)}", rn=f"r{rand.randrange(5)}", rm=f"r{rand.randrange(6)}", imm8=rand.randrange(256),
+                            shift=rand.randrange(32), shift1=rand.randrange(1, 33), word=4 * rand.randrange(8), byte=rand.randrange(32),
+                            half=2 * rand.randrange(16))
+
+
+# run:: String -> bool -> Either int None -> bool -> State
+# Runs a program with runProgram, compile: compile every block the first time it is entered, or never compile a block
+def run(source: str, compile: bool, maxSteps: Optional[int] = None, fuse: bool = True) -> State:
+    threshold = blockCompiler.HOT_THRESHOLD
+    blockCompiler.HOT_THRESHOLD = 1 if compile else -1
+    output = programContext.output
+    programContext.output = io.StringIO()
+    stdout = io.StringIO()
+    try:
+        state = interpreter.parse("test.asm", source, 1024, "_start", fuse)
+        with contextlib.redirect_stdout(stdout):
+            interpreter.runProgram(state, "test.asm", source.split("\n"), budget=executionBudget.Budget(maxSteps))
+        return (tuple(state.registers), state.getFlags(), bytes(state.memory), tuple(state.callStack), state.lowRegDirty, state.steps,
+                programContext.output.getvalue() + stdout.getvalue(), None if state.error is None else state.error.message)
+    finally:
+        blockCompiler.HOT_THRESHOLD = threshold
+        programContext.output = output
+
+
+# runTraced:: String -> bool -> Either int None -> int -> (bytes, State)
+# Runs a program with runTracedProgram like run, returns the trace and the state
+def runTraced(source: str, compile: bool, maxSteps: Optional[int] = None, bufferSize: int = executionTrace.BUFFER_SIZE) -> Tuple[bytes, State]:
+    threshold = blockCompiler.HOT_THRESHOLD
+    blockCompiler.HOT_THRESHOLD = 1 if compile else -1
+    output = programContext.output
+    programContext.output = io.StringIO()
+    try:
+        state = interpreter.parse("test.asm", source, 1024, "_start")
+        file = io.BytesIO()
+        trace = executionTrace.TraceWriter(file, state, bufferSize)
+        with contextlib.redirect_stdout(io.StringIO()):
+            interpreter.runTracedProgram(state, "test.asm", source.split("\n"), trace, executionBudget.Budget(maxSteps))
+        trace.close()
+        return file.getvalue(), (tuple(state.registers), state.getFlags(), bytes(state.memory), tuple(state.callStack), state.lowRegDirty,
+                                 state.steps, programContext.output.getvalue(), None if state.error is None else state.error.message)
+    finally:
+        blockCompiler.HOT_THRESHOLD = threshold
+        programContext.output = output
+
+
+class TestBlockCompiler(unittest.TestCase):
+    # checkProgram:: TestBlockCompiler -> String -> Either int None -> bool -> None
+    # The compiled blocks have to give the same state, output and errors as the dispatch table
+    def checkProgram(self, source: str, maxSteps: Optional[int] = None, fuse: bool = True):
+        self.assertEqual(run(source, True, maxSteps, fuse), run(source, False, maxSteps, fuse), source)
+
+    def test_randomPrograms(self):
+        rand = random.Random(2)
+        for idx in range(300):
+            with self.subTest(program=idx):
+                self.checkProgram(randomProgram(rand, idx % 2 == 0))
+
+    def test_budget(self):
+        # Without fused instructions the limit on the number of instructions is exact, also in the middle of a block and a loop
+        rand = random.Random(3)
+        source = randomProgram(rand, True)
+        for maxSteps in range(1, 400, 7):
+            with self.subTest(maxSteps=maxSteps):
+                self.checkProgram(source, maxSteps, False)
+
+    def test_errors(self):
+        # A compiled block leaves before the instruction that raises the error, so the stacktrace is the same
+        for operation in ["ldr r0, [r7, r4]", "str r0, [r7, r4]", "ldrh r0, [r7, r4]", "lsl r0, r0, r4", "str r0, [r4]",
+                          "ldr r0, [r4]", "pop {r0, r1}"]:
+            source = f""".text
+.global _start
+_start:
+    push {{r4, r7, lr}}
+    ldr r7, =buffer
+    ldr r4, =0x7fffff00
+loop:
+    add r4, r4, #1
+    mov r1, #4
+    mov r0, r1
+    {operation}
+    cmp r4, #0
+    bne loop
+    pop {{r4, r7, pc}}
+.bss
+buffer: .skip 16
+"""
+            with self.subTest(operation=operation):
+                for start in ["1", "0xFFFFFFF0"]:
+                    self.checkProgram(source.replace("0x7fffff00", start))
+                    self.assertEqual(runTraced(source.replace("0x7fffff00", start), True), runTraced(source.replace("0x7fffff00", start), False))
+
+    def test_undefinedRegisters(self):
+        # print_int leaves R0-R3 undefined, a block that reads one of them leaves so the warning is shown
+        source = """.text
+.global _start
+_start:
+    push {r4, lr}
+    mov r4, #20
+loop:
+    mov r0, r4
+    bl print_int
+    add r2, r1, #1
+    sub r4, r4, #1
+    bne loop
+    pop {r4, pc}
+"""
+        self.checkProgram(source)
+        self.assertIn("Runtime Warning", run(source, True)[6])
+
+    def test_traces(self):
+        # The records the compiled blocks append are the same as the ones of the hook
+        rand = random.Random(4)
+        for idx in range(100):
+            source = randomProgram(rand, idx % 2 == 0)
+            with self.subTest(program=idx):
+                self.assertEqual(runTraced(source, True, None, 64 if idx % 5 == 0 else executionTrace.BUFFER_SIZE), runTraced(source, False), source)
+        source = randomProgram(rand, True)
+        for maxSteps in range(1, 300, 11):
+            with self.subTest(maxSteps=maxSteps):
+                self.assertEqual(runTraced(source, True, maxSteps), runTraced(source, False, maxSteps))
+
+    def test_invalidate(self):
+        state = interpreter.parse("test.asm", ".text\n.global _start\n_start:\n    mov r0, #1\n    mov pc, lr\n", 1024, "_start")
+        cache = blockCompiler.BlockCache(state)
+        cache.compile(0)
+        self.assertIsNotNone(cache.functions[0])
+        cache.invalidate(state.textStart + 4)
+        self.assertIsNone(cache.functions[0])
+        self.assertEqual(cache.blocks, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
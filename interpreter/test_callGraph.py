@@ -0,0 +1,94 @@
+import io
+import unittest
+from typing import Dict, List, Optional, Tuple
+
+import callGraph
+import executionBudget
+import interpreter
+import profiler
+import programContext
+import programState
+
+# Nested calls, a return with MOV PC, LR and with POP {PC}, a print subroutine, a compare and branch that are fused,
+#   and one that branches to the instruction right after it, which can't be fused for the call graph
+PROGRAM = """.text
+.global _start
+_start:
+    push {r4, lr}
+    mov r4, #5
+loop:
+    mov r0, r4
+    bl outer
+    cmp r0, #4
+    bhi skip
+skip:
+    sub r4, r4, #1
+    cmp r4, #0
+    bne loop
+    bl print_int
+    pop {r4, pc}
+
+outer:
+    push {lr}
+    bl inner
+    bl inner
+    pop {pc}
+
+inner:
+    add r0, r0, #1
+    mov pc, lr
+"""
+
+
+# referenceSamples:: ProgramState -> String -> [String] -> Budget -> {(String): [int]}
+# The samples of a call graph that is updated after every instruction, like a profile that looks at each instruction separately
+def referenceSamples(state: programState.ProgramState, lines: List[str], budget: executionBudget.Budget) -> Dict[Tuple[str, ...], List[int]]:
+    graph = callGraph.CallGraph(state)
+    cost, takenCost = profiler.cycleTables(state)
+    totals = [0, 0]
+
+    def hook(index: int, pc: int, nextAddress: Optional[int]):
+        totals[0] += 1
+        totals[1] += cost[index] if nextAddress is None else takenCost[index]
+        if len(state.callStack) != graph.depth:
+            graph.update(state, nextAddress, totals[0], totals[1])
+
+    state = interpreter.runInstrumentedProgram(state, "test.asm", lines, hook, budget)
+    graph.addSample(state.steps, totals[1])
+    return graph.samples
+
+
+class TestCallGraph(unittest.TestCase):
+    def setUp(self):
+        self.output = programContext.output
+        programContext.output = io.StringIO()
+
+    def tearDown(self):
+        programContext.output = self.output
+
+    # checkRun:: TestCallGraph -> Either int None -> None
+    def checkRun(self, maxSteps: Optional[int]):
+        lines = PROGRAM.split("\n")
+        state = interpreter.parse("test.asm", PROGRAM, 1024, "_start")
+        graph = callGraph.CallGraph(state)
+        interpreter.runProgram(state, "test.asm", lines, costs=profiler.cycleTables(state), graph=graph,
+                               budget=executionBudget.Budget(maxSteps))
+        reference = referenceSamples(interpreter.parse("test.asm", PROGRAM, 1024, "_start"), lines, executionBudget.Budget(maxSteps))
+        self.assertEqual(graph.samples, reference)
+
+    def test_samples(self):
+        self.checkRun(None)
+
+    def test_budget(self):
+        # The budget stops the program in the middle of a subroutine
+        self.checkRun(40)
+
+    def test_callsAndReturns(self):
+        state = interpreter.parse("test.asm", PROGRAM, 1024, "_start")
+        opcodes = [node.opcode for node, isCall in zip(state.instructions, callGraph.callsAndReturns(state))
+                   if isCall and node.line != -1]
+        self.assertEqual(opcodes, ["BL", "BL", "POP", "BL", "BL", "POP", "MOV"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import io
+import random
+import unittest
+from typing import List, Tuple
+
+import debugHistory
+import interpreter
+import programContext
+import programState
+
+# A loop that calls a subroutine, writes to memory and prints, so the history has to restore the registers, flags, memory,
+#   the call stack and the low registers that print_int leaves undefined
+PROGRAM = """.text
+.global _start
+_start:
+    push {r4, r5, lr}
+    ldr r5, =values
+    mov r4, #40
+loop:
+    mov r0, r4
+    bl square
+    str r0, [r5]
+    add r5, r5, #4
+    cmp r4, #20
+    bne skip
+    bl print_int
+skip:
+    sub r4, r4, #1
+    bne loop
+    pop {r4, r5, pc}
+
+square:
+    push {r6, lr}
+    mov r6, r0
+    mul r0, r0, r6
+    pop {r6, pc}
+
+.bss
+values: .skip 160
+"""
+
+# State:: (registers, flags, memory, call stack, low registers that are undefined)
+State = Tuple[Tuple[int, ...], int, bytes, Tuple[int, ...], int]
+
+
+# snapshot:: ProgramState -> State
+def snapshot(state: programState.ProgramState) -> State:
+    return tuple(state.registers), state.getFlags(), bytes(state.memory), tuple(state.callStack), state.lowRegDirty
+
+
+# straightRun:: String -> ([State], String)
+# Runs the program one instruction at a time without a history, returns the state after every instruction and the output
+def straightRun(source: str) -> Tuple[List[State], str]:
+    lines = source.split("\n")
+    state = interpreter.parse("test.asm", source, 1024, "_start", False)
+    output = programContext.output
+    programContext.output = io.StringIO()
+    try:
+        states = [snapshot(state)]
+        running = True
+        while running:
+            node = state.getInstructionFromMem(state.registers[programState.PC_ID])
+            state, running = interpreter.executeInstruction(node, state, "test.asm", lines)
+            if running:
+                states.append(snapshot(state))
+        return states, programContext.output.getvalue()
+    finally:
+        programContext.output = output
+
+
+class TestExecutionHistory(unittest.TestCase):
+    def setUp(self):
+        self.states, self.output = straightRun(PROGRAM)
+        self.lastStep = len(self.states) - 1
+        self.assertEqual(self.output, "400\n")
+        self.savedOutput = programContext.output
+        programContext.output = io.StringIO()
+        state = interpreter.parse("test.asm", PROGRAM, 1024, "_start", False)
+        # Small checkpoint intervals and a short journal, so going back uses both the journal and the checkpoints,
+        #   and old checkpoints are evicted while the program runs
+        self.history = debugHistory.ExecutionHistory(state, "test.asm", PROGRAM.split("\n"),
+                                                     checkpointInterval=8, maxCheckpoints=4, journalLength=10)
+
+    def tearDown(self):
+        programContext.output = self.savedOutput
+
+    # checkStep:: TestExecutionHistory -> String -> None
+    def checkStep(self, action: str):
+        history = self.history
+        self.assertEqual(snapshot(history.state), self.states[history.step], f"state after {action} at step {history.step}")
+
+    def test_randomInterleaving(self):
+        history = self.history
+        rand = random.Random(17)
+        for _ in range(2000):
+            choice = rand.randrange(3)
+            if choice == 0:
+                target = rand.randrange(self.lastStep + 1)
+                self.assertTrue(history.goTo(target))
+                self.assertEqual(history.step, target)
+                self.checkStep(f"goTo({target})")
+            elif choice == 1:
+                step = history.step
+                self.assertEqual(history.stepBack(), step > 0)
+                self.assertEqual(history.step, max(step - 1, 0))
+                self.checkStep("stepBack")
+            else:
+                step = history.step
+                self.assertEqual(history.stepForward(), step < self.lastStep)
+                self.assertEqual(history.step, min(step + 1, self.lastStep))
+                self.checkStep("stepForward")
+        self.assertGreater(history.checkpointInterval, 8)
+        # The output of an instruction is only shown the first time it is executed
+        history.goTo(self.lastStep)
+        self.assertEqual(programContext.output.getvalue(), self.output)
+
+    def test_reverseContinue(self):
+        history = self.history
+        history.goTo(self.lastStep)
+        # The steps at which square is called, reverseContinue goes back to them from the last to the first
+        calls = [step for step, state in enumerate(self.states) if state[0][programState.PC_ID] == history.state.labels["square"].address]
+        for step in reversed(calls):
+            self.assertTrue(history.reverseContinue(lambda s: s.registers[programState.PC_ID] == history.state.labels["square"].address))
+            self.assertEqual(history.step, step)
+            self.checkStep("reverseContinue")
+        self.assertFalse(history.reverseContinue(lambda s: False))
+        self.assertEqual(history.step, 0)
+        self.checkStep("reverseContinue")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import io
+import unittest
+from typing import List, Tuple
+
+import executionBudget
+import executionTrace
+import interpreter
+import programContext
+import programState
+
+# Every PUSH and POP of the loop writes or reads 8 registers, a record of the PUSH is larger than the small buffers of the tests
+PROGRAM = """.text
+.global _start
+_start:
+    push {r4, r5, r6, r7, lr}
+    mov r0, #1
+    mov r1, #2
+    mov r2, #3
+    mov r3, #4
+    mov r5, #6
+    mov r6, #7
+    mov r7, #8
+    mov r4, #50
+loop:
+    push {r0, r1, r2, r3, r4, r5, r6, r7}
+    add r0, r0, r4
+    pop {r0, r1, r2, r3, r4, r5, r6, r7}
+    sub r4, r4, #1
+    bne loop
+    bl print_int
+    pop {r4, r5, r6, r7, pc}
+"""
+
+
+# traceProgram:: String -> int -> int -> (ProgramState, bytes)
+def traceProgram(source: str, bufferSize: int, bufferCount: int) -> Tuple[programState.ProgramState, bytes]:
+    lines = source.split("\n")
+    state = interpreter.parse("test.asm", source, 1024, "_start")
+    file = io.BytesIO()
+    trace = executionTrace.TraceWriter(file, state, bufferSize, bufferCount)
+    state = interpreter.runTracedProgram(state, "test.asm", lines, trace, executionBudget.Budget(100000))
+    trace.close()
+    return state, file.getvalue()
+
+
+# replayTrace:: TestCase -> String -> bytes -> int
+# Runs the program again one instruction at a time and checks every record of the trace against it, returns the number of records
+def replayTrace(test: unittest.TestCase, source: str, data: bytes) -> int:
+    lines = source.split("\n")
+    state = interpreter.parse("test.asm", source, 1024, "_start", False)
+    registers, flags, records = executionTrace.readTrace(data)
+    values: List[int] = list(registers)
+    memory = bytearray(state.memory)
+    count = 0
+    for record in records:
+        test.assertEqual(record.address, state.registers[programState.PC_ID])
+        node = state.getInstructionFromMem(state.registers[programState.PC_ID])
+        _, running = interpreter.executeInstruction(node, state, "test.asm", lines)
+        for register, value in record.registers.items():
+            values[register] = value
+        if record.flags is not None:
+            flags = record.flags
+        for address, contents in record.writes:
+            memory[address:address + len(contents)] = contents
+        test.assertEqual(values[:programState.PC_ID], state.registers[:programState.PC_ID])
+        test.assertEqual(flags, state.getFlags())
+        test.assertEqual(memory, state.memory)
+        count += 1
+        if not running:
+            break
+    return count
+
+
+class TestTraceWriter(unittest.TestCase):
+    def setUp(self):
+        self.output = programContext.output
+        programContext.output = io.StringIO()
+
+    def tearDown(self):
+        programContext.output = self.output
+
+    def test_roundTrip(self):
+        state, data = traceProgram(PROGRAM, executionTrace.BUFFER_SIZE, executionTrace.BUFFER_COUNT)
+        self.assertEqual(replayTrace(self, PROGRAM, data), state.steps)
+
+    def test_recordsLargerThanBuffer(self):
+        # The header and the records of PUSH and POP don't fit in a buffer, two buffers make sure they are used over and over
+        state, data = traceProgram(PROGRAM, 8, 2)
+        self.assertEqual(replayTrace(self, PROGRAM, data), state.steps)
+        self.assertEqual(data, traceProgram(PROGRAM, executionTrace.BUFFER_SIZE, executionTrace.BUFFER_COUNT)[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import unittest
+from typing import Callable, List, Optional, Tuple
+
+import instructions
+import interpreter
+import nodes
+import programState
+import superinstructions
+
+# The values at the edges of the carry and the overflow
+EDGES = [0, 1, 0x7FFFFFFF, 0x80000000, 0xFFFFFFFF]
+# The shift values at the edges of the shifts, a shift by 0 keeps the carry
+SHIFTS = [0, 1, 31, 32]
+
+PROGRAM = """.text
+.global _start
+_start:
+    mov pc, lr
+"""
+
+
+# addFlags:: int -> int -> StatusRegister
+# The flags of a + b like the ALU instructions calculated them before the flags were evaluated lazily
+def addFlags(a: int, b: int) -> programState.StatusRegister:
+    out = a + b
+    out32 = out & 0xFFFFFFFF
+    bit31 = (out32 >> 31) & 1
+    return programState.StatusRegister(bool((out >> 31) & 1), out32 == 0, bool((out >> 32) & 1),
+                                       ((a >> 31) & 1) == ((b >> 31) & 1) and ((b >> 31) & 1) != bit31)
+
+
+# subFlags:: int -> int -> StatusRegister
+# The flags of a - b, calculated as an addition of the two's complement
+def subFlags(a: int, b: int) -> programState.StatusRegister:
+    return addFlags(a, ((~b) + 1) & 0xFFFFFFFF)
+
+
+# logicFlags:: int -> bool -> StatusRegister
+def logicFlags(out32: int, carry: bool) -> programState.StatusRegister:
+    return programState.StatusRegister(bool((out32 >> 31) & 1), out32 == 0, carry, False)
+
+
+# expectedFlags:: String -> int -> int -> bool -> StatusRegister
+# The flags of an operation with the operands a and b when the carry was set before it
+# The instruction set has no NEG, a negation is a SUB from 0, which is covered by a = 0
+def expectedFlags(opcode: str, a: int, b: int, carry: bool, overflow: bool) -> programState.StatusRegister:
+    if opcode in ("ADD", "CMN"):
+        return addFlags(a, b)
+    if opcode == "ADC":
+        return addFlags(a, b + 1 if carry else b)
+    if opcode in ("SUB", "CMP"):
+        return subFlags(a, b)
+    if opcode == "SBC":
+        return subFlags(a, b + 1 if carry else b)
+    if opcode == "MUL":
+        out32 = (a * b) & 0xFFFFFFFF
+        return programState.StatusRegister(bool(out32 >> 31), out32 == 0, carry, overflow)
+    if opcode in ("AND", "TST"):
+        return logicFlags(a & b, False)
+    if opcode == "EOR":
+        return logicFlags(a ^ b, False)
+    if opcode == "ORR":
+        return logicFlags(a | b, False)
+    if opcode == "BIC":
+        return logicFlags(a & (b ^ 0xFFFFFFFF), False)
+    if opcode == "LSL":
+        out = a << b
+        return logicFlags(out & 0xFFFFFFFF, carry if b == 0 else bool((out >> 32) & 1))
+    if opcode == "LSR":
+        return logicFlags((a >> b) & 0xFFFFFFFF, carry if b == 0 else bool((a >> (b - 1)) & 1))
+    if opcode == "ASR":
+        out32 = (a >> b) & 0xFFFFFFFF
+        if (a >> 31) & 1:
+            out32 |= (0xFFFFFFFF << (32 - b)) & 0xFFFFFFFF
+        return logicFlags(out32, carry if b == 0 else bool((a >> (b - 1)) & 1))
+    if opcode == "ROR":
+        bMod32 = b & 31
+        out32 = ((a >> bMod32) | (a << (32 - bMod32))) & 0xFFFFFFFF
+        return logicFlags(out32, carry if b == 0 else bool((a >> (bMod32 - 1)) & 1))
+    raise ValueError(opcode)
+
+
+# newOperation:: String -> int -> Either int None -> Operation
+# An operation on R1 and R2, or R1 and an immediate value, with the result in R0 when the operation has one
+def newOperation(opcode: str, immediate: Optional[int] = None) -> nodes.Operation:
+    rd = None if opcode in ("CMP", "CMN", "TST") else 0
+    if immediate is None:
+        return nodes.Operation(opcode, 1, rd=rd, rn=1, rm=2)
+    return nodes.Operation(opcode, 1, rd=rd, rn=1, immediate=immediate)
+
+
+class TestLazyFlags(unittest.TestCase):
+    def setUp(self):
+        self.state = interpreter.parse("test.asm", PROGRAM, 1024, "_start")
+        self.engines: List[Tuple[str, Callable[[nodes.Operation], Callable]]] = list(interpreter.ENGINES.items())
+
+    # checkOperation:: TestLazyFlags -> Operation -> int -> int -> None
+    # R1 is a and R2 is b, b must be the immediate value of an operation without rm
+    # Runs the operation with both backends for every value of the C and V flags before it and checks the flags after it
+    def checkOperation(self, operation: nodes.Operation, a: int, b: int):
+        for name, generateFunction in self.engines:
+            func = generateFunction(operation)
+            for carry in (False, True):
+                for overflow in (False, True):
+                    state = self.state
+                    state.setALUState(programState.StatusRegister(False, False, carry, overflow))
+                    state.registers[1] = a
+                    state.registers[2] = b
+                    func(state)
+                    expected = expectedFlags(operation.opcode, a, b, carry, overflow)
+                    with self.subTest(engine=name, operation=str(operation), a=hex(a), b=hex(b), carry=carry, overflow=overflow):
+                        self.assertEqual(state.getFlags(), expected.toFlags())
+                        # The flags are only calculated once, reading them again gives the same flags
+                        self.assertEqual(state.getALUState().toFlags(), expected.toFlags())
+
+    def test_arithmetic(self):
+        for opcode in ("ADD", "ADC", "SUB", "SBC", "CMP", "CMN", "MUL"):
+            for a in EDGES:
+                for b in EDGES:
+                    self.checkOperation(newOperation(opcode), a, b)
+
+    def test_logic(self):
+        for opcode in ("AND", "TST", "EOR", "ORR", "BIC"):
+            for a in EDGES:
+                for b in EDGES:
+                    self.checkOperation(newOperation(opcode), a, b)
+
+    def test_shifts(self):
+        for opcode in ("LSL", "LSR", "ASR", "ROR"):
+            for a in EDGES:
+                for shift in SHIFTS:
+                    # A shift by a register is at most 31 for LSL, a rotation by 32 is not supported
+                    if opcode in ("LSL", "ROR") and shift > 31:
+                        continue
+                    self.checkOperation(newOperation(opcode), a, shift)
+                    self.checkOperation(newOperation(opcode, shift), a, shift)
+
+    def test_compareBranch(self):
+        # A fused compare and branch calculates the flags right away, the branch is taken when the condition of the flags holds
+        for opcode in superinstructions.COMPARE_OPCODES:
+            for branch in superinstructions.CONDITIONAL_BRANCHES:
+                first = nodes.InstructionNode(nodes.Node.Section.TEXT, 1, None, newOperation(opcode))
+                second = nodes.InstructionNode(nodes.Node.Section.TEXT, 2, None, nodes.Operation(branch, 2, immediate=0x1000))
+                fused = superinstructions.fuseCompareBranch(first, second)
+                for a in EDGES:
+                    for b in EDGES:
+                        state = self.state
+                        state.registers[1] = a
+                        state.registers[2] = b
+                        state.registers[programState.PC_ID] = 0x400
+                        nextAddress = fused.function(state)
+                        expected = expectedFlags(opcode, a, b, False, False)
+                        with self.subTest(opcode=opcode, branch=branch, a=hex(a), b=hex(b)):
+                            self.assertEqual(state.getFlags(), expected.toFlags())
+                            self.assertEqual(nextAddress, 0x1000 if instructions.BRANCH_CONDITIONS[branch](expected) else 0x408)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,4 @@
-from typing import Dict, Callable, Union
+from typing import Dict, Callable, List, Union
 from enum import Enum
 
 
@@ -134,6 +134,61 @@ class ErrorToken(Token):
         return self.message
 
 
+# A cursor over a list of tokens, shared by the parser and all decode functions
+# Taking the next token only moves the cursor, so the list of tokens is never copied
+class TokenStream:
+    def __init__(self, tokenList: List[Token]):
+        self.tokens: List[Token] = tokenList
+        self.index: int = 0
+
+    # The number of tokens that have not been taken yet
+    def __len__(self) -> int:
+        return len(self.tokens) - self.index
+
+    def __str__(self) -> str:
+        return "{}({}/{})".\
+            format(type(self).__name__, self.index, len(self.tokens))
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    # peek:: TokenStream -> int -> Token
+    # Returns a token without taking it, offset 0 is the next token
+    def peek(self, offset: int = 0) -> Token:
+        if self.index + offset >= len(self.tokens):
+            raise IndexError("No tokens left in the token stream")
+        return self.tokens[self.index + offset]
+
+    # next:: TokenStream -> Token
+    # Takes the next token
+    def next(self) -> Token:
+        token = self.peek()
+        self.index += 1
+        return token
+
+    # rewind:: TokenStream -> int -> TokenStream
+    # Puts back the last count tokens that were taken
+    def rewind(self, count: int) -> 'TokenStream':
+        self.index -= count
+        return self
+
+    # advanceToNewline:: TokenStream -> TokenStream
+    # Advance to the first token after a newline
+    def advanceToNewline(self) -> 'TokenStream':
+        while self.index < len(self.tokens):
+            token = self.tokens[self.index]
+            self.index += 1
+            if isinstance(token, NewLine):
+                break
+        return self
+
+    # advanceToEnd:: TokenStream -> TokenStream
+    # Takes all remaining tokens
+    def advanceToEnd(self) -> 'TokenStream':
+        self.index = len(self.tokens)
+        return self
+
+
 # getIntValue:: str -> int -> Either int Error
 def getIntValue(text: str, line: int) -> Union[int, ErrorToken]:
     if len(text) == 0:
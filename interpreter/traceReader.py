@@ -0,0 +1,77 @@
+import argparse
+import csv
+import sys
+from typing import List, Optional, TextIO
+
+import executionTrace
+import programState
+
+# Converts a trace written by cli.py --trace to text or CSV
+# usage: python traceReader.py trace.bin [-f {text,csv}] [-o OUTPUT]
+
+FORMATS = ["text", "csv"]
+
+
+# formatFlags:: int -> String
+def formatFlags(flags: int) -> str:
+    status = programState.flagsToStatus(flags)
+    return f"N={int(status.N)} Z={int(status.Z)} C={int(status.C)} V={int(status.V)}"
+
+
+# formatRecord:: TraceRecord -> [String]
+# The address, the changed registers, the flags and the memory writes of a record as text
+def formatRecord(record: executionTrace.TraceRecord) -> List[str]:
+    registers = " ".join(f"{programState.REGISTER_NAMES[register]}={value}" for register, value in record.registers.items())
+    flags = formatFlags(record.flags) if record.flags is not None else ""
+    writes = " ".join(f"[{address}]={contents.hex()}" for address, contents in record.writes)
+    return [str(record.address), registers, flags, writes]
+
+
+# writeText:: [int] -> int -> Iterator[TraceRecord] -> TextIO -> None
+def writeText(registers: List[int], flags: int, records, output: TextIO):
+    output.write("start: " + " ".join(f"{name}={value}" for name, value in zip(programState.REGISTER_NAMES, registers)) +
+                 " " + formatFlags(flags) + "\n")
+    for record in records:
+        fields = formatRecord(record)
+        output.write(f"{record.step:>8} {fields[0]:>6}  " + "  ".join(field for field in fields[1:] if field != "") + "\n")
+
+
+# writeCSV:: [int] -> int -> Iterator[TraceRecord] -> TextIO -> None
+def writeCSV(registers: List[int], flags: int, records, output: TextIO):
+    writer = csv.writer(output)
+    writer.writerow(["step", "address", "registers", "flags", "memory"])
+    for record in records:
+        writer.writerow([record.step] + formatRecord(record))
+
+
+# main:: [String] -> int
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert an execution trace to text or CSV")
+    parser.add_argument("trace", help="the trace file written by cli.py --trace")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="text",
+                        help="text: a line per instruction, csv: a row per instruction (default: text)")
+    parser.add_argument("-o", "--output", default=None, help="the file to write to (default: the console)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.trace, "rb") as file:
+            data = file.read()
+        registers, flags, records = executionTrace.readTrace(data)
+    except OSError as e:
+        print(f"Could not read {args.trace}: {e.strerror}", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(f"Could not read {args.trace}: {e}", file=sys.stderr)
+        return 1
+
+    output = sys.stdout if args.output is None else open(args.output, "w", newline="")
+    try:
+        (writeText if args.format == "text" else writeCSV)(registers, flags, records, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
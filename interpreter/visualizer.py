@@ -1,7 +1,7 @@
 import wx
 import wx.stc as stc
 
-from typing import Any, Union, List, Optional, Callable
+from typing import Any, Union, List, Optional, Callable, Dict, Tuple
 
 import os
 import threading
@@ -9,8 +9,13 @@ import sys
 import time
 
 import programState
+import programContext
 import interpreter
 import nodes
+import debugHistory
+import profiler
+import codeCoverage
+import executionBudget
 
 # Fix locale bug
 import locale
@@ -25,6 +30,10 @@ breakpoints = []
 MARK_ADDRESS = 2
 # Current line marker ID
 MARK_CURRENT_LINE = 3
+# Coverage marker IDs, these color the background of the lines
+MARK_COVERED = 4
+MARK_NOT_COVERED = 5
+MARK_PARTIALLY_COVERED = 6
 
 # These values are set from the main.py file
 stackSize = 32
@@ -94,6 +103,13 @@ class Icons:
         self.singleStep = wx.Bitmap(os.path.join("icons", "single_step.png"))
         self.stop = wx.Bitmap(os.path.join("icons", "stop.png"))
 
+        # There are no icons for reverse debugging in the icons folder, so these use the icons of the platform
+        self.stepBack = wx.ArtProvider.GetBitmap(wx.ART_GO_BACK, wx.ART_TOOLBAR)
+        self.reverseToBreakpoint = wx.ArtProvider.GetBitmap(wx.ART_GOTO_FIRST, wx.ART_TOOLBAR)
+        self.goTo = wx.ArtProvider.GetBitmap(wx.ART_JUMP_TO, wx.ART_TOOLBAR)
+        self.profile = wx.ArtProvider.GetBitmap(wx.ART_REPORT_VIEW, wx.ART_TOOLBAR)
+        self.coverage = wx.ArtProvider.GetBitmap(wx.ART_TICK_MARK, wx.ART_TOOLBAR)
+
 
 # The panel that shows the text of the application and makes it possible to set breakpoints
 class TextPanel(wx.Panel):
@@ -133,6 +149,9 @@ class TextPanel(wx.Panel):
         # Like a flattened tree control using circular headers and curved joins
         self.textBox.MarkerDefine(MARK_BREAKPOINT, stc.STC_MARK_CIRCLE, "red", "red")
         self.textBox.MarkerDefine(MARK_CURRENT_LINE, stc.STC_MARK_CIRCLE, "#888888", "#888888")
+        self.textBox.MarkerDefine(MARK_COVERED, stc.STC_MARK_BACKGROUND, "#D8F5D8", "#D8F5D8")
+        self.textBox.MarkerDefine(MARK_NOT_COVERED, stc.STC_MARK_BACKGROUND, "#F8D0D0", "#F8D0D0")
+        self.textBox.MarkerDefine(MARK_PARTIALLY_COVERED, stc.STC_MARK_BACKGROUND, "#F8F0C0", "#F8F0C0")
 
         # Event handler for margin click
         self.textBox.Bind(stc.EVT_STC_MARGINCLICK, self.OnMarginClick)
@@ -160,7 +179,8 @@ class TextPanel(wx.Panel):
     def OnMarginClick(self, e):
         # enable and disable breakpoint as needed
         lineClicked = self.textBox.LineFromPosition(e.GetPosition())  # line 1 = 0
-        if self.textBox.MarkerGet(lineClicked):
+        # The line can also have the current line and coverage markers
+        if self.textBox.MarkerGet(lineClicked) & (1 << MARK_BREAKPOINT):
             if (lineClicked+1) in breakpoints:
                 breakpoints.remove(lineClicked+1)
             self.textBox.MarkerDelete(lineClicked, MARK_BREAKPOINT)
@@ -170,11 +190,35 @@ class TextPanel(wx.Panel):
             self.textBox.MarkerAdd(lineClicked, MARK_BREAKPOINT)
 
     def setAddresses(self, state: programState.ProgramState):
+        self.clearCoverage()
+        self.textBox.MarginTextClearAll()
+        self.textBox.SetMarginWidth(MARK_ADDRESS, address_margin)
+        for line, address in state.lineAddresses.items():
+            self.textBox.MarginSetText(line-1, str(address))
+
+    # Show the number of times each line has been executed in the address margin, the margin is made wider when the counts don't fit
+    def setExecutionCounts(self, counts: Dict[int, int]):
         self.textBox.MarginTextClearAll()
-        for entry in enumerate(state.memory):
-            idx, node = entry
-            if node.line != -1:
-                self.textBox.MarginSetText(node.line-1, str(idx * 4))
+        widest = str(max(counts.values(), default=0))
+        self.textBox.SetMarginWidth(MARK_ADDRESS, max(address_margin, self.textBox.TextWidth(stc.STC_STYLE_DEFAULT, widest) + 10))
+        for line, count in counts.items():
+            self.textBox.MarginSetText(line-1, str(count))
+
+    # Color the lines that have been executed green and the other lines with instructions red,
+    #   a conditional branch that has only gone one way is yellow
+    def setCoverage(self, coverage: codeCoverage.Coverage):
+        self.clearCoverage()
+        partial = set(line for line, taken, notTaken in coverage.branchCoverage() if taken is not None and not (taken and notTaken))
+        for line, executed in coverage.lineCoverage().items():
+            if line in partial:
+                self.textBox.MarkerAdd(line-1, MARK_PARTIALLY_COVERED)
+            else:
+                self.textBox.MarkerAdd(line-1, MARK_COVERED if executed else MARK_NOT_COVERED)
+
+    def clearCoverage(self):
+        self.textBox.MarkerDeleteAll(MARK_COVERED)
+        self.textBox.MarkerDeleteAll(MARK_NOT_COVERED)
+        self.textBox.MarkerDeleteAll(MARK_PARTIALLY_COVERED)
 
     # Mark the next line to be executed
     def markLine(self, line: int):
@@ -258,6 +302,10 @@ class SidePanel(wx.Panel):
         wx.StaticText(self, -1, "Status Registers:", pos=(10, 530))
         self.statusRegEntries = [RegisterEntry(self, reg, 550+30*idx) for idx, reg in enumerate(["N", "Z", "C", "V"])]
 
+        # The calls that haven't returned yet, the most recent call first
+        self.callStackLabel = wx.StaticText(self, -1, "Call stack:", pos=(10, 680))
+        self.callStackBox = wx.ListBox(self, -1, pos=(10, 700), size=(130, 150))
+
         self.reset()
 
     # Initialize the registers in the visualizer with there actual values
@@ -274,9 +322,22 @@ class SidePanel(wx.Panel):
         self.statusRegEntries[2].setValue(status.C)
         self.statusRegEntries[3].setValue(status.V)
 
+    # Show the shadow call stack of the program, every call is shown with its line and the label it called
+    # The first call is the call of the start label by the interpreter, it is left out like in a stacktrace
+    def setCallStack(self, state: programState.ProgramState):
+        calls = []
+        for address in reversed(state.callStack[1:]):
+            node = state.getInstructionFromMem(address)
+            if isinstance(node, nodes.InstructionNode) and node.operation is not None:
+                target = node.operation.label if node.operation.label is not None else programState.REGISTER_NAMES[node.operation.rm]
+                calls.append(f"{node.line}: {node.opcode} {target}")
+        self.callStackLabel.SetLabel(f"Call stack (depth {len(calls)}):")
+        self.callStackBox.Set(calls)
+
     def update(self, state: programState.ProgramState):
         self.setRegs(state.registers)
-        self.setStatusRegs(state.status)
+        self.setStatusRegs(state.getALUState())
+        self.setCallStack(state)
 
     def reset(self):
         for reg in self.statusRegEntries:
@@ -285,6 +346,9 @@ class SidePanel(wx.Panel):
         for reg in self.regEntries:
             reg.setValue(0)
 
+        self.callStackLabel.SetLabel("Call stack:")
+        self.callStackBox.Clear()
+
 
 # Main application Frame
 class MainWindow(wx.Frame):
@@ -326,6 +390,10 @@ class MainWindow(wx.Frame):
         self.Bind(wx.EVT_TOOL, self.OnRun, self.runTool)
         self.debugTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Debug",  self.icons.debug, "Debug the program")
         self.Bind(wx.EVT_TOOL, self.OnDebug, self.debugTool)
+        self.profileTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Profile", self.icons.profile, "Run the program and show how often each line is executed")
+        self.Bind(wx.EVT_TOOL, self.OnProfile, self.profileTool)
+        self.coverageTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Coverage", self.icons.coverage, "Run the program and show which lines and branches have been executed in all coverage runs")
+        self.Bind(wx.EVT_TOOL, self.OnCoverage, self.coverageTool)
         self.stopTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Stop",  self.icons.stop, "Stop the program")
         self.Bind(wx.EVT_TOOL, self.OnStop, self.stopTool)
         self.singleStepTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Single-step",  self.icons.singleStep, "Single-step the program")
@@ -334,6 +402,12 @@ class MainWindow(wx.Frame):
         self.Bind(wx.EVT_TOOL, self.OnResumeBreakpoint, self.resumeBreakpointTool)
         self.resumeTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Resume",  self.icons.resume, "Run the rest of the program")
         self.Bind(wx.EVT_TOOL, self.OnResume, self.resumeTool)
+        self.stepBackTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Step-back", self.icons.stepBack, "Undo the last instruction")
+        self.Bind(wx.EVT_TOOL, self.OnStepBack, self.stepBackTool)
+        self.reverseBreakpointTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Reverse-to-breakpoint", self.icons.reverseToBreakpoint, "Go back to the previous breakpoint")
+        self.Bind(wx.EVT_TOOL, self.OnReverseBreakpoint, self.reverseBreakpointTool)
+        self.goToTool: wx.ToolBarToolBase = toolbar.AddTool(wx.ID_ANY, "Go-to-instruction", self.icons.goTo, "Go to the state after a number of instructions")
+        self.Bind(wx.EVT_TOOL, self.OnGoTo, self.goToTool)
 
         toolbar.AddSeparator()
 
@@ -348,11 +422,32 @@ class MainWindow(wx.Frame):
         # run variables
         self.runThread: Optional[threading.Thread] = None
         self.stopFlag = False
+        # The budget of the program that runs with the run loop of the interpreter (run, profile and coverage), the stop tool stops it
+        self.budget: Optional[executionBudget.Budget] = None
         self.debugState: Optional[programState.ProgramState] = None
+        # The history of the program that is being debugged, used to step back
+        self.history: Optional[debugHistory.ExecutionHistory] = None
+        # The coverage of the coverage runs so far, a run of a changed program starts over
+        self.coverage: Optional[codeCoverage.Coverage] = None
+        # The last assembled program for running (fused) and for debugging (not fused), with the file name, contents and settings it was assembled from
+        self.images: Dict[bool, Tuple[tuple, programContext.ProgramImage]] = {}
 
         # go ahead and display the application
         self.Show()
 
+    # newState:: MainWindow -> String -> bool -> Either ProgramState None
+    # Generates a state to run the contents of the editor
+    # The program is only assembled again when the contents of the editor or the settings have changed since the last run
+    def newState(self, file_contents: str, fuse: bool) -> Optional[programState.ProgramState]:
+        key = (self.fileName, file_contents, stackSize, startLabel)
+        if fuse not in self.images or self.images[fuse][0] != key:
+            image = interpreter.parseImage(self.fileName, file_contents, stackSize, startLabel, fuse)
+            if image is None:
+                self.images.pop(fuse, None)
+                return None
+            self.images[fuse] = (key, image)
+        return self.images[fuse][1].newState()
+
     # reset the Enabled flag on all tools to their default value
     def resetTools(self):
         self.GetToolBar().EnableTool(self.newTool.GetId(), True)
@@ -362,26 +457,36 @@ class MainWindow(wx.Frame):
 
         self.GetToolBar().EnableTool(self.runTool.GetId(), True)
         self.GetToolBar().EnableTool(self.debugTool.GetId(), True)
+        self.GetToolBar().EnableTool(self.profileTool.GetId(), True)
+        self.GetToolBar().EnableTool(self.coverageTool.GetId(), True)
         self.GetToolBar().EnableTool(self.stopTool.GetId(), False)
 
         self.GetToolBar().EnableTool(self.singleStepTool.GetId(), False)
         self.GetToolBar().EnableTool(self.resumeBreakpointTool.GetId(), False)
         self.GetToolBar().EnableTool(self.resumeTool.GetId(), False)
+        self.GetToolBar().EnableTool(self.stepBackTool.GetId(), False)
+        self.GetToolBar().EnableTool(self.reverseBreakpointTool.GetId(), False)
+        self.GetToolBar().EnableTool(self.goToTool.GetId(), False)
 
         self.GetToolBar().Realize()
 
-    # enable or disable the debug tools (single-step and resume)
+    # enable or disable the debug tools (single-step, resume, step-back, reverse and go-to)
     def enableDebugTools(self, enable):
         self.GetToolBar().EnableTool(self.singleStepTool.GetId(), enable)
         self.GetToolBar().EnableTool(self.resumeBreakpointTool.GetId(), enable)
         self.GetToolBar().EnableTool(self.resumeTool.GetId(), enable)
+        self.GetToolBar().EnableTool(self.stepBackTool.GetId(), enable)
+        self.GetToolBar().EnableTool(self.reverseBreakpointTool.GetId(), enable)
+        self.GetToolBar().EnableTool(self.goToTool.GetId(), enable)
 
         self.GetToolBar().Realize()
 
-    # enable or disable the run and debug tool
+    # enable or disable the run, debug, profile and coverage tool
     def enableRunTools(self, enable):
         self.GetToolBar().EnableTool(self.runTool.GetId(), enable)
         self.GetToolBar().EnableTool(self.debugTool.GetId(), enable)
+        self.GetToolBar().EnableTool(self.profileTool.GetId(), enable)
+        self.GetToolBar().EnableTool(self.coverageTool.GetId(), enable)
 
         self.GetToolBar().Realize()
 
@@ -460,20 +565,14 @@ class MainWindow(wx.Frame):
             self.textPanel.textBox.SetEditable(False)
 
             file_contents: str = self.textPanel.textBox.GetValue()
-            state = interpreter.parse(self.fileName, file_contents, stackSize, startLabel)
+            state = self.newState(file_contents, True)
 
             if state is not None:
                 self.textPanel.setAddresses(state)
                 wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
 
                 lines = file_contents.split('\n')
-
-                while True:
-                    if self.stopFlag:
-                        break
-                    state, success = interpreter.executeInstruction(state.getInstructionFromMem(state.getReg("PC")[0]), state, self.fileName, lines)
-                    if not success:
-                        break
+                state = interpreter.runProgram(state, self.fileName, lines, budget=self.budget)
 
                 # program has exited
                 wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.resetTools()]))
@@ -481,7 +580,7 @@ class MainWindow(wx.Frame):
                 wx.PostEvent(self, UpdateGUIEvent(lambda: self.resetTools()))
 
             self.runThread = None
-            self.stopFlag = False
+            self.budget = None
 
             self.textPanel.textBox.MarkerDeleteAll(MARK_CURRENT_LINE)
             self.textPanel.textBox.SetEditable(True)
@@ -492,7 +591,92 @@ class MainWindow(wx.Frame):
             self.enableRunTools(False)
             self.enableFileTools(False)
 
-            self.stopFlag = False
+            # The run loop checks the budget every executionBudget.CHECK_INTERVAL instructions instead of a flag after every instruction
+            self.budget = executionBudget.Budget()
+
+            self.runThread = threading.Thread(target=run)
+            self.runThread.setDaemon(True)
+            self.runThread.start()
+
+    # Profile tool action
+    # The program runs with the run loop of the interpreter, the stop tool stops it through the budget
+    def OnProfile(self, _):
+        def run():
+            self.textPanel.textBox.SetEditable(False)
+
+            file_contents: str = self.textPanel.textBox.GetValue()
+            state = self.newState(file_contents, True)
+
+            if state is not None:
+                wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
+
+                lines = file_contents.split('\n')
+                profile = profiler.newProfile(state)
+                state = interpreter.runProgram(state, self.fileName, lines, profile=profile, budget=self.budget)
+                print(profiler.formatHotSpots(state, profile, lines))
+                counts = profiler.lineCounts(state, profile)
+
+                # program has exited
+                wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.textPanel.setExecutionCounts(counts), self.resetTools()]))
+            else:
+                wx.PostEvent(self, UpdateGUIEvent(lambda: self.resetTools()))
+
+            self.runThread = None
+            self.budget = None
+
+            self.textPanel.textBox.SetEditable(True)
+
+        if self.runThread is None:
+            self.GetToolBar().EnableTool(self.stopTool.GetId(), True)
+            self.enableRunTools(False)
+            self.enableFileTools(False)
+
+            self.budget = executionBudget.Budget()
+
+            self.runThread = threading.Thread(target=run)
+            self.runThread.setDaemon(True)
+            self.runThread.start()
+
+    # Coverage tool action
+    # Like the profile tool the stop tool stops the program through the budget. The coverage is added to the coverage of the previous runs of the same program
+    def OnCoverage(self, _):
+        def run():
+            self.textPanel.textBox.SetEditable(False)
+
+            file_contents: str = self.textPanel.textBox.GetValue()
+            state = self.newState(file_contents, True)
+
+            if state is not None:
+                wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
+
+                lines = file_contents.split('\n')
+                coverage = codeCoverage.newCoverage(state, self.fileName)
+                state = interpreter.runProgram(state, self.fileName, lines, coverage=coverage, budget=self.budget)
+                if self.coverage is not None:
+                    try:
+                        coverage.merge(self.coverage)
+                    except ValueError:
+                        # The program has changed
+                        pass
+                self.coverage = coverage
+                print(codeCoverage.formatSummary(coverage))
+
+                # program has exited
+                wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.textPanel.setCoverage(coverage), self.resetTools()]))
+            else:
+                wx.PostEvent(self, UpdateGUIEvent(lambda: self.resetTools()))
+
+            self.runThread = None
+            self.budget = None
+
+            self.textPanel.textBox.SetEditable(True)
+
+        if self.runThread is None:
+            self.GetToolBar().EnableTool(self.stopTool.GetId(), True)
+            self.enableRunTools(False)
+            self.enableFileTools(False)
+
+            self.budget = executionBudget.Budget()
 
             self.runThread = threading.Thread(target=run)
             self.runThread.setDaemon(True)
@@ -504,25 +688,26 @@ class MainWindow(wx.Frame):
             self.textPanel.textBox.SetEditable(False)
 
             file_contents: str = self.textPanel.textBox.GetValue()
-            state = interpreter.parse(self.fileName, file_contents, stackSize, startLabel)
+            state = self.newState(file_contents, False)
             if state is not None:
                 self.textPanel.setAddresses(state)
                 wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
 
                 lines = file_contents.split('\n')
+                history = debugHistory.ExecutionHistory(state, self.fileName, lines)
 
                 while not self.stopFlag:
-                    node: nodes.InstructionNode = state.getInstructionFromMem(state.getReg("PC")[0])
+                    node: nodes.InstructionNode = state.getInstructionFromMem(state.registers[programState.PC_ID])
                     if node.line in breakpoints:
                         # breakpoint found - save state and enable the single-step and resume tools
                         self.debugState = state
+                        self.history = history
                         self.runThread = None
 
                         wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.textPanel.markLine(node.line), self.enableDebugTools(True)]))
 
                         return
-                    state, success = interpreter.executeInstruction(node, state, self.fileName, lines)
-                    if not success:
+                    if not history.stepForward():
                         break
 
                 # program has exited
@@ -552,8 +737,11 @@ class MainWindow(wx.Frame):
     def OnStop(self, _):
         if self.runThread is not None:
             self.stopFlag = True
+        if self.budget is not None:
+            self.budget.stop()
         if self.debugState is not None:
             self.debugState = None
+            self.history = None
 
             self.resetTools()
 
@@ -562,16 +750,15 @@ class MainWindow(wx.Frame):
 
     # Single-step tool action
     def OnStep(self, _):
-        lines = self.textPanel.textBox.GetValue().split('\n')
-
-        node: nodes.InstructionNode = self.debugState.getInstructionFromMem(self.debugState.getReg("PC")[0])
-        state, success = interpreter.executeInstruction(node, self.debugState, self.fileName, lines)
+        state = self.debugState
+        success = self.history.stepForward()
 
         self.sidePanel.update(state)
 
         if not success:
             # program has exited
             self.debugState = None
+            self.history = None
             self.runThread = None
             self.stopFlag = False
 
@@ -580,10 +767,14 @@ class MainWindow(wx.Frame):
             self.textPanel.textBox.MarkerDeleteAll(MARK_CURRENT_LINE)
             self.textPanel.textBox.SetEditable(True)
         else:
-            self.debugState = state
-            nextNode: nodes.InstructionNode = self.debugState.getInstructionFromMem(self.debugState.getReg("PC")[0])
-            if not isinstance(nextNode, nodes.SystemCall):
-                self.textPanel.markLine(nextNode.line)
+            self.markCurrentLine()
+
+    # markCurrentLine:: MainWindow -> None
+    # Marks the line of the next instruction of the program that is being debugged
+    def markCurrentLine(self):
+        nextNode: nodes.InstructionNode = self.debugState.getInstructionFromMem(self.debugState.registers[programState.PC_ID])
+        if isinstance(nextNode, nodes.InstructionNode) and not isinstance(nextNode, nodes.SystemCall):
+            self.textPanel.markLine(nextNode.line)
 
     # ResumeToBreakpoint tool action
     def OnResumeBreakpoint(self, _):
@@ -593,10 +784,8 @@ class MainWindow(wx.Frame):
             state = self.debugState
             wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
 
-            lines = self.textPanel.textBox.GetValue().split('\n')
-
             while not self.stopFlag:
-                node: nodes.InstructionNode = state.getInstructionFromMem(state.getReg("PC")[0])
+                node: nodes.InstructionNode = state.getInstructionFromMem(state.registers[programState.PC_ID])
                 if node.line in breakpoints and not firstRun:
                     # breakpoint found - save state and enable the single-step and resume tools
                     self.debugState = state
@@ -605,7 +794,7 @@ class MainWindow(wx.Frame):
                     wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.textPanel.markLine(node.line), self.enableDebugTools(True)]))
 
                     return
-                state, success = interpreter.executeInstruction(node, state, self.fileName, lines)
+                success = self.history.stepForward()
                 firstRun = False
                 if not success:
                     break
@@ -615,6 +804,7 @@ class MainWindow(wx.Frame):
 
             self.runThread = None
             self.debugState = None
+            self.history = None
             self.stopFlag = False
 
             self.textPanel.textBox.MarkerDeleteAll(MARK_CURRENT_LINE)
@@ -635,12 +825,8 @@ class MainWindow(wx.Frame):
             state = self.debugState
             wx.PostEvent(self, UpdateGUIEvent(lambda: self.sidePanel.update(state)))
 
-            lines = self.textPanel.textBox.GetValue().split('\n')
-
             while not self.stopFlag:
-                node: nodes.InstructionNode = state.getInstructionFromMem(state.getReg("PC")[0])
-                state, success = interpreter.executeInstruction(node, state, self.fileName, lines)
-                if not success:
+                if not self.history.stepForward():
                     break
 
             # program has exited
@@ -648,6 +834,7 @@ class MainWindow(wx.Frame):
 
             self.runThread = None
             self.debugState = None
+            self.history = None
             self.stopFlag = False
 
             self.textPanel.textBox.MarkerDeleteAll(MARK_CURRENT_LINE)
@@ -662,6 +849,62 @@ class MainWindow(wx.Frame):
             self.runThread.setDaemon(True)
             self.runThread.start()
 
+    # Step-back tool action
+    def OnStepBack(self, _):
+        self.history.stepBack()
+        self.sidePanel.update(self.debugState)
+        self.markCurrentLine()
+
+    # ReverseToBreakpoint tool action
+    def OnReverseBreakpoint(self, _):
+        def isBreakpoint(state: programState.ProgramState) -> bool:
+            node = state.getInstructionFromMem(state.registers[programState.PC_ID])
+            return isinstance(node, nodes.InstructionNode) and node.line in breakpoints
+
+        def run():
+            # Without an earlier breakpoint the history goes back to the start of the program
+            self.history.reverseContinue(isBreakpoint)
+            self.runThread = None
+
+            wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(self.debugState), self.markCurrentLine(), self.enableDebugTools(True)]))
+
+        if self.runThread is None:
+            self.enableDebugTools(False)
+
+            self.runThread = threading.Thread(target=run)
+            self.runThread.setDaemon(True)
+            self.runThread.start()
+
+    # GoToInstruction tool action
+    def OnGoTo(self, _):
+        def run(target: int):
+            state = self.debugState
+            success = self.history.goTo(target)
+            self.runThread = None
+
+            if success:
+                wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.markCurrentLine(), self.enableDebugTools(True)]))
+                return
+
+            # the program has exited before the instruction
+            wx.PostEvent(self, UpdateGUIEvent(lambda: [self.sidePanel.update(state), self.resetTools()]))
+
+            self.debugState = None
+            self.history = None
+
+            self.textPanel.textBox.MarkerDeleteAll(MARK_CURRENT_LINE)
+            self.textPanel.textBox.SetEditable(True)
+
+        if self.runThread is None:
+            dlg = wx.TextEntryDialog(self, f"Go to the state after instruction (now at {self.history.step}):", "Go to instruction", str(self.history.step))
+            if dlg.ShowModal() == wx.ID_OK and dlg.GetValue().strip().isdigit():
+                self.enableDebugTools(False)
+
+                self.runThread = threading.Thread(target=run, args=(int(dlg.GetValue().strip()),))
+                self.runThread.setDaemon(True)
+                self.runThread.start()
+            dlg.Destroy()
+
 
 app = wx.App(False)
 frame = MainWindow(None, "ASM debugger")